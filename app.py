@@ -3,16 +3,31 @@ app.py — Precedent-Aware Legal Verdict Assistant
 ------------------------------------------------------------
 Uses Cohere for embeddings + Chat for legal reasoning, and Weaviate for RAG retrieval
 from both IPC sections and precedent cases.
+
+`create_app()` builds the Flask app. Importing this module builds nothing (the
+module-level `app` is created on first access) and does no network I/O:
+Cohere and Weaviate clients are created on first use and rebuilt if they fail
+(see services.py). `/healthz` reports liveness, `/readyz` per-dependency readiness,
+`/metrics` Prometheus metrics (see metrics.py). Responses carry a Server-Timing
+header with the same per-stage breakdown as their `timings`.
 """
 
-from flask import Flask, render_template, request, jsonify
-import weaviate
-import cohere
+_IMPORT_START = __import__("time").perf_counter()
+
+from flask import Blueprint, Flask, Response, current_app, g, render_template, request, jsonify, stream_with_context
 import os
-import traceback
+import json
+import logging
 from dotenv import load_dotenv
-from weaviate.connect import ConnectionParams
-from cohere import Client
+import time
+import metrics
+from context_builder import ContextItem, build_context, retrieval_score
+from embedding_cache import make_cache_key
+from logging_setup import configure_logging
+from retrieval import HybridQuery, precedent_candidates, prefer_sections, search_ipc_with_sections, search_precedents
+from section_index import extract_sections, find_references
+from services import DependencyUnavailable, Services
+from concurrent.futures import as_completed
 
 # --- NEW IMPORTS ---
 import webbrowser
@@ -21,172 +36,244 @@ from threading import Timer
 
 
 # ----------------------- #
-#   CONFIG + CONNECTIONS  #
+#   CONFIG                #
 # ----------------------- #
 
 load_dotenv()
 
-app = Flask(__name__)
-
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 WEAVIATE_HTTP_URL = os.getenv("WEAVIATE_HTTP_URL", "http://localhost:8081")
 WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
+# Minimum seconds between Weaviate reconnect attempts after a failure
+WEAVIATE_RECONNECT_SECONDS = float(os.getenv("WEAVIATE_RECONNECT_SECONDS", "5"))
+# Optional Cohere endpoint override (proxies, local fakes for load tests)
+COHERE_BASE_URL = os.getenv("COHERE_BASE_URL", "")
+COHERE_TIMEOUT = float(os.getenv("COHERE_TIMEOUT", "60"))
+# Keep-alive connections per process for Cohere and Weaviate REST (serve.py sets it to WEB_THREADS)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "embed-multilingual-v3.0")
 CHAT_MODEL = os.getenv("CHAT_MODEL", "c4ai-aya-23") # Or use "c4ai-aya-23"
 
+# Query-embedding cache (set EMBED_CACHE_PATH to an empty string to keep it in memory only)
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", ".cache/query_embeddings.sqlite3")
+EMBED_CACHE_MEMORY_SIZE = int(os.getenv("EMBED_CACHE_MEMORY_SIZE", "1024"))
+EMBED_CACHE_DISK_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_DISK_MAX_ENTRIES", "50000"))
+
+# Semantic verdict cache
+VERDICT_CACHE_THRESHOLD = float(os.getenv("VERDICT_CACHE_THRESHOLD", "0.97"))
+VERDICT_CACHE_TTL_SECONDS = float(os.getenv("VERDICT_CACHE_TTL_SECONDS", "3600"))
+VERDICT_CACHE_CAPACITY = int(os.getenv("VERDICT_CACHE_CAPACITY", "256"))
+# How often (seconds) to re-check the collections for changes
+VERDICT_CACHE_CHECK_SECONDS = float(os.getenv("VERDICT_CACHE_CHECK_SECONDS", "30"))
+
+# Retrieval backend: "weaviate" (default) or "numpy" (in-process search over
+# snapshots exported with export_vectors.py into VECTOR_DATA_DIR)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "weaviate").lower()
+VECTOR_DATA_DIR = os.getenv("VECTOR_DATA_DIR", "vector_data")
+
+# Retrieval mode: "vector" (default) or "hybrid" (BM25 + vector, fused).
+# HYBRID_ALPHA weights the vector side (1 = vector only, 0 = keywords only);
+# HYBRID_FUSION is "relative_score" or "ranked" (reciprocal rank fusion).
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").lower()
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.5"))
+HYBRID_ALPHA_IPC = float(os.getenv("HYBRID_ALPHA_IPC", str(HYBRID_ALPHA)))
+HYBRID_ALPHA_PRECEDENTS = float(os.getenv("HYBRID_ALPHA_PRECEDENTS", str(HYBRID_ALPHA)))
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "relative_score").lower()
+
+# Parallel retrieval: per-leg timeouts (seconds) and pool size
+IPC_SEARCH_TIMEOUT = float(os.getenv("IPC_SEARCH_TIMEOUT", "5"))
+PRECEDENT_SEARCH_TIMEOUT = float(os.getenv("PRECEDENT_SEARCH_TIMEOUT", "5"))
+# A leg stops waiting at its timeout, but the Weaviate call keeps its pool thread until this
+# one, so it never exceeds the leg timeouts (a longer query could only starve the pool)
+WEAVIATE_QUERY_TIMEOUT = min(
+    float(os.getenv("WEAVIATE_QUERY_TIMEOUT", "5")), max(IPC_SEARCH_TIMEOUT, PRECEDENT_SEARCH_TIMEOUT)
+)
+# Two legs per request, so leave room for every batch item to search at once
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "16"))
+IPC_RESULT_LIMIT = int(os.getenv("IPC_RESULT_LIMIT", "3"))
+
+# Section number -> IPC chunk IDs, built at ingest (see section_index.py)
+SECTION_INDEX_PATH = os.getenv("SECTION_INDEX_PATH", "section_index.json")
+# Restrict precedent search to cases filed under the cited / retrieved IPC sections
+PRECEDENT_SECTION_FILTER = os.getenv("PRECEDENT_SECTION_FILTER", "1") == "1"
+# Without cited sections the filter comes from the IPC hits, which aren't known until that leg
+# ends: search this many precedents unfiltered alongside it, then rank the matching ones first
+PRECEDENT_FILTER_CANDIDATES = int(os.getenv("PRECEDENT_FILTER_CANDIDATES", "20"))
+
+# Token budget for IPC + precedent context in the chat prompt, shared out by retrieval score
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "1200"))
+CONTEXT_MIN_ITEM_TOKENS = int(os.getenv("CONTEXT_MIN_ITEM_TOKENS", "40"))
+
+# Query audit log (see audit_log.py); an empty AUDIT_LOG_PATH turns it off. `{pid}` = one file per process
+AUDIT_LOG_PATH = os.getenv("AUDIT_LOG_PATH", "logs/query_audit.jsonl")
+AUDIT_LOG_MAX_BYTES = int(os.getenv("AUDIT_LOG_MAX_BYTES", str(50 * 2 ** 20)))
+AUDIT_LOG_BACKUPS = int(os.getenv("AUDIT_LOG_BACKUPS", "5"))
+AUDIT_LOG_QUEUE_SIZE = int(os.getenv("AUDIT_LOG_QUEUE_SIZE", "1000"))
+
+# Batch API: Cohere accepts up to 96 texts per embed call
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "96"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "200"))
+BATCH_RETRIEVAL_WORKERS = int(os.getenv("BATCH_RETRIEVAL_WORKERS", "8"))
+BATCH_CHAT_WORKERS = int(os.getenv("BATCH_CHAT_WORKERS", "4"))
+
 # --- Define Port for Flask ---
 FLASK_PORT = 5001 # Define the port number here
 FLASK_HOST = "127.0.0.1"
 # --- End Define Port ---
 
-if not COHERE_API_KEY:
-    raise ValueError("❌ Missing COHERE_API_KEY in .env file.")
-
-# Initialize Cohere client
-try:
-    co = Client(COHERE_API_KEY)
-    print("✅ Cohere client initialized.")
-except Exception as e:
-    print(f"❌ Error initializing Cohere client: {e}")
-    exit()
-
-# Connect to Weaviate
-try:
-    client = weaviate.WeaviateClient(
-        connection_params=ConnectionParams.from_url(WEAVIATE_HTTP_URL, WEAVIATE_GRPC_PORT)
-    )
-    client.connect()
-    print("✅ Connected to Weaviate.")
-except Exception as e:
-    print(f"❌ Error connecting to Weaviate: {e}")
-    exit()
-
-# Get references to both collections
-ipc_collection = None
-precedent_collection = None
-try:
-    ipc_collection_name = "NLP"
-    precedent_collection_name = "Precedents"
-
-    collections = client.collections.list_all()
-    print("📚 Available collections:")
-    for name in collections: print(f"- {name}") # Corrected loop
-
-
-    if ipc_collection_name not in collections:
-        raise ValueError(f"❌ '{ipc_collection_name}' collection not found in Weaviate.")
-    ipc_collection = client.collections.get(ipc_collection_name)
-    print(f"✅ Using IPC collection: {ipc_collection_name}")
-
-    if precedent_collection_name not in collections:
-         raise ValueError(f"❌ '{precedent_collection_name}' collection not found in Weaviate.")
-    precedent_collection = client.collections.get(precedent_collection_name)
-    print(f"✅ Using Precedents collection: {precedent_collection_name}\n")
-
-except ValueError as ve:
-     print(ve)
-     if client.is_connected(): client.close()
-     exit()
-except Exception as e:
-     print(f"❌ Error getting collections from Weaviate: {e}")
-     if client.is_connected(): client.close()
-     exit()
+# Dev server only (`python app.py`); serve.py never opens a browser
+FLASK_DEBUG = os.getenv("FLASK_DEBUG", "1") == "1"
+OPEN_BROWSER = os.getenv("OPEN_BROWSER", "1") == "1"
+
+# Everything Services needs; create_app(overrides) can replace any of it
+DEFAULT_SETTINGS = {
+    name: value for name, value in globals().items()
+    if name.isupper() and not name.startswith("_")
+}
+
+bp = Blueprint("verdict", __name__)
+log = logging.getLogger(__name__)
+
+# Retrieval leg -> stage name in timings and metrics
+LEG_STAGES = {"ipc": "ipc_search", "precedents": "precedent_search"}
+
+
+def services():
+    """The Services instance of the app handling the current request."""
+    return current_app.extensions["services"]
 
 
 # ----------------------- #
-#   ROUTES                #
+#   HELPERS               #
 # ----------------------- #
 
-@app.route("/")
-def index():
-    """Serve the frontend."""
-    return render_template("index.html")
-
+def embed_query(svc, text, input_type="search_query"):
+    """Returns the query embedding, going to Cohere only on a cache miss.
 
-@app.route("/query", methods=["POST"])
-def query_verdict():
-    """Handle RAG query pipeline with IPC and Precedents."""
-    data = request.get_json()
-    user_query = data.get("query", "").strip()
+    Shares embed_queries' error handling, so a failed Cohere call raises
+    DependencyUnavailable (a 503) for /query just as it does for a batch.
+    """
+    return embed_queries(svc, [text], input_type)[0]
 
-    if not user_query:
-        return jsonify({"error": "Query cannot be empty"}), 400
 
-    print(f"\n🧠 New query received: {user_query}")
+def embed_queries(svc, texts, input_type="search_query"):
+    """Embeds many queries with as few co.embed calls as possible.
 
-    # Step 1: Generate query embedding
-    query_embedding = None # Initialize
+    Cached texts are served locally; the rest go to Cohere in batches of
+    EMBED_MAX_BATCH. Returns one entry per input text: the embedding, or the
+    exception raised for the batch that text was in. Raises
+    DependencyUnavailable when every batch failed and nothing came from the
+    cache, since then no text can be answered.
+    """
+    results = [svc.embedding_cache.get(EMBEDDING_MODEL, input_type, text) for text in texts]
+    for embedding in results:
+        metrics.record_cache("embedding", "miss" if embedding is None else "hit")
+    missing = sorted({text for text, embedding in zip(texts, results) if embedding is None})
+
+    embedded = {}
+    error, failed = None, 0
+    for i in range(0, len(missing), EMBED_MAX_BATCH):
+        batch = missing[i:i + EMBED_MAX_BATCH]
+        try:
+            response = svc.co.embed(model=EMBEDDING_MODEL, texts=batch, input_type=input_type)
+            if len(response.embeddings) != len(batch):
+                raise ValueError("Unexpected embedding response format from Cohere.")
+            for text, embedding in zip(batch, response.embeddings):
+                svc.embedding_cache.put(EMBEDDING_MODEL, input_type, text, embedding)
+                embedded[text] = embedding
+        except Exception as e:
+            log.error("❌ Cohere batch embedding failed for %d texts: %s", len(batch), e)
+            metrics.record_error("embed", "cohere")
+            svc.errors["cohere"] = str(e)
+            error, failed = e, failed + len(batch)
+            for text in batch:
+                embedded[text] = e
+
+    if error is not None and len(embedded) == failed and all(embedding is None for embedding in results):
+        if isinstance(error, DependencyUnavailable):
+            raise error
+        raise DependencyUnavailable(str(error)) from error
+    return [embedding if embedding is not None else embedded[text]
+            for text, embedding in zip(texts, results)]
+
+
+def refresh_verdict_cache(svc):
+    """Invalidates the verdict cache if NLP or Precedents changed since the last check."""
+    now = time.monotonic()
+    if now - svc.last_fingerprint_check < VERDICT_CACHE_CHECK_SECONDS:
+        return
+    svc.last_fingerprint_check = now
     try:
-        response = co.embed(
-            model=EMBEDDING_MODEL,
-            texts=[user_query],
-            input_type="search_query"
-        )
-        if hasattr(response, 'embeddings') and isinstance(response.embeddings, list) and response.embeddings:
-             query_embedding = response.embeddings[0]
-        else:
-             raise ValueError("Unexpected embedding response format from Cohere.")
-
-        print("✅ Query embedding generated.")
+        if svc.verdict_cache.check_fingerprint(svc.backend().fingerprint()):
+            log.info("♻️ Collections changed — verdict cache invalidated.")
     except Exception as e:
-        print(f"❌ Cohere embedding failed: {e}")
-        print(traceback.format_exc())
-        return jsonify({"answer": f"Embedding generation failed. Error: {e}"}), 500
+        # Without a fingerprint we can't vouch for cached rulings.
+        log.warning("⚠️ Could not fingerprint collections, clearing verdict cache: %s", e)
+        svc.verdict_cache.invalidate()
 
-    if query_embedding is None:
-         print("❌ Query embedding could not be generated or extracted.")
-         return jsonify({"answer": "Failed to generate query embedding."}), 500
 
+def verdict_cache_key(text):
+    """Exact-match key for a query; includes both models so config changes don't collide."""
+    return make_cache_key(f"{EMBEDDING_MODEL}|{CHAT_MODEL}", "verdict", text)
 
-    # Step 2: Retrieve similar chunks from BOTH Weaviate collections
-    ipc_results = []
-    precedent_results = []
-    try:
-        print("🔍 Searching Weaviate for relevant IPC sections...")
-        ipc_response = ipc_collection.query.near_vector(
-            near_vector=query_embedding,
-            limit=3,
-            return_properties=["text", "source"]
-        )
-        ipc_results = ipc_response.objects or []
-        print(f"✅ Retrieved {len(ipc_results)} IPC results.")
-
-        print("🔍 Searching Weaviate for relevant precedents...")
-        precedent_response = precedent_collection.query.near_vector(
-            near_vector=query_embedding,
-            limit=2,
-            return_properties=["case_summary", "case_name", "citation"]
-        )
-        precedent_results = precedent_response.objects or []
-        print(f"✅ Retrieved {len(precedent_results)} precedent results.")
 
-    except Exception as e:
-        print(f"❌ Weaviate query failed: {e}")
-        print(traceback.format_exc())
-        return jsonify({"answer": f"Error retrieving from Weaviate. Error: {e}"}), 500
+class EarlyResponse(Exception):
+    """Raised by pipeline stages to end a request early with a ready JSON payload."""
 
-    if not ipc_results and not precedent_results:
-         print("⚠️ No matching IPC sections or precedents found.")
-         return jsonify({
-             "answer": "⚠️ No relevant legal content or precedents found in the database for this query.",
-             "references": [],
-             "precedent_references": []
-            }), 200
+    def __init__(self, payload, status=200):
+        super().__init__(payload.get("answer") or payload.get("error"))
+        self.payload = payload
+        self.status = status
 
-    # Step 3: Build the combined context
-    ipc_context = "\n\n".join(
-        f"IPC Source: {obj.properties.get('source', 'N/A')}\nContent: {obj.properties.get('text', '')}"
-        for obj in ipc_results
-    ) if ipc_results else "No relevant IPC sections found."
 
-    precedent_context = "\n\n".join(
-        f"Case: {obj.properties.get('case_name', 'N/A')} ({obj.properties.get('citation', 'N/A')})\nSummary: {obj.properties.get('case_summary', '')}"
+def ipc_source_label(properties, default="N/A"):
+    """'punishments.pdf, p. 3' / 'pp. 3-4' when the chunk knows its pages."""
+    label = properties.get("source") or default
+    page_start, page_end = properties.get("page_start"), properties.get("page_end")
+    if page_start is None:
+        return label
+    if page_end is None or page_end == page_start:
+        return f"{label}, p. {page_start}"
+    return f"{label}, pp. {page_start}-{page_end}"
+
+
+def sections_in_results(ipc_results):
+    """IPC sections whose headings appear in the retrieved chunks, best hit first."""
+    sections = []
+    for obj in ipc_results:
+        for section in extract_sections(obj.properties.get("text") or ""):
+            if section not in sections:
+                sections.append(section)
+    return sections
+
+
+def context_items(ipc_results, precedent_results):
+    """Prompt entries for every retrieved object, in retrieval order."""
+    items = [
+        ContextItem("ipc", f"IPC Source: {ipc_source_label(obj.properties)}\nContent: ",
+                    obj.properties.get('text') or '', retrieval_score(obj))
+        for obj in ipc_results
+    ]
+    items += [
+        # Objects stored before case_digest existed fall back to the raw summary (run backfill_case_digests.py)
+        ContextItem("precedents", f"Case: {obj.properties.get('case_name', 'N/A')} ({obj.properties.get('citation', 'N/A')})\nSummary: ",
+                    obj.properties.get('case_digest') or obj.properties.get('case_summary') or '', retrieval_score(obj))
         for obj in precedent_results
-    ) if precedent_results else "No relevant precedents found."
+    ]
+    return items
 
 
-    # Step 4: Use Cohere Chat with updated prompt
-    prompt = f"""
+def build_prompt(user_query, ipc_results, precedent_results):
+    """Builds the combined IPC + precedent context and the judge prompt.
+
+    Returns (prompt, context stats); see context_builder.py for the budget.
+    """
+    sections, context_stats = build_context(context_items(ipc_results, precedent_results),
+                                            PROMPT_CONTEXT_TOKENS, CONTEXT_MIN_ITEM_TOKENS)
+    ipc_context = "\n\n".join(sections.get("ipc", [])) or "No relevant IPC sections found."
+    precedent_context = "\n\n".join(sections.get("precedents", [])) or "No relevant precedents found."
+
+    return f"""
     You are acting as a legal judge in India. Your task is to analyze a given case scenario based *strictly* on the provided sections of the Indian Penal Code (IPC) and relevant legal precedents summaries.
 
     **Instructions:**
@@ -208,30 +295,22 @@ def query_verdict():
     {user_query}
 
     **--- YOUR RULING ---**
-    """
+    """, context_stats
 
-    answer = "⚠️ Failed to generate answer."
-    try:
-        print(f"💬 Sending prompt to Cohere Chat model ({CHAT_MODEL})...")
-        chat_response = co.chat(
-            model=CHAT_MODEL,
-            message=prompt,
-            temperature=0.3,
-            max_tokens=800
-        )
 
-        answer = chat_response.text.strip()
-        print("✅ Cohere Chat answer generated.\n")
+def retrieved_hits(results):
+    """[{"id", "score"}] for the retrieved objects, as returned to clients and audited."""
+    hits = []
+    for obj in results:
+        score = retrieval_score(obj)
+        hits.append({"id": str(obj.uuid), "score": round(score, 4) if score is not None else None})
+    return hits
 
-    except Exception as e:
-        print(f"❌ Cohere Chat failed: {e}")
-        print(traceback.format_exc())
-        answer = f"⚠️ Failed to generate answer via Cohere Chat. Error: {e}"
-        return jsonify({"answer": answer, "references": [], "precedent_references": []}), 500
 
-    # Prepare references to return (WITH SNIPPETS for IPC)
+def build_references(ipc_results, precedent_results):
+    """References returned to the client (WITH SNIPPETS for IPC)."""
     ipc_refs = [
-        f"{obj.properties.get('source', 'IPC Section')}: \"{obj.properties.get('text', '')[:75]}...\""
+        f"{ipc_source_label(obj.properties, 'IPC Section')}: \"{obj.properties.get('text', '')[:75]}...\""
         for obj in ipc_results
     ]
 
@@ -239,14 +318,558 @@ def query_verdict():
         f"{obj.properties.get('case_name', 'N/A')} ({obj.properties.get('citation', 'N/A')})"
          for obj in precedent_results
     ]
+    return ipc_refs, precedent_refs
 
-    return jsonify({
-        "answer": answer,
+
+def prepare_verdict(svc, user_query, query_embedding=None):
+    """Steps 0–3 of the pipeline: cache check, embedding, retrieval, prompt.
+
+    `query_embedding` may be passed in when it was already computed (batch
+    requests). Returns a context dict for the chat step, or raises
+    EarlyResponse when the request can be answered (or must fail) without
+    calling Cohere Chat.
+    """
+    timings = {}
+
+    # Step 0: Serve identical queries straight from the verdict cache
+    refresh_verdict_cache(svc)
+    query_key = verdict_cache_key(user_query)
+    cached = svc.verdict_cache.get_exact(query_key)
+    metrics.record_cache("verdict", "exact_miss" if cached is None else "exact_hit")
+    if cached is not None:
+        log.info("⚡ Verdict served from cache (exact match).")
+        raise EarlyResponse({**cached, "cached": True})
+
+    # Step 1: Generate query embedding
+    try:
+        if query_embedding is None:
+            embed_start = time.perf_counter()
+            query_embedding = embed_query(svc, user_query)
+            timings["embed_ms"] = round((time.perf_counter() - embed_start) * 1000, 1)
+            log.debug("✅ Query embedding generated.")
+        elif isinstance(query_embedding, Exception):
+            raise query_embedding  # This batch item's Cohere call failed
+    except Exception as e:
+        # embed_queries has already logged and counted the failure
+        raise EarlyResponse({"answer": f"Embedding service unavailable. Error: {e}"}, 503)
+    svc.errors.pop("cohere", None)
+
+    # Step 2: Retrieve similar chunks from BOTH collections, in parallel
+    try:
+        retrieval_backend = svc.backend()
+    except DependencyUnavailable as e:
+        log.error("❌ %s", e)
+        metrics.record_error("retrieval", RETRIEVAL_BACKEND)
+        raise EarlyResponse({"answer": f"Retrieval is unavailable right now. Error: {e}", "timings": timings}, 503)
+
+    # Sections the query names outright ("Section 304B", "IPC 420") are fetched by ID;
+    # vector search only fills the IPC slots they leave
+    sections = find_references(user_query)
+    section_ids = svc.section_index.refresh().lookup(sections, IPC_RESULT_LIMIT) if sections else []
+    if sections:
+        log.debug("📌 Query cites section(s) %s: %d indexed chunk(s).", ", ".join(sections), len(section_ids))
+
+    ipc_hybrid = precedent_hybrid = None
+    if RETRIEVAL_MODE == "hybrid":
+        ipc_hybrid = HybridQuery(user_query, HYBRID_ALPHA_IPC, HYBRID_FUSION)
+        precedent_hybrid = HybridQuery(user_query, HYBRID_ALPHA_PRECEDENTS, HYBRID_FUSION)
+
+    log.debug("🔍 Searching %s (%s) for relevant IPC sections and precedents...", retrieval_backend.name, RETRIEVAL_MODE)
+    retrieval_start = time.perf_counter()
+    timeouts = {"ipc": IPC_SEARCH_TIMEOUT, "precedents": PRECEDENT_SEARCH_TIMEOUT}
+    ipc_leg = lambda: search_ipc_with_sections(retrieval_backend, section_ids, query_embedding,
+                                               limit=IPC_RESULT_LIMIT, hybrid=ipc_hybrid)
+    if PRECEDENT_SECTION_FILTER and not sections:
+        # The filter comes from the IPC hits; rather than wait for them, fetch candidates side by side
+        legs = svc.retriever.run(
+            {
+                "ipc": ipc_leg,
+                "precedents": lambda: precedent_candidates(retrieval_backend, query_embedding,
+                                                           PRECEDENT_FILTER_CANDIDATES, hybrid=precedent_hybrid),
+            },
+            timeouts,
+        )
+        precedent_sections = sections_in_results(legs["ipc"].objects)
+        if legs["precedents"].ok:
+            legs["precedents"].objects = prefer_sections(legs["precedents"].objects, precedent_sections, 2)
+    else:
+        # Cited sections are known up front, so both legs still run side by side
+        precedent_sections = sections if PRECEDENT_SECTION_FILTER else []
+        legs = svc.retriever.run(
+            {
+                "ipc": ipc_leg,
+                "precedents": lambda: search_precedents(retrieval_backend, query_embedding, limit=2,
+                                                        sections=precedent_sections, hybrid=precedent_hybrid),
+            },
+            timeouts,
+        )
+    if precedent_sections:
+        log.debug("🎯 Precedent search narrowed to section(s) %s.", ", ".join(precedent_sections))
+    timings["retrieval_ms"] = round((time.perf_counter() - retrieval_start) * 1000, 1)
+    timings["ipc_search_ms"] = round(legs["ipc"].elapsed_ms, 1)
+    timings["precedent_search_ms"] = round(legs["precedents"].elapsed_ms, 1)
+
+    retrieval_errors = {name: leg.error for name, leg in legs.items() if not leg.ok}
+    for name, error in retrieval_errors.items():
+        log.warning("⚠️ %s %s search failed: %s", retrieval_backend.name, name, error)
+        metrics.record_error(LEG_STAGES[name], retrieval_backend.name)
+    if retrieval_errors:
+        svc.report_backend_failure(next(iter(retrieval_errors.values())))
+    if len(retrieval_errors) == len(legs):
+        raise EarlyResponse({
+            "answer": f"Error retrieving from {retrieval_backend.name}. Error: {retrieval_errors}",
+            "timings": timings
+        }, 500)
+
+    ipc_results = legs["ipc"].objects
+    precedent_results = legs["precedents"].objects
+    log.info("✅ Retrieved %d IPC results and %d precedent results in %s ms (IPC %s ms, precedents %s ms).",
+             len(ipc_results), len(precedent_results), timings["retrieval_ms"],
+             timings["ipc_search_ms"], timings["precedent_search_ms"])
+
+    if not ipc_results and not precedent_results:
+        log.warning("⚠️ No matching IPC sections or precedents found.")
+        raise EarlyResponse({
+            "answer": "⚠️ No relevant legal content or precedents found in the database for this query.",
+            "references": [],
+            "precedent_references": [],
+            "timings": timings
+        })
+
+    # Near-duplicate scenario with the same retrieved evidence? Reuse its ruling.
+    ipc_ids = [str(obj.uuid) for obj in ipc_results]
+    precedent_ids = [str(obj.uuid) for obj in precedent_results]
+    cached = svc.verdict_cache.lookup(query_embedding, ipc_ids, precedent_ids)
+    metrics.record_cache("verdict", "semantic_miss" if cached is None else "semantic_hit")
+    if cached is not None:
+        log.info("⚡ Verdict served from cache (semantic match).")
+        raise EarlyResponse({**cached, "cached": True, "timings": timings})
+
+    # Step 3: Build the combined context
+    ipc_refs, precedent_refs = build_references(ipc_results, precedent_results)
+    prompt_start = time.perf_counter()
+    prompt, context_stats = build_prompt(user_query, ipc_results, precedent_results)
+    timings["prompt_ms"] = round((time.perf_counter() - prompt_start) * 1000, 1)
+    log.debug("🧮 Context: ~%d of %d tokens (~%d before budgeting; %d truncated, %d dropped).",
+              context_stats["context_tokens"], context_stats["budget_tokens"], context_stats["full_tokens"],
+              context_stats["truncated"], context_stats["dropped"])
+    return {
+        "query": user_query,
+        "query_key": query_key,
+        "embedding": query_embedding,
+        "ipc_ids": ipc_ids,
+        "precedent_ids": precedent_ids,
+        "prompt": prompt,
         "references": ipc_refs,
-        "precedent_references": precedent_refs
+        "precedent_references": precedent_refs,
+        "retrieved": {"ipc": retrieved_hits(ipc_results), "precedents": retrieved_hits(precedent_results)},
+        "retrieval_errors": retrieval_errors,
+        "timings": timings,
+    }
+
+
+def generate_answer(svc, ctx):
+    """Step 4: asks Cohere Chat for the ruling. Raises on failure."""
+    log.debug("💬 Sending prompt to Cohere Chat model (%s)...", CHAT_MODEL)
+    chat_start = time.perf_counter()
+    chat_response = svc.co.chat(
+        model=CHAT_MODEL,
+        message=ctx["prompt"],
+        temperature=0.3,
+        max_tokens=800
+    )
+    ctx["timings"]["chat_ms"] = round((time.perf_counter() - chat_start) * 1000, 1)
+    log.info("✅ Cohere Chat answer generated in %s ms.", ctx["timings"]["chat_ms"])
+    return chat_response.text.strip()
+
+
+def finish_verdict(svc, ctx, answer):
+    """Caches a generated ruling and builds the final response payload."""
+    result = {
+        "answer": answer,
+        "references": ctx["references"],
+        "precedent_references": ctx["precedent_references"],
+        "retrieved": ctx["retrieved"],
+    }
+    if not ctx["retrieval_errors"]:
+        # Don't let a ruling built on partial evidence answer future queries.
+        svc.verdict_cache.put(ctx["query_key"], ctx["embedding"], ctx["ipc_ids"], ctx["precedent_ids"], result)
+
+    response = {**result, "timings": ctx["timings"]}
+    if ctx["retrieval_errors"]:
+        response["retrieval_errors"] = ctx["retrieval_errors"]
+    return response
+
+
+def read_query():
+    """Pulls and validates the query text from the JSON body."""
+    data = request.get_json(silent=True) or {}
+    user_query = (data.get("query") or "").strip()
+    if not user_query:
+        raise EarlyResponse({"error": "Query cannot be empty"}, 400)
+    log.info("🧠 New query received: %s", user_query)
+    return user_query
+
+
+def request_elapsed_ms():
+    return round((time.perf_counter() - g.request_start) * 1000, 1)
+
+
+def audit_query(svc, endpoint, user_query, status, payload, total_ms):
+    """Queues the audit record for one answered query (see audit_log.py); never blocks."""
+    retrieved = payload.get("retrieved") or {}
+    record = {
+        "endpoint": endpoint,
+        "query": user_query,
+        "status": status,
+        "cached": bool(payload.get("cached")),
+        "ipc": retrieved.get("ipc", []),
+        "precedents": retrieved.get("precedents", []),
+        "timings": {**(payload.get("timings") or {}), "total_ms": total_ms},
+        "models": {"embedding": EMBEDDING_MODEL, "chat": CHAT_MODEL},
+        "retrieval": {"backend": RETRIEVAL_BACKEND, "mode": RETRIEVAL_MODE},
+        "answer_chars": len(payload.get("answer") or "") if status == 200 else 0,
+    }
+    if status != 200:
+        record["error"] = payload.get("error") or payload.get("answer")
+    svc.audit_log.record(record)
+
+
+def sse_event(event, data):
+    """Formats one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# ----------------------- #
+#   REQUEST METRICS       #
+# ----------------------- #
+
+def endpoint_label():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+@bp.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.stage_timings = {}  # Routes point this at the request's timings dict
+    metrics.IN_FLIGHT.labels(endpoint_label()).inc()
+
+
+@bp.after_request
+def add_server_timing(response):
+    """Records the stage timings and sends them back as a Server-Timing header.
+
+    The request itself is counted once its last byte is sent (call_on_close),
+    so streamed verdicts stay in flight until the stream ends.
+    """
+    start, endpoint, status = g.request_start, endpoint_label(), str(response.status_code)
+    metrics.observe_stages(g.stage_timings)
+    response.headers["Server-Timing"] = metrics.server_timing(g.stage_timings,
+                                                              round((time.perf_counter() - start) * 1000, 1))
+
+    def finish():
+        metrics.IN_FLIGHT.labels(endpoint).dec()
+        metrics.REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - start)
+        metrics.REQUESTS.labels(endpoint, status).inc()
+    response.call_on_close(finish)
+    return response
+
+
+# ----------------------- #
+#   ROUTES                #
+# ----------------------- #
+
+@bp.route("/")
+def index():
+    """Serve the frontend."""
+    return render_template("index.html")
+
+
+@bp.route("/query", methods=["POST"])
+def query_verdict():
+    """Handle RAG query pipeline with IPC and Precedents."""
+    svc = services()
+    try:
+        user_query = read_query()
+        ctx = prepare_verdict(svc, user_query)
+    except EarlyResponse as early:
+        g.stage_timings = early.payload.get("timings") or {}
+        if early.status != 400:
+            audit_query(svc, "/query", user_query, early.status, early.payload, request_elapsed_ms())
+        return jsonify(early.payload), early.status
+    g.stage_timings = ctx["timings"]
+
+    # Step 4: Use Cohere Chat with updated prompt
+    try:
+        answer = generate_answer(svc, ctx)
+    except Exception as e:
+        log.exception("❌ Cohere Chat failed: %s", e)
+        metrics.record_error("chat", "cohere")
+        svc.errors["cohere"] = str(e)
+        answer = f"⚠️ Failed to generate answer via Cohere Chat. Error: {e}"
+        audit_query(svc, "/query", user_query, 500,
+                    {"answer": answer, "retrieved": ctx["retrieved"], "timings": ctx["timings"]}, request_elapsed_ms())
+        return jsonify({"answer": answer, "references": [], "precedent_references": []}), 500
+
+    response = finish_verdict(svc, ctx, answer)
+    audit_query(svc, "/query", user_query, 200, response, request_elapsed_ms())
+    return jsonify(response)
+
+
+@bp.route("/query/stream", methods=["POST"])
+def query_verdict_stream():
+    """Streaming variant of /query over Server-Sent Events.
+
+    Emits `references` as soon as retrieval finishes, then `token` events as
+    Cohere streams the ruling, then `done` with the full answer. Validation and
+    retrieval failures are returned as plain JSON, exactly like /query.
+    """
+    svc = services()
+    try:
+        user_query = read_query()
+        ctx = prepare_verdict(svc, user_query)
+    except EarlyResponse as early:
+        g.stage_timings = early.payload.get("timings") or {}
+        if early.status != 400:
+            audit_query(svc, "/query/stream", user_query, early.status, early.payload, request_elapsed_ms())
+        if early.status != 200:
+            return jsonify(early.payload), early.status
+        ctx = None
+        cached = early.payload
+    else:
+        # Headers go out before the chat call, so Server-Timing only covers retrieval;
+        # the chat stages are recorded when the stream ends
+        g.stage_timings = dict(ctx["timings"])
+
+    def generate():
+        if ctx is None:
+            # Cached ruling (or nothing retrieved): send it in one go.
+            yield sse_event("references", {
+                "references": cached.get("references", []),
+                "precedent_references": cached.get("precedent_references", []),
+            })
+            yield sse_event("token", {"text": cached["answer"]})
+            yield sse_event("done", cached)
+            return
+
+        yield sse_event("references", {
+            "references": ctx["references"],
+            "precedent_references": ctx["precedent_references"],
+            "timings": ctx["timings"],
+        })
+
+        parts = []
+        try:
+            log.debug("💬 Streaming prompt to Cohere Chat model (%s)...", CHAT_MODEL)
+            chat_start = time.perf_counter()
+            for event in svc.co.chat_stream(
+                model=CHAT_MODEL,
+                message=ctx["prompt"],
+                temperature=0.3,
+                max_tokens=800
+            ):
+                if event.event_type == "text-generation":
+                    if not parts:
+                        ctx["timings"]["chat_first_token_ms"] = round((time.perf_counter() - chat_start) * 1000, 1)
+                    parts.append(event.text)
+                    yield sse_event("token", {"text": event.text})
+            ctx["timings"]["chat_ms"] = round((time.perf_counter() - chat_start) * 1000, 1)
+            log.info("✅ Cohere Chat answer streamed in %s ms.", ctx["timings"]["chat_ms"])
+            metrics.observe_stages({key: ctx["timings"][key] for key in ("chat_first_token_ms", "chat_ms")
+                                    if key in ctx["timings"]})
+        except Exception as e:
+            log.exception("❌ Cohere Chat stream failed: %s", e)
+            metrics.record_error("chat", "cohere")
+            svc.errors["cohere"] = str(e)
+            answer = f"⚠️ Failed to generate answer via Cohere Chat. Error: {e}"
+            audit_query(svc, "/query/stream", user_query, 500,
+                        {"answer": answer, "retrieved": ctx["retrieved"], "timings": ctx["timings"]},
+                        request_elapsed_ms())
+            yield sse_event("error", {"answer": answer})
+            return
+
+        response = finish_verdict(svc, ctx, "".join(parts).strip())
+        audit_query(svc, "/query/stream", user_query, 200, response, request_elapsed_ms())
+        yield sse_event("done", response)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def run_batch_item(svc, index, user_query, query_embedding):
+    """Retrieval for one batch item; returns (index, ctx, None) or (index, None, EarlyResponse)."""
+    try:
+        return index, prepare_verdict(svc, user_query, query_embedding), None
+    except EarlyResponse as early:
+        return index, None, early
+
+
+@bp.route("/query/batch", methods=["POST"])
+def query_verdict_batch():
+    """Run many scenarios through the pipeline in one request.
+
+    Body: {"queries": ["...", ...]}. Queries are embedded with as few
+    co.embed calls as possible, retrieval for all items runs concurrently, and
+    chat generation goes through a bounded worker pool. Each item gets its own
+    result or error, so one bad scenario does not fail the batch. If no query
+    can be embedded at all, the whole batch gets a 503.
+    """
+    svc = services()
+    data = request.get_json(silent=True) or {}
+    queries = data.get("queries")
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "'queries' must be a non-empty list"}), 400
+    if len(queries) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} queries per batch"}), 400
+
+    log.info("📦 Batch of %d queries received.", len(queries))
+    batch_start = time.perf_counter()
+    results = [None] * len(queries)
+
+    valid = []
+    for index, item in enumerate(queries):
+        user_query = item.get("query") if isinstance(item, dict) else item
+        user_query = user_query.strip() if isinstance(user_query, str) else ""
+        if not user_query:
+            results[index] = {"index": index, "status": 400, "error": "Query cannot be empty"}
+        else:
+            valid.append((index, user_query))
+
+    embed_start = time.perf_counter()
+    try:
+        embeddings = embed_queries(svc, [user_query for _, user_query in valid])
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"Embedding service unavailable. Error: {e}"}), 503
+    embed_ms = round((time.perf_counter() - embed_start) * 1000, 1)
+    g.stage_timings = {"embed_ms": embed_ms}
+    log.debug("✅ Batch embeddings ready in %s ms.", embed_ms)
+
+    def chat_item(index, ctx):
+        try:
+            answer = generate_answer(svc, ctx)
+            return index, {"status": 200, **finish_verdict(svc, ctx, answer)}
+        except Exception as e:
+            log.error("❌ Cohere Chat failed for batch item %d: %s", index, e)
+            metrics.record_error("chat", "cohere")
+            svc.errors["cohere"] = str(e)
+            return index, {
+                "status": 500,
+                "error": f"⚠️ Failed to generate answer via Cohere Chat. Error: {e}",
+                "references": ctx["references"],
+                "precedent_references": ctx["precedent_references"],
+                "timings": ctx["timings"],
+            }
+
+    chat_futures = []
+    retrieval_futures = [
+        svc.batch_retrieval_pool.submit(run_batch_item, svc, index, user_query, embedding)
+        for (index, user_query), embedding in zip(valid, embeddings)
+    ]
+    for future in as_completed(retrieval_futures):
+        index, ctx, early = future.result()
+        if early is not None:
+            payload = dict(early.payload)
+            if early.status != 200:
+                payload["error"] = payload.pop("answer", None) or payload.get("error")
+            results[index] = {"status": early.status, **payload}
+        else:
+            chat_futures.append(svc.batch_chat_pool.submit(chat_item, index, ctx))
+
+    for future in as_completed(chat_futures):
+        index, payload = future.result()
+        results[index] = payload
+
+    for index, user_query in valid:
+        results[index] = {"index": index, "query": user_query, **results[index]}
+
+    total_ms = round((time.perf_counter() - batch_start) * 1000, 1)
+    failed = sum(1 for result in results if result["status"] != 200)
+    for result in results:
+        metrics.observe_stages(result.get("timings") or {})  # Per item; the shared embed call is in g.stage_timings
+        if result["status"] != 400:
+            # Items wait for the whole batch, so that is their total
+            audit_query(svc, "/query/batch", result["query"], result["status"], result, total_ms)
+    log.info("✅ Batch finished in %s ms (%d ok, %d failed).", total_ms, len(results) - failed, failed)
+    return jsonify({
+        "results": results,
+        "timings": {"embed_ms": embed_ms, "total_ms": total_ms},
     })
 
 
+@bp.route("/cache/stats")
+def cache_stats():
+    """Report embedding and verdict cache hit/miss/eviction counters."""
+    svc = services()
+    return jsonify({
+        "embedding_cache": svc.embedding_cache.stats(),
+        "verdict_cache": svc.verdict_cache.stats(),
+        "audit_log": svc.audit_log.stats(),
+    })
+
+
+@bp.route("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition of the pipeline metrics (all workers under serve.py)."""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
+@bp.route("/healthz")
+def healthz():
+    """Liveness: the process is up and serving. Never touches dependencies."""
+    return jsonify({
+        "status": "ok",
+        "uptime_s": round(time.monotonic() - current_app.config["STARTED_AT"], 1),
+        "startup_ms": current_app.config["STARTUP_MS"],
+    })
+
+
+@bp.route("/readyz")
+def readyz():
+    """Readiness: per-dependency status; 503 until Cohere and retrieval are usable."""
+    report = services().readiness()
+    ready = all(check["ok"] for check in report.values())
+    return jsonify({"status": "ready" if ready else "not ready", "dependencies": report}), 200 if ready else 503
+
+
+# ----------------------- #
+#   APP FACTORY           #
+# ----------------------- #
+
+def create_app(settings=None, svc=None):
+    """Builds the Flask app. No network I/O happens here.
+
+    `settings` overrides DEFAULT_SETTINGS; `svc` injects a ready-made
+    Services (or stand-in), e.g. for tests.
+    """
+    factory_start = time.perf_counter()
+    configure_logging()
+    app = Flask(__name__)
+    app.extensions["services"] = svc or Services({**DEFAULT_SETTINGS, **(settings or {})})
+    app.register_blueprint(bp)
+    app.config["STARTED_AT"] = time.monotonic()
+    app.config["STARTUP_MS"] = {
+        "import": round((factory_start - _IMPORT_START) * 1000, 1),
+        "create_app": round((time.perf_counter() - factory_start) * 1000, 1),
+    }
+    return app
+
+
+def __getattr__(name):
+    """Module-level `app` for `flask run` / `gunicorn app:app`, built on first access.
+
+    Not at import time: serve.py imports this module in the gunicorn master,
+    which must not open caches or start log / audit threads before the fork.
+    """
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # ----------------------- #
 #   MAIN ENTRY POINT      #
 # ----------------------- #
@@ -260,10 +883,15 @@ def open_browser():
 # --- END NEW Function ---
 
 if __name__ == "__main__":
+    app = create_app()
+    print(f"⏱️ Startup: {app.config['STARTUP_MS']} ms")
+    print("ℹ️ Development server. For real traffic use: python serve.py")
+
     # Use a timer to open the browser 1 second after app.run is called
-    Timer(1, open_browser).start()
+    if OPEN_BROWSER:
+        Timer(1, open_browser).start()
 
     # Run the Flask app
     # Use host='0.0.0.0' if you want it accessible from other devices on your network
     # For local development, '127.0.0.1' (or default) is fine.
-    app.run(debug=True, host=FLASK_HOST, port=FLASK_PORT)
\ No newline at end of file
+    app.run(debug=FLASK_DEBUG, host=FLASK_HOST, port=FLASK_PORT)
\ No newline at end of file
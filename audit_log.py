@@ -0,0 +1,115 @@
+"""
+audit_log.py
+-------------
+Append-only JSONL record of every verdict request, for capacity planning and
+regression testing (replay it with replay_audit.py).
+
+Request threads hand records to a bounded in-memory queue and return; one
+background thread per process writes them to AUDIT_LOG_PATH, rotating the
+file at AUDIT_LOG_MAX_BYTES and keeping AUDIT_LOG_BACKUPS old files. When the
+queue is full (the disk can't keep up) records are dropped and counted rather
+than slowing requests down.
+
+One record per line:
+
+    {"ts": "2026-10-17T09:12:03.511Z", "endpoint": "/query", "query": "...",
+     "status": 200, "cached": false,
+     "ipc": [{"id": "...", "score": 0.61}, ...], "precedents": [...],
+     "timings": {"embed_ms": 81.2, ..., "total_ms": 1012.4},
+     "models": {"embedding": "...", "chat": "..."},
+     "retrieval": {"backend": "weaviate", "mode": "vector"},
+     "answer_chars": 1834}
+
+Server workers are separate processes, so a `{pid}` in the path gives each
+one its own file (serve.py does this by default); replay_audit.py merges them.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AuditLog:
+    """Bounded, non-blocking JSONL writer with size-based rotation."""
+
+    def __init__(self, path, max_bytes=50 * 2 ** 20, backups=5, queue_size=1000):
+        self.path = path.replace("{pid}", str(os.getpid())) if path else None
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats_counters = {"written": 0, "dropped": 0, "failed": 0}
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def record(self, entry):
+        """Queues one record; never blocks. Returns False if it was dropped."""
+        if not self.enabled:
+            return False
+        if self._thread is None:
+            self._start()
+        entry = {"ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"), **entry}
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.stats_counters["dropped"] += 1
+            return False
+
+    def _start(self):
+        # Started on first use, so the thread belongs to the process (server worker) that writes
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # RotatingFileHandler brings the rollover logic; it only ever sees preformatted lines
+        handler = logging.handlers.RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                                       backupCount=self.backups, encoding="utf-8")
+        try:
+            while True:
+                entry = self._queue.get()
+                if entry is _STOP:
+                    return
+                try:
+                    line = json.dumps(entry, ensure_ascii=False, default=str)
+                    record = logging.makeLogRecord({"msg": line, "levelno": logging.INFO})
+                    if handler.shouldRollover(record):
+                        handler.doRollover()
+                    handler.stream.write(line + "\n")
+                    handler.stream.flush()
+                    self.stats_counters["written"] += 1
+                except Exception as e:
+                    self.stats_counters["failed"] += 1
+                    log.warning("⚠️ Audit record not written: %s", e)
+        finally:
+            handler.close()
+
+    def stats(self):
+        return {"path": self.path, "queued": self._queue.qsize(), **self.stats_counters}
+
+    def close(self, timeout=5):
+        """Writes what is queued (for up to `timeout` seconds), then stops the writer."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,66 @@
+"""
+backfill_case_digests.py
+-------------------------
+Adds (or refreshes) the `case_digest` property on Precedents from their stored
+`case_summary`, without re-embedding anything.
+
+The loader only writes digests for cases it inserts or updates, so run this
+once after upgrading an existing collection, and again whenever the digest
+rules in precedent_records.py change. Only objects whose stored digest differs
+are patched, so the script is safe to re-run.
+
+    python backfill_case_digests.py
+"""
+
+import os
+
+import weaviate
+from dotenv import load_dotenv
+from weaviate.connect import ConnectionParams
+
+from precedent_records import case_digest
+from schema import PRECEDENTS_COLLECTION, PRECEDENT_PROPERTIES, bump_data_version, ensure_properties
+
+load_dotenv()
+WEAVIATE_HTTP_URL = os.getenv("WEAVIATE_HTTP_URL", "http://localhost:8081")
+WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
+
+
+if __name__ == "__main__":
+    client = weaviate.WeaviateClient(
+        connection_params=ConnectionParams.from_url(WEAVIATE_HTTP_URL, WEAVIATE_GRPC_PORT)
+    )
+    client.connect()
+    try:
+        collection = client.collections.get(PRECEDENTS_COLLECTION)
+        for added in ensure_properties(collection, PRECEDENT_PROPERTIES):
+            print(f"➕ Added missing property '{added}' to {PRECEDENTS_COLLECTION}.")
+
+        seen = updated = failed = 0
+        summary_chars = digest_chars = 0
+        for obj in collection.iterator(return_properties=["case_summary", "case_digest"]):
+            seen += 1
+            summary = obj.properties.get("case_summary") or ""
+            digest = case_digest(summary)
+            summary_chars += len(summary)
+            digest_chars += len(digest)
+            if obj.properties.get("case_digest") == digest:
+                continue
+            try:
+                collection.data.update(uuid=obj.uuid, properties={"case_digest": digest})
+                updated += 1
+            except Exception as e:
+                print(f"   ⚠️ Could not update digest of {obj.uuid}: {e}")
+                failed += 1
+        if updated:
+            bump_data_version(client, PRECEDENTS_COLLECTION)
+
+        print(f"✅ Updated digests on {updated} of {seen} precedents ({seen - updated - failed} already up to date).")
+        if summary_chars:
+            print(f"✂️ Digests are {digest_chars / summary_chars:.0%} of the summary text "
+                  f"({summary_chars} -> {digest_chars} characters).")
+        if failed:
+            print(f"⚠️ {failed} updates failed. Run the script again to retry them.")
+    finally:
+        client.close()
+        print("🔒 Weaviate connection closed.")
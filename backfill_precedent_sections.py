@@ -0,0 +1,81 @@
+"""
+backfill_precedent_sections.py
+-------------------------------
+Adds the `ipc_sections` property to Precedents that were loaded before it
+existed, without re-embedding anything.
+
+The sections are read from the same `ipc_<section>_cases.csv` files the
+loader uses: every case gets the list of files (sections) it appears in.
+Only objects whose stored list differs are patched, so the script is safe to
+re-run. (Re-running load_precedents.py does the same as part of a load.)
+
+    python backfill_precedent_sections.py
+"""
+
+import glob
+import os
+
+import weaviate
+from dotenv import load_dotenv
+from weaviate.connect import ConnectionParams
+
+from precedent_records import fetch_existing, read_case_chunks, update_sections
+from schema import PRECEDENTS_COLLECTION, PRECEDENT_PROPERTIES, bump_data_version, ensure_properties
+
+load_dotenv()
+WEAVIATE_HTTP_URL = os.getenv("WEAVIATE_HTTP_URL", "http://localhost:8081")
+WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
+CSV_FILE_PATTERN = "ipc_*_cases.csv"
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "500"))
+LOOKUP_BATCH = 500  # IDs per existence lookup
+
+
+def collect_case_sections(csv_files):
+    """{object_id: set of sections} over every CSV, keyed the same way the loader keys objects."""
+    case_sections = {}
+    for csv_filename in csv_files:
+        for frame in read_case_chunks(csv_filename, CSV_CHUNK_ROWS):
+            for object_id, section in zip(frame['uuid'], frame['ipc_section']):
+                if section:
+                    case_sections.setdefault(object_id, set()).add(section)
+    return case_sections
+
+
+if __name__ == "__main__":
+    csv_files = sorted(glob.glob(CSV_FILE_PATTERN))
+    if not csv_files:
+        print(f"❌ No CSV files found matching the pattern '{CSV_FILE_PATTERN}'. Exiting.")
+        exit()
+    case_sections = collect_case_sections(csv_files)
+    print(f"📂 {len(case_sections)} cases across {len(csv_files)} section files.")
+
+    client = weaviate.WeaviateClient(
+        connection_params=ConnectionParams.from_url(WEAVIATE_HTTP_URL, WEAVIATE_GRPC_PORT)
+    )
+    client.connect()
+    try:
+        collection = client.collections.get(PRECEDENTS_COLLECTION)
+        for added in ensure_properties(collection, PRECEDENT_PROPERTIES):
+            print(f"➕ Added missing property '{added}' to {PRECEDENTS_COLLECTION}.")
+
+        object_ids = list(case_sections)
+        updated = failed = missing = 0
+        for start in range(0, len(object_ids), LOOKUP_BATCH):
+            chunk = {object_id: case_sections[object_id] for object_id in object_ids[start:start + LOOKUP_BATCH]}
+            stored = fetch_existing(collection, list(chunk))
+            missing += len(chunk) - len(stored)
+            chunk_updated, chunk_failed = update_sections(collection, chunk, {
+                object_id: sections for object_id, (_, sections) in stored.items()
+            })
+            updated += chunk_updated
+            failed += chunk_failed
+        if updated:
+            bump_data_version(client, PRECEDENTS_COLLECTION)
+
+        print(f"✅ Updated sections on {updated} precedents "
+              f"({len(object_ids) - updated - missing - failed} already up to date, {missing} not in Weaviate).")
+        if failed:
+            print(f"⚠️ {failed} updates failed. Run the script again to retry them.")
+    finally:
+        client.close()
+        print("🔒 Weaviate connection closed.")
@@ -0,0 +1,82 @@
+"""
+bench_chunking.py
+------------------
+Compares chunking throughput of the sentence modes in chunking.py and checks
+their chunk boundaries against the original full-pipeline ("parser") output.
+
+    python bench_chunking.py                                  # punishments.pdf + nlp_pdf.pdf
+    python bench_chunking.py --modes senter sentencizer --n-process 1 4
+
+Model load time is reported separately from chunking time. Modes whose model
+isn't installed (python -m spacy download en_core_web_sm) are skipped.
+"""
+
+import argparse
+import time
+
+from chunking import SENTENCE_MODES, extract_text_from_pdf, chunk_text_with_spacy, load_nlp
+
+
+def time_load(mode):
+    start = time.perf_counter()
+    load_nlp(mode)
+    return time.perf_counter() - start
+
+
+def time_chunking(text, mode, n_process, repeat):
+    """Best-of-`repeat` seconds and the chunks from the last run."""
+    best = float("inf")
+    chunks = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = chunk_text_with_spacy(text, mode=mode, n_process=n_process)
+        best = min(best, time.perf_counter() - start)
+    return best, chunks
+
+
+def boundary_agreement(reference, chunks):
+    """Share of reference chunks reproduced exactly (same text, same position)."""
+    if not reference:
+        return 1.0 if not chunks else 0.0
+    same = sum(1 for a, b in zip(reference, chunks) if a == b)
+    return same / max(len(reference), len(chunks))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*", default=["punishments.pdf", "nlp_pdf.pdf"])
+    parser.add_argument("--modes", nargs="+", default=list(SENTENCE_MODES), choices=SENTENCE_MODES)
+    parser.add_argument("--n-process", nargs="+", type=int, default=[1, 2])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    modes = []
+    for mode in args.modes:
+        try:
+            print(f"📦 Loaded '{mode}' pipeline in {time_load(mode):.2f}s")
+            modes.append(mode)
+        except OSError as e:
+            print(f"⚠️ Skipping '{mode}': {e}")
+
+    for pdf_path in args.pdfs:
+        text = extract_text_from_pdf(pdf_path)
+        print(f"\n📄 {pdf_path}: {len(text):,} characters")
+        reference = None
+        if "parser" in modes:
+            seconds, reference = time_chunking(text, "parser", 1, args.repeat)
+            baseline = seconds
+        for mode in modes:
+            # The full pipeline always runs as one doc, so n_process doesn't apply to it
+            for n_process in ([1] if mode == "parser" else args.n_process):
+                if mode == "parser":
+                    seconds, chunks = baseline, reference
+                else:
+                    seconds, chunks = time_chunking(text, mode, n_process, args.repeat)
+                line = (f"   {mode:<11} n_process={n_process:<2} {seconds * 1000:9.1f} ms  "
+                        f"{len(text) / seconds / 1000:8.1f}k chars/s  chunks={len(chunks)}")
+                if reference is not None:
+                    line += (f"  speedup={baseline / seconds:5.1f}x"
+                             f"  same chunks={boundary_agreement(reference, chunks):.1%}")
+                print(line)
+        if reference is None:
+            print("   (no 'parser' reference available, so no speedup or boundary comparison)")
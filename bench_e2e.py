@@ -0,0 +1,388 @@
+"""
+bench_e2e.py
+-------------
+End-to-end latency benchmark for the verdict API without live Cohere calls.
+
+Spawns `serve.py` against a fake Cohere API (load_test.fake_cohere_server:
+deterministic vectors seeded by the text, embed and chat latencies drawn from
+configurable distributions) and either the in-memory NumPy backend over a
+synthetic corpus or a local Weaviate container, then replays scenarios from a
+JSONL file at a fixed arrival rate (open loop) or a fixed number of concurrent
+clients (closed loop).
+
+The report has throughput plus p50/p95/p99 for the whole request (measured
+by the client) and for every stage the server reports in `timings` (embed,
+retrieval and its IPC / precedent legs, prompt building, chat). `other_ms` is
+what the stages don't account for: HTTP, JSON, Flask and queueing. With
+--endpoint /query/stream the Server-Sent Events are read as they arrive, and
+`first_token_ms` is when the first answer token reached the client.
+
+    python bench_e2e.py --synthetic 20000 --concurrency 16 --duration 30
+    python bench_e2e.py --scenarios requests.jsonl --rate 20 --requests 600 \\
+        --embed-latency lognormal:80:0.3 --chat-latency lognormal:900:0.25 --json e2e.json
+    python bench_e2e.py --backend weaviate --rate 10 --duration 60     # docker compose up -d first
+    python bench_e2e.py --url http://127.0.0.1:5001 --concurrency 8    # an already running server
+    python bench_e2e.py --endpoint /query/stream --concurrency 8 --duration 30
+    python bench_e2e.py --synthetic 20000 --rate 20 --baseline e2e.json --tolerance 0.2
+
+Scenario lines are JSON objects; the text is taken from "query", else "body",
+else "title". Each request gets a unique suffix so the embedding and verdict
+caches don't hide the pipeline (--cache replays the texts as they are).
+With --baseline, any stage whose p95 (or the throughput) is more than
+--tolerance worse than in the baseline report is listed and the exit code is 1.
+
+Open-loop latencies are measured from each request's scheduled send time, so
+a server that falls behind the arrival rate shows it as queueing latency
+instead of quietly slowing the load down.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from load_test import fake_cohere_server, percentile, spawn_server, stop_server
+
+DEFAULT_SCENARIOS = [
+    "The accused stabbed the victim with a knife during a quarrel over land, causing his death.",
+    "A shopkeeper was cheated by a customer who paid with a forged demand draft.",
+    "The husband and his mother repeatedly harassed the wife for dowry until she took her own life.",
+    "Two men broke into a house at night and stole jewellery while the family was away.",
+    "A public servant demanded a bribe to process a land registration application.",
+]
+ENDPOINTS = ("/query", "/query/stream")
+STAGES = ("embed_ms", "retrieval_ms", "ipc_search_ms", "precedent_search_ms", "prompt_ms",
+          "chat_first_token_ms", "chat_ms")
+TOP_LEVEL_STAGES = ("embed_ms", "retrieval_ms", "prompt_ms", "chat_ms")  # The legs run inside retrieval
+
+
+def load_scenarios(path):
+    """Scenario texts from a JSONL file ("query", else "body", else "title" per line)."""
+    texts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("query") or record.get("body") or record.get("title")
+            if text:
+                texts.append(text.strip())
+    if not texts:
+        raise ValueError(f"No scenarios with a query, body or title in {path}.")
+    return texts
+
+
+def server_total_ms(header):
+    """The `total;dur=` entry of a Server-Timing header, or None."""
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        if name == "total" and params.startswith("dur="):
+            return float(params[4:])
+    return None
+
+
+def read_events(response):
+    """Yields (event, data) for each Server-Sent Event in a streamed response."""
+    event, data = None, []
+    while True:
+        line = response.readline()
+        if not line:
+            return
+        line = line.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if event is not None:
+                yield event, json.loads("\n".join(data)) if data else None
+            event, data = None, []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+
+
+class Client:
+    """Sends /query or /query/stream requests over one keep-alive connection per thread."""
+
+    def __init__(self, url, endpoint, texts, unique=True, timeout=120):
+        self.parsed = urllib.parse.urlparse(url)
+        self.endpoint = endpoint
+        self.texts = texts
+        self.unique = unique
+        self.timeout = timeout
+        self.run_id = uuid.uuid4().hex[:8]
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, "connection", None) is None:
+            self.local.connection = http.client.HTTPConnection(self.parsed.hostname, self.parsed.port,
+                                                               timeout=self.timeout)
+        return self.local.connection
+
+    def query_text(self, index):
+        text = self.texts[index % len(self.texts)]
+        return f"{text} (bench {self.run_id}-{index})" if self.unique else text
+
+    def send(self, index, started=None):
+        """One request; latency counts from `started` (the scheduled time) when given."""
+        body = json.dumps({"query": self.query_text(index)})
+        started = time.perf_counter() if started is None else started
+        sample = {"index": index, "status": None, "timings": {}, "cached": False, "retrieved": None, "server_ms": None}
+        try:
+            connection = self.connection()
+            connection.request("POST", self.endpoint, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            sample["status"] = response.status
+            sample["server_ms"] = server_total_ms(response.getheader("Server-Timing"))
+            if response.status != 200:
+                response.read()
+            elif response.getheader("Content-Type", "").startswith("text/event-stream"):
+                self.read_stream(response, started, sample)
+            else:
+                data = json.loads(response.read())
+                sample["timings"] = data.get("timings") or {}
+                sample["cached"] = bool(data.get("cached"))
+                sample["retrieved"] = data.get("retrieved")
+        except Exception as e:
+            if getattr(self.local, "connection", None) is not None:
+                self.local.connection.close()
+            self.local.connection = None
+            sample["status"] = type(e).__name__
+        sample["total_ms"] = (time.perf_counter() - started) * 1000
+        return sample
+
+    @staticmethod
+    def read_stream(response, started, sample):
+        """Fills `sample` from an SSE verdict; an `error` event (or no `done`) counts as a failure."""
+        sample["status"] = "stream_incomplete"
+        for event, data in read_events(response):
+            if event == "token" and "first_token_ms" not in sample:
+                sample["first_token_ms"] = (time.perf_counter() - started) * 1000
+            elif event == "done":
+                sample["status"] = 200
+                sample["timings"] = data.get("timings") or {}
+                sample["cached"] = bool(data.get("cached"))
+                sample["retrieved"] = data.get("retrieved")
+            elif event == "error":
+                sample["status"] = "stream_error"
+
+
+def run_closed_loop(client, concurrency, requests, duration):
+    """`concurrency` clients, each sending its next request as soon as the last returns."""
+    deadline = time.monotonic() + duration if duration else None
+    counter, samples, lock = iter(range(requests or sys.maxsize)), [], threading.Lock()
+
+    def worker():
+        while deadline is None or time.monotonic() < deadline:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            sample = client.send(index)
+            with lock:
+                samples.append(sample)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.monotonic() - started
+
+
+def run_open_loop(client, rate, requests, duration, max_in_flight):
+    """Requests sent at `rate` per second regardless of how fast the server answers."""
+    total = requests or max(1, int(rate * duration))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        futures = []
+        for index in range(total):
+            scheduled = started + index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(client.send, index, scheduled))
+        samples = [future.result() for future in futures]
+    return samples, time.perf_counter() - started
+
+
+def distribution(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 0.50), 1),
+        "p95": round(percentile(values, 0.95), 1),
+        "p99": round(percentile(values, 0.99), 1),
+        "mean": round(statistics.fmean(values), 1),
+    }
+
+
+def summarize(samples, wall):
+    """Throughput and per-stage percentiles (ms) for one run."""
+    ok = [sample for sample in samples if sample["status"] == 200]
+    errors = [sample["status"] for sample in samples if sample["status"] != 200]
+    stages = {"total_ms": [sample["total_ms"] for sample in ok]}
+    first_tokens = [sample["first_token_ms"] for sample in ok if "first_token_ms" in sample]
+    if first_tokens:
+        stages["first_token_ms"] = first_tokens
+    for stage in STAGES:
+        values = [sample["timings"][stage] for sample in ok if stage in sample["timings"]]
+        if values:
+            stages[stage] = values
+    # Everything the server's stage timers don't cover (cached answers skip prompt and chat)
+    stages["other_ms"] = [
+        max(0.0, sample["total_ms"] - sum(sample["timings"].get(stage, 0.0) for stage in TOP_LEVEL_STAGES))
+        for sample in ok if not sample["cached"]
+    ]
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(errors),
+        "error_kinds": sorted({str(error) for error in errors}),
+        "cached": sum(sample["cached"] for sample in ok),
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(ok) / wall, 2) if wall else 0.0,
+        "stages": {stage: distribution(values) for stage, values in stages.items() if values},
+    }
+
+
+def regressions(report, baseline, tolerance, min_ms=1.0):
+    """Human-readable lines for every stage p95 / throughput worse than `baseline` by > tolerance."""
+    found = []
+    for stage, current in report["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if before and current["p95"] > before["p95"] * (1 + tolerance) and current["p95"] - before["p95"] > min_ms:
+            found.append(f"{stage} p95 {before['p95']} -> {current['p95']} ms")
+    before_rps = baseline.get("throughput_rps")
+    if before_rps and report["throughput_rps"] < before_rps * (1 - tolerance):
+        found.append(f"throughput {before_rps} -> {report['throughput_rps']} req/s")
+    return found
+
+
+def print_report(report):
+    print(f"\n📈 {report['ok']} ok / {report['requests']} sent in {report['wall_s']}s: "
+          f"{report['throughput_rps']} req/s, {report['errors']} errors"
+          + (f" {report['error_kinds']}" if report["errors"] else "")
+          + (f", {report['cached']} cached" if report["cached"] else ""))
+    print(f"   {'stage':<22}{'p50':>10}{'p95':>10}{'p99':>10}{'mean':>10}")
+    for stage, stats in report["stages"].items():
+        print(f"   {stage:<22}{stats['p50']:>8.1f}ms{stats['p95']:>8.1f}ms{stats['p99']:>8.1f}ms{stats['mean']:>8.1f}ms")
+
+
+def server_env(args):
+    """Environment for the spawned server: fake Cohere, the chosen backend, no disk caches."""
+    env = dict(os.environ)
+    if args.backend == "numpy":
+        if args.synthetic:
+            from bench_retrieval import write_synthetic
+            data_dir = tempfile.mkdtemp(prefix="bench_e2e_vectors_")
+            write_synthetic(data_dir, args.synthetic, args.dim)
+            print(f"🧪 Synthetic NumPy corpus: {args.synthetic} precedents x {args.dim} dims in {data_dir}")
+        else:
+            from retrieval import PRECEDENT_COLLECTION
+            from snapshot import open_snapshot
+            data_dir = env.get("VECTOR_DATA_DIR", "vector_data")
+            args.dim = open_snapshot(os.path.join(data_dir, PRECEDENT_COLLECTION)).dim
+            print(f"🧪 NumPy snapshots from {data_dir} ({args.dim} dims)")
+        env.update(RETRIEVAL_BACKEND="numpy", VECTOR_DATA_DIR=data_dir)
+    else:
+        env["RETRIEVAL_BACKEND"] = "weaviate"
+        print(f"🧪 Weaviate at {env.get('WEAVIATE_HTTP_URL', 'http://localhost:8081')} "
+              f"(fake vectors are {args.dim} dims; match the stored collections)")
+
+    _, base_url = fake_cohere_server(args.embed_latency, args.dim, chat_latency_ms=args.chat_latency)
+    env.update(COHERE_BASE_URL=base_url, COHERE_API_KEY=env.get("COHERE_API_KEY") or "bench-e2e")
+    env.setdefault("EMBED_CACHE_PATH", "")
+    print(f"🧪 Fake Cohere at {base_url} (embed {args.embed_latency} ms, chat {args.chat_latency} ms)")
+    return env
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark this running server instead of spawning serve.py")
+    parser.add_argument("--endpoint", default="/query", choices=ENDPOINTS)
+    parser.add_argument("--scenarios", help="JSONL file of scenarios (default: a few built-in ones)")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--rate", type=float, help="open loop: requests per second")
+    load.add_argument("--concurrency", type=int, default=8, help="closed loop: concurrent clients")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run (when --requests isn't given)")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="open loop: most requests outstanding at once")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests before the run")
+    parser.add_argument("--cache", action="store_true", help="send scenario texts unchanged, so caches can hit")
+    parser.add_argument("--backend", choices=("numpy", "weaviate"), default="numpy")
+    parser.add_argument("--synthetic", type=int, default=20000,
+                        help="NumPy backend: random corpus of this many precedents (0: use VECTOR_DATA_DIR)")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--embed-latency", default="lognormal:80:0.3",
+                        help="fake embed latency in ms: N, fixed:N, uniform:A:B, normal:M:SD, lognormal:MEDIAN:SIGMA, exp:MEAN")
+    parser.add_argument("--chat-latency", default="lognormal:900:0.25", help="fake chat latency, same forms")
+    parser.add_argument("--workers", type=int, default=2, help="WEB_WORKERS for the spawned server")
+    parser.add_argument("--threads", type=int, default=16, help="WEB_THREADS for the spawned server")
+    parser.add_argument("--port", type=int, default=5102, help="port for the spawned server")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="earlier --json report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    texts = load_scenarios(args.scenarios) if args.scenarios else DEFAULT_SCENARIOS
+    process = None
+    if args.url:
+        url = args.url
+    else:
+        process, url = spawn_server(args.workers, args.threads, args.port, server_env(args))
+        print(f"🚀 serve.py at {url} ({args.workers} workers x {args.threads} threads)")
+
+    mode = f"open loop, {args.rate:g} req/s" if args.rate else f"closed loop, {args.concurrency} clients"
+    print(f"📜 {len(texts)} scenarios, {mode}, "
+          + (f"{args.requests} requests" if args.requests else f"{args.duration:g}s"))
+    try:
+        if args.warmup:
+            run_closed_loop(Client(url, args.endpoint, texts), min(args.warmup, 8), args.warmup, None)
+        client = Client(url, args.endpoint, texts, unique=not args.cache)
+        if args.rate:
+            samples, wall = run_open_loop(client, args.rate, args.requests, args.duration, args.max_in_flight)
+        else:
+            samples, wall = run_closed_loop(client, args.concurrency, args.requests, args.duration)
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    report = {
+        "config": {
+            "target": args.url or f"serve.py {args.workers}x{args.threads}",
+            "backend": None if args.url else args.backend,
+            "corpus": None if args.url or args.backend != "numpy" else args.synthetic or "snapshot",
+            "mode": "open" if args.rate else "closed",
+            "rate": args.rate,
+            "concurrency": None if args.rate else args.concurrency,
+            "scenarios": args.scenarios or "built-in",
+            "unique_queries": not args.cache,
+            "embed_latency": None if args.url else args.embed_latency,
+            "chat_latency": None if args.url else args.chat_latency,
+        },
+        **summarize(samples, wall),
+    }
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        if found:
+            print(f"\n❌ Regressions vs {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in found:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ No regressions vs {args.baseline} (tolerance {args.tolerance:.0%}).")
@@ -0,0 +1,233 @@
+"""
+bench_index_profiles.py
+------------------------
+Compares the vector index profiles in schema.py (HNSW settings, PQ/SQ/BQ
+compression) on a synthetic corpus loaded into a local Weaviate.
+
+For each profile it creates a scratch collection (`BenchIndex_<profile>`),
+imports the corpus, waits for indexing (and compression) to finish, then runs
+the queries and reports:
+  * import time (batch insert until the index queue is empty);
+  * memory: the change in Weaviate's Go heap after the import, read from its
+    Prometheus endpoint (PROMETHEUS_MONITORING_ENABLED=true, port 2112 in
+    docker-compose.yml), and the size of the in-memory vector copy the
+    profile implies (float32, 1 byte/dim for SQ, 1 bit/dim for BQ, 1 byte per
+    segment for PQ);
+  * p50 / p99 query latency (near_vector, one query at a time);
+  * recall@k against exact (brute-force cosine) search over the same corpus.
+
+The corpus is clustered Gaussian noise normalised to unit length, which
+behaves more like real embeddings than uniform noise. Scratch collections are
+deleted afterwards unless --keep is given.
+
+    docker compose up -d
+    python bench_index_profiles.py --size 20000 --dims 1024
+    python bench_index_profiles.py --profiles default balanced bq --size 100000 --k 10 --json profiles.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+import urllib.request
+import uuid as uuid_lib
+
+import numpy as np
+import weaviate
+from dotenv import load_dotenv
+from weaviate.classes.config import DataType, Property
+from weaviate.connect import ConnectionParams
+
+from schema import INDEX_PROFILES, enable_compression, index_profile, vector_index_config
+
+load_dotenv()
+WEAVIATE_HTTP_URL = os.getenv("WEAVIATE_HTTP_URL", "http://localhost:8081")
+WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
+WEAVIATE_METRICS_URL = os.getenv("WEAVIATE_METRICS_URL", "http://localhost:2112/metrics")
+COLLECTION_PREFIX = "BenchIndex_"
+HEAP_METRIC = "go_memstats_heap_inuse_bytes"
+
+
+def synthetic_corpus(size, dims, clusters, seed=0):
+    """Unit-length float32 vectors scattered around `clusters` random centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dims)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, size)] + 0.6 * rng.standard_normal((size, dims)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def exact_neighbours(corpus, queries, k, block=256):
+    """Row indices of the true top-k (cosine) per query."""
+    truth = []
+    for start in range(0, len(queries), block):
+        scores = queries[start:start + block] @ corpus.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        truth.extend(set(row.tolist()) for row in top)
+    return truth
+
+
+def row_uuid(row):
+    return uuid_lib.UUID(int=row + 1)
+
+
+def heap_bytes(url=WEAVIATE_METRICS_URL):
+    """Weaviate's in-use Go heap from its Prometheus endpoint, or None if it isn't exposed."""
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            for line in response.read().decode("utf-8").splitlines():
+                if line.startswith(HEAP_METRIC + " "):
+                    return float(line.split()[1])
+    except Exception:
+        return None
+    return None
+
+
+def shard_state(client, name):
+    """(objects, queued vectors, all shards READY, all shards compressed) for one collection."""
+    shards = [shard for node in client.cluster.nodes(collection=name, output="verbose") for shard in node.shards or []]
+    return (
+        sum(shard.object_count for shard in shards),
+        sum(shard.vector_queue_length for shard in shards),
+        all(shard.vector_indexing_status == "READY" for shard in shards),
+        bool(shards) and all(shard.compressed for shard in shards),
+    )
+
+
+def wait_for(predicate, timeout, interval=0.5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()
+
+
+def vector_memory_mb(profile, collection, size, dims):
+    """In-memory vector copy implied by the profile (the HNSW graph comes on top)."""
+    kind = (profile.get("quantizer") or (None, None))[0]
+    if kind == "bq":
+        per_vector = dims / 8
+    elif kind == "sq":
+        per_vector = dims
+    elif kind == "pq":
+        quantizer = getattr(collection.config.get().vector_index_config, "quantizer", None)
+        per_vector = getattr(quantizer, "segments", None) or dims / 4
+    else:
+        per_vector = dims * 4
+    return size * per_vector / 2 ** 20
+
+
+def bench_profile(client, name, corpus, queries, truth, k, batch_size, timeout):
+    profile = index_profile(name)
+    collection_name = f"{COLLECTION_PREFIX}{name}"
+    if client.collections.exists(collection_name):
+        client.collections.delete(collection_name)
+
+    # pq/sq train on the first `training_limit` vectors; never ask for more than we have
+    kind = (profile.get("quantizer") or (None, None))[0]
+    overrides = {}
+    if kind in ("pq", "sq"):
+        limit = profile["quantizer"][1].get("training_limit") or len(corpus)
+        overrides["training_limit"] = min(limit, len(corpus))
+
+    heap_before = heap_bytes()
+    collection = client.collections.create(
+        name=collection_name,
+        properties=[Property(name="row", data_type=DataType.INT)],
+        vectorizer_config=None,
+        vector_index_config=vector_index_config(name, **overrides),
+    )
+
+    start = time.perf_counter()
+    with collection.batch.fixed_size(batch_size=batch_size) as batch:
+        for row, vector in enumerate(corpus):
+            batch.add_object(properties={"row": row}, uuid=row_uuid(row), vector=vector.tolist())
+    failed = len(collection.batch.failed_objects)
+    wait_for(lambda: (lambda state: state[1] == 0 and state[2])(shard_state(client, collection_name)), timeout)
+    import_s = time.perf_counter() - start
+
+    compress_s = None
+    if kind:
+        start = time.perf_counter()
+        if not shard_state(client, collection_name)[3]:
+            enable_compression(collection, name, **overrides)
+        compressed = wait_for(lambda: shard_state(client, collection_name)[3], timeout)
+        compress_s = time.perf_counter() - start if compressed else None
+        if not compressed:
+            print(f"   ⚠️ {name}: vectors still uncompressed after {timeout:.0f}s.")
+    heap_after = heap_bytes()
+
+    for vector in queries[:10]:  # Warm-up
+        collection.query.near_vector(near_vector=vector.tolist(), limit=k, return_properties=["row"])
+    latencies, recalls = [], []
+    for vector, expected in zip(queries, truth):
+        start = time.perf_counter()
+        response = collection.query.near_vector(near_vector=vector.tolist(), limit=k, return_properties=["row"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {obj.properties["row"] for obj in response.objects}
+        recalls.append(len(found & expected) / k)
+    latencies.sort()
+
+    result = {
+        "import_s": round(import_s, 2),
+        "compress_s": round(compress_s, 2) if compress_s is not None else None,
+        "failed_objects": failed,
+        "heap_delta_mb": round((heap_after - heap_before) / 2 ** 20, 1)
+        if heap_before is not None and heap_after is not None else None,
+        "vector_memory_mb": round(vector_memory_mb(profile, collection, len(corpus), corpus.shape[1]), 1),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))], 2),
+        f"recall@{k}": round(statistics.fmean(recalls), 4),
+    }
+    return collection_name, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=list(INDEX_PROFILES), choices=list(INDEX_PROFILES))
+    parser.add_argument("--size", type=int, default=20000, help="corpus vectors")
+    parser.add_argument("--dims", type=int, default=1024, help="dimensions (Cohere embed v3: 1024)")
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for indexing / compression")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch collections")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    print(f"🧪 Corpus: {args.size} x {args.dims} ({args.clusters} clusters), {args.queries} queries, k={args.k}")
+    corpus = synthetic_corpus(args.size, args.dims, args.clusters)
+    queries = synthetic_corpus(args.queries, args.dims, args.clusters, seed=1)
+    truth = exact_neighbours(corpus, queries, args.k)
+    if heap_bytes() is None:
+        print(f"⚠️ No heap metrics at {WEAVIATE_METRICS_URL}; memory is reported as the vector estimate only.")
+
+    client = weaviate.WeaviateClient(connection_params=ConnectionParams.from_url(WEAVIATE_HTTP_URL, WEAVIATE_GRPC_PORT))
+    client.connect()
+    results = {}
+    try:
+        print(f"   {'profile':<10}{'import':>9}{'compress':>10}{'heap Δ':>10}{'vectors':>10}"
+              f"{'p50':>10}{'p99':>10}{f'recall@{args.k}':>11}")
+        for name in args.profiles:
+            collection_name, result = bench_profile(client, name, corpus, queries, truth,
+                                                    args.k, args.batch_size, args.timeout)
+            results[name] = result
+            heap = f"{result['heap_delta_mb']:.0f}MB" if result["heap_delta_mb"] is not None else "n/a"
+            compress = f"{result['compress_s']:.1f}s" if result["compress_s"] is not None else "-"
+            print(f"   {name:<10}{result['import_s']:>8.1f}s{compress:>10}{heap:>10}{result['vector_memory_mb']:>8.0f}MB"
+                  f"{result['p50_ms']:>8.2f}ms{result['p99_ms']:>8.2f}ms{result[f'recall@{args.k}']:>11.3f}")
+            if result["failed_objects"]:
+                print(f"   ⚠️ {name}: {result['failed_objects']} objects failed to import.")
+            if not args.keep:
+                client.collections.delete(collection_name)
+    finally:
+        client.close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"corpus": {"size": args.size, "dims": args.dims, "queries": args.queries, "k": args.k},
+                       "profiles": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
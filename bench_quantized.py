@@ -0,0 +1,140 @@
+"""
+bench_quantized.py
+-------------------
+Size, latency and recall of compact (int8 / ubinary) snapshots against the
+full-precision float32 snapshot of the same vectors, on the NumPy backend.
+
+The float32 snapshot exported by export_vectors.py (the Precedents collection
+by default) is re-written as each variant, with and without a float copy for
+rescoring. Query vectors are perturbed copies of stored vectors, so no Cohere
+calls are needed, and recall@k is measured against exact float32 search.
+
+    python bench_quantized.py                                   # vector_data/Precedents
+    python bench_quantized.py --snapshot vector_data/NLP --k 3
+    python bench_quantized.py --synthetic 100000 --dims 1024 --json quantized.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import uuid as uuid_lib
+
+import numpy as np
+
+from bench_index_profiles import synthetic_corpus
+from retrieval import PRECEDENT_COLLECTION, NumpyBackend
+from snapshot import VECTORS_FILE, VECTORS_FILES, SnapshotWriter, open_snapshot
+
+VECTOR_DATA_DIR = os.getenv("VECTOR_DATA_DIR", "vector_data")
+
+# name -> (snapshot dtype, keep a float copy for rescoring)
+VARIANTS = {
+    "float32": ("float32", False),
+    "int8": ("int8", False),
+    "int8+rescore": ("int8", True),
+    "ubinary": ("ubinary", False),
+    "ubinary+rescore": ("ubinary", True),
+}
+
+
+def source_batches(args):
+    """(float rows, uuids) batches from the source snapshot or a synthetic corpus."""
+    if args.synthetic:
+        vectors = synthetic_corpus(args.synthetic, args.dims, args.clusters)
+        for start in range(0, len(vectors), 4096):
+            rows = vectors[start:start + 4096]
+            yield rows, [uuid_lib.UUID(int=start + offset + 1) for offset in range(len(rows))]
+        return
+    snapshot = open_snapshot(args.snapshot)
+    for vectors, records in snapshot.iter_batches(4096):
+        yield vectors, [record.get("uuid") or uuid_lib.uuid4() for record in records]
+
+
+def write_variant(path, batches, dtype, keep_float):
+    with SnapshotWriter(path, model="bench", normalize=True, dtype=dtype, keep_float=keep_float) as writer:
+        for vectors, uuids in batches:
+            for vector, object_id in zip(vectors, uuids):
+                writer.add(vector, {}, uuid=object_id)
+
+
+def run_variant(data_dir, queries, k, repeat, truth=None):
+    backend = NumpyBackend(data_dir, collection_names=(PRECEDENT_COLLECTION,))
+    for query in queries[:10]:  # Warm-up (page cache, norms)
+        backend.search(PRECEDENT_COLLECTION, query, k, [])
+    latencies, results = [], []
+    for query in queries:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            hits = backend.search(PRECEDENT_COLLECTION, query, k, [])
+            samples.append((time.perf_counter() - start) * 1000)
+        latencies.append(statistics.median(samples))
+        results.append({str(hit.uuid) for hit in hits})
+    latencies.sort()
+    stats = {
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 3),
+    }
+    if truth is not None:
+        stats[f"recall@{k}"] = round(statistics.fmean(len(found & expected) / len(expected)
+                                                      for found, expected in zip(results, truth)), 4)
+    return stats, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshot", default=os.path.join(VECTOR_DATA_DIR, PRECEDENT_COLLECTION))
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead of a snapshot")
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3, help="searches per query for latency")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_quantized_")
+    try:
+        # Every variant is written from the same float rows; queries are noisy copies of stored ones
+        source_dir = os.path.join(work_dir, "float32")
+        write_variant(os.path.join(source_dir, PRECEDENT_COLLECTION), source_batches(args), "float32", False)
+        source = open_snapshot(os.path.join(source_dir, PRECEDENT_COLLECTION))
+        rng = np.random.default_rng(0)
+        picks = rng.integers(0, source.rows, args.queries)
+        noise = rng.normal(0, 0.3 / np.sqrt(source.dim), (args.queries, source.dim)).astype(np.float32)
+        queries = np.asarray(source.vectors[picks]) + noise  # ~0.3 of a unit vector
+        k = min(args.k, source.rows)
+        print(f"🧪 {source.rows} vectors x {source.dim} dims, {args.queries} queries, k={k}")
+
+        _, truth = run_variant(source_dir, queries, k, 1)
+        results = {}
+        print(f"   {'variant':<17}{'vectors':>11}{'vs f32':>8}{'float copy':>12}{'p50':>10}{'p95':>10}{f'recall@{k}':>11}")
+        float_bytes = os.path.getsize(os.path.join(source_dir, PRECEDENT_COLLECTION, VECTORS_FILE))
+        for name in args.variants:
+            dtype, keep_float = VARIANTS[name]
+            data_dir = source_dir if name == "float32" else os.path.join(work_dir, name)
+            if name != "float32":
+                batches = ((vectors, [record["uuid"] for record in records])
+                           for vectors, records in source.iter_batches(4096))
+                write_variant(os.path.join(data_dir, PRECEDENT_COLLECTION), batches, dtype, keep_float)
+            collection_dir = os.path.join(data_dir, PRECEDENT_COLLECTION)
+            vector_bytes = os.path.getsize(os.path.join(collection_dir, VECTORS_FILES[dtype]))
+            copy_bytes = os.path.getsize(os.path.join(collection_dir, VECTORS_FILE)) if keep_float else 0
+            stats, _ = run_variant(data_dir, queries, k, args.repeat, truth)
+            results[name] = {"vector_bytes": vector_bytes, "float_copy_bytes": copy_bytes,
+                             "size_ratio": round(float_bytes / vector_bytes, 1), **stats}
+            print(f"   {name:<17}{vector_bytes / 2 ** 20:>9.2f}MB{results[name]['size_ratio']:>7.1f}x"
+                  f"{copy_bytes / 2 ** 20:>10.2f}MB{stats['p50_ms']:>8.3f}ms{stats['p95_ms']:>8.3f}ms"
+                  f"{stats[f'recall@{k}']:>11.3f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rows": source.rows, "dims": source.dim, "k": k, "variants": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
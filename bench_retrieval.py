@@ -0,0 +1,120 @@
+"""
+bench_retrieval.py
+-------------------
+Compares search latency of the NumPy backend against the Weaviate backend.
+
+Query vectors are perturbed copies of stored vectors, so no Cohere calls are
+needed. The Weaviate leg is skipped if Weaviate isn't reachable.
+
+    python export_vectors.py                      # once, to create vector_data/
+    python bench_retrieval.py --queries 500
+    python bench_retrieval.py --synthetic 20000   # NumPy only, random corpus
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from retrieval import (
+    IPC_COLLECTION, PRECEDENT_COLLECTION, IPC_PROPERTIES, PRECEDENT_PROPERTIES,
+    NumpyBackend, WeaviateBackend,
+)
+from snapshot import SnapshotWriter
+
+PROPERTIES = {IPC_COLLECTION: IPC_PROPERTIES, PRECEDENT_COLLECTION: PRECEDENT_PROPERTIES}
+LIMITS = {IPC_COLLECTION: 3, PRECEDENT_COLLECTION: 2}
+
+
+def write_synthetic(data_dir, rows, dim, seed=0):
+    """Writes a random unit-vector corpus in the export_vectors.py layout."""
+    rng = np.random.default_rng(seed)
+    for collection_name, collection_rows in ((IPC_COLLECTION, max(1, rows // 50)), (PRECEDENT_COLLECTION, rows)):
+        with SnapshotWriter(os.path.join(data_dir, collection_name), model="synthetic", normalize=True) as writer:
+            for i in range(collection_rows):
+                writer.add(
+                    rng.standard_normal(dim, dtype=np.float32),
+                    {key: f"{key} {i}" for key in PROPERTIES[collection_name]},
+                    uuid=f"00000000-0000-0000-0000-{i:012d}",
+                )
+
+
+def sample_queries(backend, count, noise, seed=1):
+    """Noisy copies of random stored vectors, per collection."""
+    rng = np.random.default_rng(seed)
+    queries = {}
+    for collection_name, matrix in backend.matrices.items():
+        rows = rng.integers(0, matrix.shape[0], size=count)
+        base = np.asarray(matrix[rows], dtype=np.float32)
+        queries[collection_name] = base + noise * rng.standard_normal(base.shape, dtype=np.float32)
+    return queries
+
+
+def time_backend(backend, queries):
+    """Per-collection latency samples (ms) for each query vector."""
+    samples = {}
+    for collection_name, vectors in queries.items():
+        timings = []
+        for vector in vectors:
+            start = time.perf_counter()
+            backend.search(collection_name, vector.tolist(), LIMITS[collection_name], PROPERTIES[collection_name])
+            timings.append((time.perf_counter() - start) * 1000)
+        samples[collection_name] = timings
+    return samples
+
+
+def report(label, samples):
+    for collection_name, timings in samples.items():
+        timings = sorted(timings)
+        p95 = timings[int(0.95 * (len(timings) - 1))]
+        print(f"   {label:<9} {collection_name:<11} n={len(timings):<5} "
+              f"mean={statistics.mean(timings):7.3f} ms  p50={statistics.median(timings):7.3f} ms  p95={p95:7.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=os.getenv("VECTOR_DATA_DIR", "vector_data"))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--synthetic", type=int, default=0, help="Benchmark a random corpus of N precedents instead.")
+    parser.add_argument("--dim", type=int, default=1024)
+    args = parser.parse_args()
+
+    tmp = None
+    data_dir = args.data_dir
+    if args.synthetic:
+        tmp = tempfile.TemporaryDirectory()
+        data_dir = tmp.name
+        print(f"🧪 Writing synthetic corpus ({args.synthetic} precedents, dim {args.dim})...")
+        write_synthetic(data_dir, args.synthetic, args.dim)
+
+    numpy_backend = NumpyBackend(data_dir)
+    print("📊 Corpus: " + ", ".join(f"{name}={m.shape[0]}x{m.shape[1]}" for name, m in numpy_backend.matrices.items()))
+    queries = sample_queries(numpy_backend, args.queries, args.noise)
+
+    print("⏱️ Search latency:")
+    report("numpy", time_backend(numpy_backend, queries))
+
+    if not args.synthetic:
+        try:
+            import weaviate
+            from weaviate.connect import ConnectionParams
+
+            client = weaviate.WeaviateClient(connection_params=ConnectionParams.from_url(
+                os.getenv("WEAVIATE_HTTP_URL", "http://localhost:8081"),
+                int(os.getenv("WEAVIATE_GRPC_PORT", "50051")),
+            ))
+            client.connect()
+        except Exception as e:
+            print(f"⚠️ Weaviate not reachable, skipping its leg: {e}")
+        else:
+            try:
+                report("weaviate", time_backend(WeaviateBackend(client), queries))
+            finally:
+                client.close()
+
+    if tmp is not None:
+        tmp.cleanup()
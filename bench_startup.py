@@ -0,0 +1,77 @@
+"""
+bench_startup.py
+-----------------
+Measures how long a fresh process takes to import the app and serve its
+first /healthz, which is what a new server worker pays before taking traffic.
+
+Each run is a separate interpreter so module caches don't hide the cost.
+No Cohere or Weaviate is needed: nothing on this path touches the network.
+
+    python bench_startup.py --runs 5
+    python bench_startup.py --importtime     # slowest imports of `import app`
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = r"""
+import json, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+extra = {{}}
+if "{module}" == "app":
+    client = app.app.test_client()
+    assert client.get("/healthz").status_code == 200
+    extra["first_healthz_ms"] = (time.perf_counter() - imported) * 1000
+print(json.dumps({{"import_ms": (imported - start) * 1000, **extra}}))
+"""
+
+
+def probe(module):
+    env = {**os.environ, "COHERE_API_KEY": os.getenv("COHERE_API_KEY") or "unused-for-startup"}
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        capture_output=True, text=True, check=True, env=env,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(module, top):
+    """Cumulative import times (ms) from `python -X importtime`, slowest first."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env={**os.environ, "COHERE_API_KEY": "unused-for-startup"},
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modules", nargs="+", default=["app", "chunking"])
+    parser.add_argument("--importtime", action="store_true")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        samples = [probe(module) for _ in range(args.runs)]
+        for key in samples[0]:
+            values = [sample[key] for sample in samples]
+            print(f"⏱️ {module:<9} {key:<17} median={statistics.median(values):8.1f} ms  "
+                  f"min={min(values):8.1f} ms  max={max(values):8.1f} ms  (n={len(values)})")
+
+    if args.importtime:
+        for module in args.modules:
+            print(f"\n🐢 Slowest imports under `import {module}`:")
+            for ms, name in slowest_imports(module, 15):
+                print(f"   {ms:8.1f} ms  {name}")
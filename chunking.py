@@ -2,40 +2,244 @@
 chunking.py
 ------------
 Extracts text from PDF and splits into meaningful chunks using spaCy.
+
+Only sentence boundaries are needed, so besides the original full pipeline
+("parser" mode) there are two lighter sentence modes:
+
+  * "senter"      – en_core_web_sm with only its sentence recognizer enabled
+                    (no tagger, parser, lemmatizer or NER)
+  * "sentencizer" – rule-based punctuation splitter, no model at all
+
+The light modes split the text into sections at sentence-final punctuation
+and stream them through `nlp.pipe` (optionally with `n_process` workers).
+Chunks are assembled from the sentence stream the same way in every mode, so
+identical sentences always give identical chunks. Pick the mode with
+CHUNK_SENTENCE_MODE; `bench_chunking.py` compares speed and boundaries.
+
+For large PDFs use `iter_pdf_pages` + `chunk_pages` (or `chunk_pdf`): pages
+are read one at a time and chunks stream out with the pages they came from
+(`page_start`/`page_end`), so memory stays bounded by a section, not the file.
 """
 
+import os
+import re
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+
 import fitz  # PyMuPDF
-import spacy
 
-# Load spaCy model globally
-nlp = spacy.load("en_core_web_sm")
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_sm")
+SENTENCE_MODES = ("parser", "senter", "sentencizer")
+DEFAULT_SENTENCE_MODE = os.getenv("CHUNK_SENTENCE_MODE", "parser")
+SECTION_CHARS = 20000  # Target size of each text section fed to nlp.pipe
+
+PdfPage = namedtuple("PdfPage", ["number", "text", "blocks"])  # number is 1-based
+Chunk = namedtuple("Chunk", ["text", "page_start", "page_end"])
+
+# Everything in en_core_web_sm that sentence splitting doesn't need
+HEAVY_COMPONENTS = ["tagger", "parser", "attribute_ruler", "lemmatizer", "ner"]
+
+# Sentence-final punctuation at the end of a line (plus the one space spaCy keeps on
+# the token): the newline starts the next sentence whether or not the text is cut here
+_SECTION_BREAK = re.compile(r"[.!?] ?(?=\n)")
+
+
+@lru_cache(maxsize=None)
+def load_nlp(mode=DEFAULT_SENTENCE_MODE):
+    """Loads (once per process) the spaCy pipeline for a sentence mode."""
+    import spacy  # Deferred: importing spaCy alone takes about a second
+
+    if mode == "parser":
+        return spacy.load(SPACY_MODEL)
+    if mode == "senter":
+        nlp = spacy.load(SPACY_MODEL, exclude=HEAVY_COMPONENTS)
+        nlp.enable_pipe("senter")
+        # senter may carry its own tok2vec; drop the shared one if nothing listens to it
+        if "tok2vec" in nlp.pipe_names and not nlp.get_pipe("tok2vec").listening_components:
+            nlp.disable_pipe("tok2vec")
+        return nlp
+    if mode == "sentencizer":
+        nlp = spacy.blank("en")
+        nlp.add_pipe("sentencizer")
+        return nlp
+    raise ValueError(f"Unknown sentence mode '{mode}', expected one of {SENTENCE_MODES}")
+
+
+def iter_pdf_pages(pdf_path, with_blocks=False):
+    """Yields one PdfPage per page, loading a single page at a time.
+
+    With `with_blocks`, each page also carries its text blocks as
+    (x0, y0, x1, y1, text) tuples in PDF coordinates.
+    """
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            blocks = None
+            if with_blocks:
+                # block_type 0 is text; 1 is an image
+                blocks = [(x0, y0, x1, y1, text) for x0, y0, x1, y1, text, _, block_type
+                          in page.get_text("blocks") if block_type == 0]
+            yield PdfPage(page.number + 1, page.get_text("text"), blocks)
+
 
 def extract_text_from_pdf(pdf_path):
     """Extracts text from a PDF file."""
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page in doc:
-        text += page.get_text("text")
-    return text.strip()
+    return "".join(page.text for page in iter_pdf_pages(pdf_path)).strip()
 
-def chunk_text_with_spacy(text, max_chunk_size=800, overlap=100):
-    """Splits text into overlapping chunks using spaCy sentence segmentation."""
-    doc = nlp(text)
-    chunks = []
-    current_chunk = ""
 
-    for sent in doc.sents:
-        if len(current_chunk) + len(sent.text) <= max_chunk_size:
-            current_chunk += " " + sent.text
+def _section_end(text, start, section_chars):
+    """Where to cut the section starting at `start`."""
+    end = start + section_chars
+    breaks = [m.end() for m in _SECTION_BREAK.finditer(text, start, end)]
+    if breaks:
+        return breaks[-1]
+    space = text.rfind(" ", start, end)
+    return space if space > start else end
+
+
+def split_sections(text, section_chars=SECTION_CHARS):
+    """Cuts text into ~section_chars pieces, right after a line-final full stop."""
+    start = 0
+    while len(text) - start > section_chars:
+        end = _section_end(text, start, section_chars)
+        yield text[start:end]
+        start = end
+    if start < len(text):
+        yield text[start:]
+
+
+def split_page_sections(pages, page_index, section_chars=SECTION_CHARS):
+    """Streams pages into (section_text, char_offset) pairs, cut like split_sections.
+
+    Only the text not yet emitted is buffered. `page_index` is filled with
+    (start offsets, page numbers) so offsets can be mapped back to pages.
+    Leading/trailing whitespace of the document is dropped, as in
+    extract_text_from_pdf.
+    """
+    starts, numbers = page_index
+    buffer = ""
+    offset = 0  # document offset of buffer[0]
+    for page in pages:
+        text = page.text if (offset or buffer) else page.text.lstrip()
+        starts.append(offset + len(buffer))
+        numbers.append(page.number)
+        buffer += text
+        while len(buffer) > section_chars:
+            end = _section_end(buffer, 0, section_chars)
+            yield buffer[:end], offset
+            buffer = buffer[end:]
+            offset += end
+    buffer = buffer.rstrip()
+    if buffer:
+        yield buffer, offset
+
+
+def iter_sentences(text, mode=DEFAULT_SENTENCE_MODE, n_process=1, batch_size=8):
+    """Yields sentence strings in document order."""
+    nlp = load_nlp(mode)
+    if mode == "parser":
+        # Original behavior: the whole text as one doc
+        docs = [nlp(text)]
+    else:
+        docs = nlp.pipe(split_sections(text), n_process=n_process, batch_size=batch_size)
+    for doc in docs:
+        for sent in doc.sents:
+            yield sent.text
+
+
+def iter_page_sentences(pages, mode=DEFAULT_SENTENCE_MODE, n_process=1, batch_size=8):
+    """Yields (sentence, page_start, page_end) from streamed pages, in order."""
+    nlp = load_nlp(mode)
+    page_index = ([], [])
+    starts, numbers = page_index
+
+    def page_at(offset):
+        return numbers[bisect_right(starts, offset) - 1]
+
+    sections = split_page_sections(pages, page_index)
+    for doc, offset in nlp.pipe(sections, as_tuples=True, n_process=n_process, batch_size=batch_size):
+        for sent in doc.sents:
+            text = sent.text
+            # Pages of the first and last visible characters, not surrounding whitespace
+            start = offset + sent.start_char + len(text) - len(text.lstrip())
+            end = offset + sent.start_char + max(0, len(text.rstrip()) - 1)
+            yield text, page_at(start), page_at(max(start, end))
+
+
+def _page_range(spans):
+    """First and last page of the sentences (with any words) in a chunk."""
+    pages = [(first, last) for words, first, last in spans if words]
+    if not pages:
+        return None, None
+    return pages[0][0], pages[-1][1]  # sentences arrive in page order
+
+
+def _tail_spans(spans, words_kept):
+    """The trailing spans that supply the last `words_kept` words (the overlap)."""
+    kept = []
+    for words, first, last in reversed(spans):
+        if words_kept <= 0:
+            break
+        kept.append((min(words, words_kept), first, last))
+        words_kept -= words
+    return kept[::-1]
+
+
+def iter_chunks(sentences, max_chunk_size=800, overlap=100):
+    """Packs (sentence, page_start, page_end) items into overlapping Chunks.
+
+    Same rules as the original string-concatenation loop, but each chunk is
+    collected as a list of parts and joined once. Pages may be None.
+    """
+    parts = []
+    length = 0  # len("".join(parts)) without building it
+    spans = []  # (word count, page_start, page_end) per part, for page ranges
+
+    for sent, page_start, page_end in sentences:
+        if length + len(sent) <= max_chunk_size:
+            parts.append(" ")
+            parts.append(sent)
+            length += len(sent) + 1
         else:
-            chunks.append(current_chunk.strip())
+            current_chunk = "".join(parts)
+            yield Chunk(current_chunk.strip(), *_page_range(spans))
             # Add overlap for better context
-            current_chunk = " ".join(current_chunk.split()[-overlap:]) + " " + sent.text
+            tail_words = current_chunk.split()[-overlap:]
+            tail = " ".join(tail_words)
+            spans = _tail_spans(spans, len(tail_words))
+            parts = [tail, " ", sent]
+            length = len(tail) + 1 + len(sent)
+        spans.append((len(sent.split()), page_start, page_end))
 
+    current_chunk = "".join(parts)
     if current_chunk:
-        chunks.append(current_chunk.strip())
+        yield Chunk(current_chunk.strip(), *_page_range(spans))
+
+
+def assemble_chunks(sentences, max_chunk_size=800, overlap=100):
+    """Packs sentences into overlapping chunks of up to ~max_chunk_size characters."""
+    return [chunk.text for chunk in iter_chunks(((sent, None, None) for sent in sentences), max_chunk_size, overlap)]
+
+
+def chunk_text_with_spacy(text, max_chunk_size=800, overlap=100, mode=None, n_process=1):
+    """Splits text into overlapping chunks using spaCy sentence segmentation."""
+    sentences = iter_sentences(text, mode or DEFAULT_SENTENCE_MODE, n_process=n_process)
+    return assemble_chunks(sentences, max_chunk_size, overlap)
+
+
+def chunk_pages(pages, max_chunk_size=800, overlap=100, mode=None, n_process=1):
+    """Streams Chunks (text, page_start, page_end) from an iterable of PdfPages.
+
+    Always works section by section, so even "parser" mode keeps memory
+    bounded here; chunk_text_with_spacy keeps the one-doc behavior.
+    """
+    sentences = iter_page_sentences(pages, mode or DEFAULT_SENTENCE_MODE, n_process=n_process)
+    return iter_chunks(sentences, max_chunk_size, overlap)
+
 
-    return chunks
+def chunk_pdf(pdf_path, max_chunk_size=800, overlap=100, mode=None, n_process=1):
+    """Streams page-tagged Chunks straight from a PDF file."""
+    return chunk_pages(iter_pdf_pages(pdf_path), max_chunk_size, overlap, mode, n_process)
 
 if __name__ == "__main__":
     pdf_path = "D:/NLP222/nlp_pdf_ex.pdf"
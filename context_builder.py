@@ -0,0 +1,119 @@
+"""
+context_builder.py
+-------------------
+Fits the retrieved IPC chunks and precedents into one token budget for the
+chat prompt (PROMPT_CONTEXT_TOKENS), sharing it out by retrieval score.
+
+Every retrieved item is a candidate. Each gets a share of the budget in
+proportion to its score, items shorter than their share keep their full text
+and hand the rest back to the others, and longer items are cut at a sentence
+(or word) boundary. If the budget can't give every item a useful minimum
+(CONTEXT_MIN_ITEM_TOKENS), the lowest scored items are left out altogether.
+
+Scores come from the search metadata: the hybrid `score` when there is one,
+otherwise cosine similarity (1 - distance). Chunks fetched by exact section
+number have neither and rank with the best hit, since the query named them.
+
+Tokens are estimated as characters / 4, which is close enough for Cohere's
+tokenizer on English legal text and needs no extra round trip.
+"""
+
+import math
+import re
+from collections import namedtuple
+
+CHARS_PER_TOKEN = 4
+ELLIPSIS = " …"
+
+# One prompt item: header line(s), body text and retrieval score (None = exact match)
+ContextItem = namedtuple("ContextItem", ["kind", "header", "body", "score"])
+
+_SENTENCE_END = re.compile(r"[.;:!?](?=\s)")
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def retrieval_score(obj):
+    """Relevance of one hit in [0, 1]-ish, higher is better; None when it was fetched by ID."""
+    metadata = getattr(obj, "metadata", None)
+    score = getattr(metadata, "score", None)
+    if score is not None:
+        return float(score)
+    distance = getattr(metadata, "distance", None)
+    if distance is not None:
+        return max(0.0, 1.0 - float(distance))
+    return None
+
+
+def truncate(text, max_tokens):
+    """`text` cut to about `max_tokens`, at the last sentence end (or space) that fits."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max(0, max_chars - len(ELLIPSIS))]
+    sentence_ends = [match.end() for match in _SENTENCE_END.finditer(cut)]
+    # Prefer a sentence boundary unless it throws away more than a third of the share
+    if sentence_ends and sentence_ends[-1] >= len(cut) * 2 / 3:
+        return cut[:sentence_ends[-1]]
+    return cut.rsplit(" ", 1)[0].rstrip(" ,;:-") + ELLIPSIS
+
+
+def allocate(items, budget, min_tokens):
+    """{index: body token allowance} for the items that make the cut.
+
+    Header tokens are paid first. Body tokens are shared out by score
+    ("water filling"): an item whose whole body fits its share takes just
+    that, and the remainder is re-shared among the rest.
+    """
+    best = max((item.score for item in items if item.score is not None), default=1.0)
+    scores = {index: max(item.score if item.score is not None else best, 1e-6) for index, item in enumerate(items)}
+    body_tokens = {index: estimate_tokens(item.body) for index, item in enumerate(items)}
+
+    # Lowest scores go first until every remaining item gets its header plus a minimum body
+    chosen = sorted(scores, key=lambda index: -scores[index])
+    while chosen and sum(estimate_tokens(items[index].header) + min(min_tokens, body_tokens[index])
+                         for index in chosen) > budget:
+        chosen.pop()
+
+    remaining = budget - sum(estimate_tokens(items[index].header) for index in chosen)
+    allowance, active = {}, list(chosen)
+    while active:
+        total = sum(scores[index] for index in active)
+        fits = [index for index in active if body_tokens[index] <= remaining * scores[index] / total]
+        if not fits:
+            # Everyone left is cut: guarantee the minimum, share what's left over by score
+            spare = remaining - len(active) * min_tokens
+            for index in active:
+                allowance[index] = min_tokens + max(0, int(spare * scores[index] / total))
+            break
+        for index in fits:
+            allowance[index] = body_tokens[index]
+            remaining -= body_tokens[index]
+            active.remove(index)
+    return allowance
+
+
+def build_context(items, budget, min_tokens=40):
+    """Budgeted prompt text per kind, plus stats.
+
+    Returns ({kind: [item text, ...]} in the original order, stats dict with
+    token estimates and how many items were truncated or dropped).
+    """
+    allowance = allocate(items, budget, min_tokens)
+    sections, truncated = {}, 0
+    for index, item in enumerate(items):
+        if index not in allowance:
+            continue
+        body = truncate(item.body, allowance[index])
+        truncated += body != item.body
+        sections.setdefault(item.kind, []).append(f"{item.header}{body}")
+    used = sum(estimate_tokens(text) for texts in sections.values() for text in texts)
+    return sections, {
+        "budget_tokens": budget,
+        "context_tokens": used,
+        "full_tokens": sum(estimate_tokens(item.header + item.body) for item in items),
+        "truncated": truncated,
+        "dropped": len(items) - len(allowance),
+    }
@@ -0,0 +1,203 @@
+"""
+embed_client.py
+----------------
+Shared, rate-limited Cohere embedding client for the ingestion scripts.
+
+  * A token bucket keeps calls under the Cohere quota (COHERE_EMBED_CALLS_PER_MINUTE).
+    It is adaptive: a 429 halves the rate, and each success creeps it back up.
+  * Errors are classified: 429s and transient server/network errors are
+    retried with exponential backoff + jitter, honoring Retry-After when the
+    API sends one; other 4xx errors fail immediately.
+  * Several batches are kept in flight at once (EMBED_MAX_IN_FLIGHT), each at
+    the API's maximum batch size (96 texts) instead of 10.
+  * EMBEDDING_TYPE=int8 / ubinary requests compact embeddings; they come back
+    already converted to the float lists Weaviate stores (see quantize.py).
+"""
+
+import email.utils
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import httpx
+from cohere.core.api_error import ApiError
+
+from quantize import EMBEDDING_TYPE, check_type, to_weaviate_vector, typed_embeddings
+
+COHERE_MAX_BATCH = 96  # Cohere's per-call limit for embed texts
+
+EMBED_CALLS_PER_MINUTE = float(os.getenv("COHERE_EMBED_CALLS_PER_MINUTE", "100"))  # Trial-key embed quota
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_BATCH_SIZE = min(COHERE_MAX_BATCH, int(os.getenv("EMBED_BATCH_SIZE", str(COHERE_MAX_BATCH))))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose refill rate adapts to 429 feedback."""
+
+    def __init__(self, rate_per_second, capacity=None, min_rate_fraction=0.05):
+        self.max_rate = float(rate_per_second)
+        self.rate = self.max_rate
+        self.min_rate = self.max_rate * min_rate_fraction
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.max_rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Blocks until a call may be made."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait_for = self.blocked_until - now
+                if wait_for <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if wait_for <= 0:
+                    wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+    def on_success(self):
+        """Additive increase back towards the configured rate."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_throttled(self, retry_after=None):
+        """Multiplicative decrease; also pauses everyone until Retry-After has passed."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+def classify_error(error):
+    """Returns 'rate_limited', 'transient' or 'fatal'."""
+    status = getattr(error, "status_code", None)
+    if status == 429:
+        return "rate_limited"
+    if isinstance(error, ApiError):
+        return "transient" if status is None or status >= 500 else "fatal"
+    if isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError)):
+        return "transient"
+    return "fatal"
+
+
+def retry_after_seconds(error):
+    """Parses a Retry-After header (seconds or HTTP date) from an API error, if any."""
+    headers = getattr(error, "headers", None) or {}
+    value = next((v for k, v in headers.items() if k.lower() == "retry-after"), None)
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+class EmbeddingClient:
+    """Wraps a cohere.Client with rate limiting, retries and concurrency."""
+
+    def __init__(self, co, model, calls_per_minute=EMBED_CALLS_PER_MINUTE, max_in_flight=EMBED_MAX_IN_FLIGHT,
+                 batch_size=EMBED_BATCH_SIZE, max_retries=EMBED_MAX_RETRIES, base_delay=1.0, max_delay=60.0,
+                 embedding_type=EMBEDDING_TYPE):
+        self.co = co
+        self.model = model
+        self.embedding_type = check_type(embedding_type)
+        self.batch_size = min(COHERE_MAX_BATCH, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Small burst so concurrent workers don't all fire at t=0
+        self.bucket = TokenBucket(calls_per_minute / 60.0, capacity=min(self.max_in_flight, max(1.0, calls_per_minute / 60.0)))
+        self.stats = {"calls": 0, "rate_limited": 0, "transient_errors": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def embed(self, texts, input_type="search_document"):
+        """One co.embed call (≤ batch_size texts) with rate limiting and retries."""
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                self._count("calls")
+                typed = {} if self.embedding_type == "float" else {"embedding_types": [self.embedding_type]}
+                response = self.co.embed(
+                    texts=texts,
+                    model=self.model,
+                    input_type=input_type,
+                    request_options={"max_retries": 0},  # Retries are ours, not the SDK's
+                    **typed,
+                )
+                self.bucket.on_success()
+                embeddings = typed_embeddings(response.embeddings, self.embedding_type)
+                if self.embedding_type == "float":
+                    return embeddings
+                return [to_weaviate_vector(values, self.embedding_type) for values in embeddings]
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == "fatal" or attempt >= self.max_retries:
+                    raise
+                retry_after = retry_after_seconds(e)
+                if kind == "rate_limited":
+                    self._count("rate_limited")
+                    self.bucket.on_throttled(retry_after)
+                else:
+                    self._count("transient_errors")
+                backoff = min(self.max_delay, self.base_delay * (2 ** attempt))
+                delay = max(retry_after or 0.0, random.uniform(backoff / 2, backoff))
+                print(f"   ⏳ Embed {kind.replace('_', ' ')} ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def embed_batches(self, batches, input_type="search_document"):
+        """Embeds an iterable of (key, texts) with up to max_in_flight calls at once.
+
+        Yields (key, texts, embeddings_or_exception) as batches complete (not
+        necessarily in input order). The input iterable is consumed lazily, so
+        producers can stream.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed") as pool:
+            pending = {}
+            iterator = iter(batches)
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < self.max_in_flight:
+                    try:
+                        key, texts = next(iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[pool.submit(self.embed, texts, input_type)] = (key, texts)
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, texts = pending.pop(future)
+                    try:
+                        yield key, texts, future.result()
+                    except Exception as e:
+                        yield key, texts, e
+
+    def embed_texts(self, texts, input_type="search_document"):
+        """Embeds a list of any length, in order. Raises if any batch fails."""
+        batches = ((start, texts[start:start + self.batch_size]) for start in range(0, len(texts), self.batch_size))
+        embeddings = [None] * len(texts)
+        for start, batch, result in self.embed_batches(batches, input_type):
+            if isinstance(result, Exception):
+                raise result
+            embeddings[start:start + len(batch)] = result
+        return embeddings
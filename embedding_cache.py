@@ -0,0 +1,179 @@
+"""
+embedding_cache.py
+-------------------
+Two-tier cache for Cohere query embeddings.
+
+Keys are (embedding model, input_type, normalized query text). Lookups hit an
+in-memory LRU first and fall back to a size-bounded SQLite file, so repeat
+queries skip the `co.embed` round trip even across restarts.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+
+def normalize_query(text):
+    """Normalizes query text so trivially different submissions share a key."""
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.split())
+
+
+def make_cache_key(model, input_type, text):
+    """Builds the cache key for one (model, input_type, text) triple."""
+    raw = "\x1f".join([model or "", input_type or "", normalize_query(text)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _pack(embedding):
+    return array("f", embedding).tobytes()
+
+
+def _unpack(blob):
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """In-memory LRU tier backed by an optional on-disk SQLite tier."""
+
+    def __init__(self, path=None, memory_size=1024, disk_max_entries=50000):
+        self.memory_size = max(0, int(memory_size))
+        self.disk_max_entries = max(0, int(disk_max_entries))
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats_counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "disk_errors": 0,
+        }
+
+        if path and self.disk_max_entries:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)"
+            )
+            self._db.commit()
+
+    # ----------------------- #
+    #   LOOKUPS               #
+    # ----------------------- #
+
+    def get(self, model, input_type, text):
+        """Returns the cached embedding or None."""
+        key = make_cache_key(model, input_type, text)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats_counters["memory_hits"] += 1
+                return self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        self._db.execute(
+                            "UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key)
+                        )
+                        self._db.commit()
+                except sqlite3.Error:
+                    # Several server workers share the file; a busy disk tier is just a miss.
+                    self._db.rollback()
+                    self.stats_counters["disk_errors"] += 1
+                    row = None
+                if row is not None:
+                    embedding = _unpack(row[0])
+                    self._remember(key, embedding)
+                    self.stats_counters["disk_hits"] += 1
+                    return embedding
+
+            self.stats_counters["misses"] += 1
+            return None
+
+    def put(self, model, input_type, text, embedding):
+        """Stores an embedding in both tiers."""
+        key = make_cache_key(model, input_type, text)
+        embedding = list(embedding)
+        with self._lock:
+            self._remember(key, embedding)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                        (key, _pack(embedding), time.time()),
+                    )
+                    self._trim_disk()
+                    self._db.commit()
+                except sqlite3.Error:
+                    self._db.rollback()
+                    self.stats_counters["disk_errors"] += 1
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and current tier sizes."""
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = (
+                self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                if self._db is not None else 0
+            )
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (
+            (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        )
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # ----------------------- #
+    #   EVICTION (lock held)  #
+    # ----------------------- #
+
+    def _remember(self, key, embedding):
+        if not self.memory_size:
+            return
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.stats_counters["memory_evictions"] += 1
+
+    def _trim_disk(self):
+        count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.disk_max_entries
+        if overflow <= 0:
+            return
+        # Evict a little extra so we don't trim on every single insert.
+        overflow += self.disk_max_entries // 10
+        self._db.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (overflow,),
+        )
+        self.stats_counters["disk_evictions"] += min(overflow, count)
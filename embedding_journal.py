@@ -0,0 +1,137 @@
+"""
+embedding_journal.py
+---------------------
+Crash-safe, append-only journal of completed embedding batches.
+
+Each completed batch is written as one JSON line keyed by the index of its
+first chunk, together with a digest of the batch's chunk texts and the
+embeddings themselves. Lines are flushed and fsynced before the batch is
+considered done, so after a crash a rerun can pick up from the last completed
+batch. Because a batch's texts and vectors live on the same line, inserting
+from the journal can never pair a chunk with another chunk's vector.
+
+A torn last line (crash mid-write) is ignored and that batch is redone.
+"""
+
+import hashlib
+import json
+import os
+
+
+def batch_digest(texts):
+    """Digest of a batch's chunk texts; a mismatch means the chunking changed."""
+    h = hashlib.sha256()
+    for text in texts:
+        h.update(text.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class EmbeddingJournal:
+    """Journal of embedded (and inserted) batches for one source document."""
+
+    def __init__(self, path, model, source):
+        self.path = path
+        self.model = model
+        self.source = source
+        self._batches = {}   # start -> (digest, count, file offset of the line)
+        self._inserted = {}  # start -> digest
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path) and not self._load():
+            # Different model/source: the old vectors are useless for this run.
+            os.replace(path, path + ".stale")
+            self._batches.clear()
+            self._inserted.clear()
+
+        # Binary mode so line offsets are plain byte positions.
+        self._file = open(path, "ab+")
+        if self._file.tell() == 0:
+            self._append({"type": "header", "model": model, "source": source})
+        else:
+            # Terminate a torn last line so the next entry starts cleanly.
+            self._file.seek(-1, os.SEEK_END)
+            if self._file.read(1) != b"\n":
+                self._file.write(b"\n")
+                self._file.flush()
+
+    def _load(self):
+        """Indexes an existing journal. Returns False if it belongs to another model/source."""
+        with open(self.path, "rb") as f:
+            offset = f.tell()
+            line = f.readline()
+            while line:
+                try:
+                    entry = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    entry = None  # Torn write; everything after it is redone.
+                if entry is not None:
+                    kind = entry.get("type")
+                    if kind == "header":
+                        if entry.get("model") != self.model or entry.get("source") != self.source:
+                            return False
+                    elif kind == "batch":
+                        self._batches[entry["start"]] = (entry["digest"], entry["count"], offset)
+                    elif kind == "inserted":
+                        self._inserted[entry["start"]] = entry["digest"]
+                offset = f.tell()
+                line = f.readline()
+        return True
+
+    def _append(self, entry):
+        self._file.seek(0, os.SEEK_END)
+        self._file.write((json.dumps(entry) + "\n").encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    # ----------------------- #
+    #   PUBLIC API            #
+    # ----------------------- #
+
+    def completed_embeddings(self, start, texts):
+        """Embeddings journaled for the batch starting at `start`, or None.
+
+        Only returned if the journaled batch had exactly these texts.
+        """
+        known = self._batches.get(start)
+        if known is None or known[0] != batch_digest(texts) or known[1] != len(texts):
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(known[2])
+            return json.loads(f.readline())["embeddings"]
+
+    def record_batch(self, start, texts, embeddings):
+        """Durably records a completed embedding batch."""
+        if len(embeddings) != len(texts):
+            raise ValueError(f"❌ Batch at {start}: {len(texts)} texts but {len(embeddings)} embeddings.")
+        digest = batch_digest(texts)
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._append({
+            "type": "batch",
+            "start": start,
+            "count": len(texts),
+            "digest": digest,
+            "embeddings": [list(map(float, vector)) for vector in embeddings],
+        })
+        self._batches[start] = (digest, len(texts), offset)
+
+    @staticmethod
+    def _inserted_digest(texts, metadata):
+        # Metadata (e.g. page numbers) is part of what was inserted, but not of what was embedded
+        if metadata is None:
+            return batch_digest(texts)
+        return batch_digest(list(texts) + [json.dumps(metadata, sort_keys=True)])
+
+    def is_inserted(self, start, texts, metadata=None):
+        return self._inserted.get(start) == self._inserted_digest(texts, metadata)
+
+    def mark_inserted(self, start, texts, metadata=None):
+        digest = self._inserted_digest(texts, metadata)
+        self._append({"type": "inserted", "start": start, "digest": digest})
+        self._inserted[start] = digest
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,188 @@
+"""
+eval_retrieval.py
+------------------
+Offline retrieval evaluation: recall@k and search latency per retrieval mode
+over a labelled query set (eval_queries.jsonl by default).
+
+Each line of the query set names a collection and the IPC sections a good
+result should cover:
+
+    {"query": "dowry death punishment", "collection": "NLP", "sections": ["304B"]}
+
+An `NLP` hit covers a section when it contains that section's heading (see
+section_index.py); a `Precedents` hit when its `ipc_sections` include it.
+Optional "ids" labels count specific objects as relevant too. recall@k is the
+share of a query's labels covered by its top k hits, averaged over queries.
+
+Modes: `vector` (near_vector), `keyword` (hybrid with alpha=0, i.e. BM25
+only) and `hybrid` at each --alphas value and --fusion type. Query vectors
+come from Cohere once and are cached on disk (EMBED_CACHE_PATH), so re-runs
+don't spend API calls.
+
+    python eval_retrieval.py                                   # Weaviate
+    RETRIEVAL_BACKEND=numpy python eval_retrieval.py --k 1 3 5 # snapshots + local BM25
+    python eval_retrieval.py --alphas 0.25 0.5 0.75 --fusion relative_score ranked --json eval.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+from embedding_cache import EmbeddingCache
+from retrieval import (
+    IPC_COLLECTION, PRECEDENT_COLLECTION, IPC_PROPERTIES, PRECEDENT_PROPERTIES, PRECEDENT_SECTION_PROPERTY,
+    HybridQuery, create_backend, search,
+)
+from section_index import extract_sections, normalize_section
+
+load_dotenv()
+COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "embed-multilingual-v3.0")
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", ".cache/query_embeddings.sqlite3")
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "weaviate").lower()
+VECTOR_DATA_DIR = os.getenv("VECTOR_DATA_DIR", "vector_data")
+WEAVIATE_HTTP_URL = os.getenv("WEAVIATE_HTTP_URL", "http://localhost:8081")
+WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
+
+RETURN_PROPERTIES = {
+    IPC_COLLECTION: IPC_PROPERTIES,
+    PRECEDENT_COLLECTION: PRECEDENT_PROPERTIES + [PRECEDENT_SECTION_PROPERTY],
+}
+
+
+def load_queries(path):
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                item["sections"] = [normalize_section(section) for section in item.get("sections", [])]
+                item["ids"] = [str(object_id) for object_id in item.get("ids", [])]
+                queries.append(item)
+    return queries
+
+
+def embed_queries(texts):
+    """Query vectors, from the on-disk embedding cache when possible."""
+    cache = EmbeddingCache(path=EMBED_CACHE_PATH or None)
+    vectors = {text: cache.get(EMBEDDING_MODEL, "search_query", text) for text in set(texts)}
+    missing = sorted(text for text, vector in vectors.items() if vector is None)
+    if missing:
+        if not COHERE_API_KEY:
+            raise ValueError("❌ COHERE_API_KEY is needed to embed queries that aren't cached yet.")
+        import cohere
+        co = cohere.Client(COHERE_API_KEY)
+        for start in range(0, len(missing), 96):
+            batch = missing[start:start + 96]
+            response = co.embed(model=EMBEDDING_MODEL, texts=batch, input_type="search_query")
+            for text, vector in zip(batch, response.embeddings):
+                cache.put(EMBEDDING_MODEL, "search_query", text, vector)
+                vectors[text] = vector
+        print(f"🧬 Embedded {len(missing)} queries ({len(vectors) - len(missing)} from cache).")
+    cache.close()
+    return vectors
+
+
+def open_backend():
+    if RETRIEVAL_BACKEND == "numpy":
+        return create_backend("numpy", data_dir=VECTOR_DATA_DIR), None
+    import weaviate
+    from weaviate.connect import ConnectionParams
+    client = weaviate.WeaviateClient(connection_params=ConnectionParams.from_url(WEAVIATE_HTTP_URL, WEAVIATE_GRPC_PORT))
+    client.connect()
+    return create_backend("weaviate", client=client), client
+
+
+def covered_labels(item, hit):
+    """Labels of `item` that one retrieved object satisfies."""
+    labels = set()
+    if str(hit.uuid) in item["ids"]:
+        labels.add(str(hit.uuid))
+    if item["collection"] == IPC_COLLECTION:
+        sections = extract_sections(hit.properties.get("text") or "")
+    else:
+        sections = hit.properties.get(PRECEDENT_SECTION_PROPERTY) or []
+    labels.update(section for section in sections if section in item["sections"])
+    return labels
+
+
+def evaluate(backend, queries, vectors, hybrid_params, ks, repeat):
+    """Runs every query in one mode. Returns {"recall@k": ..., latency stats}."""
+    depth = max(ks)
+    recalls = {k: [] for k in ks}
+    latencies = []
+    for item in queries:
+        hybrid = HybridQuery(item["query"], *hybrid_params) if hybrid_params else None
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            hits = search(backend, item["collection"], vectors[item["query"]], depth,
+                          RETURN_PROPERTIES[item["collection"]], hybrid=hybrid)
+            samples.append((time.perf_counter() - start) * 1000)
+        latencies.append(statistics.median(samples))
+
+        labels = set(item["sections"]) | set(item["ids"])
+        for k in ks:
+            covered = set()
+            for hit in hits[:k]:
+                covered |= covered_labels(item, hit)
+            recalls[k].append(len(covered) / len(labels) if labels else 0.0)
+
+    latencies.sort()
+    result = {f"recall@{k}": statistics.fmean(values) for k, values in recalls.items()}
+    result["p50_ms"] = latencies[len(latencies) // 2]
+    result["p95_ms"] = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default="eval_queries.jsonl")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--modes", nargs="+", default=["vector", "keyword", "hybrid"],
+                        choices=["vector", "keyword", "hybrid"])
+    parser.add_argument("--alphas", type=float, nargs="+", default=[0.5])
+    parser.add_argument("--fusion", nargs="+", default=["relative_score"], choices=["relative_score", "ranked"])
+    parser.add_argument("--repeat", type=int, default=3, help="searches per query for latency")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    vectors = embed_queries([item["query"] for item in queries])
+    backend, client = open_backend()
+
+    runs = []
+    for mode in args.modes:
+        if mode == "vector":
+            runs.append(("vector", None))
+        elif mode == "keyword":
+            runs.append(("keyword", (0.0, args.fusion[0])))
+        else:
+            runs.extend((f"hybrid a={alpha:g} {fusion}", (alpha, fusion))
+                        for fusion in args.fusion for alpha in args.alphas)
+
+    results = {}
+    try:
+        for collection_name in (IPC_COLLECTION, PRECEDENT_COLLECTION):
+            subset = [item for item in queries if item["collection"] == collection_name]
+            if not subset:
+                continue
+            print(f"\n📊 {collection_name} ({len(subset)} queries, {backend.name} backend)")
+            print(f"   {'mode':<28}" + "".join(f"{f'recall@{k}':>11}" for k in args.k) + f"{'p50':>10}{'p95':>10}")
+            for label, hybrid_params in runs:
+                result = evaluate(backend, subset, vectors, hybrid_params, args.k, args.repeat)
+                results.setdefault(collection_name, {})[label] = result
+                print(f"   {label:<28}" + "".join(f"{result[f'recall@{k}']:>11.3f}" for k in args.k)
+                      + f"{result['p50_ms']:>8.2f}ms{result['p95_ms']:>8.2f}ms")
+    finally:
+        if client is not None:
+            client.close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
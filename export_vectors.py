@@ -0,0 +1,94 @@
+"""
+export_vectors.py
+------------------
+Exports the `NLP` and `Precedents` collections from Weaviate into snapshots
+(see snapshot.py) used by the in-process NumPy retrieval backend
+(RETRIEVAL_BACKEND=numpy):
+
+    <VECTOR_DATA_DIR>/<Collection>/   unit-normalized float32 snapshot
+
+Vectors are streamed to disk while iterating, so memory stays flat.
+
+`--dtype int8` / `--dtype ubinary` writes compact snapshots instead (4x / 32x
+smaller vectors, see quantize.py); `--keep-float` also keeps a float32 copy
+on disk so the best candidates can be rescored exactly.
+
+    python export_vectors.py
+    python export_vectors.py vector_data_int8 --dtype int8 --keep-float
+"""
+
+import argparse
+import os
+
+import weaviate
+from dotenv import load_dotenv
+from weaviate.connect import ConnectionParams
+
+from retrieval import IPC_COLLECTION, PRECEDENT_COLLECTION, IPC_PROPERTIES, PRECEDENT_PROPERTIES, PRECEDENT_SECTION_PROPERTY
+from snapshot import SnapshotWriter
+
+load_dotenv()
+
+WEAVIATE_HTTP_URL = os.getenv("WEAVIATE_HTTP_URL", "http://localhost:8081")
+WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "embed-multilingual-v3.0")
+VECTOR_DATA_DIR = os.getenv("VECTOR_DATA_DIR", "vector_data")
+
+EXPORTS = {
+    IPC_COLLECTION: IPC_PROPERTIES,
+    PRECEDENT_COLLECTION: PRECEDENT_PROPERTIES + [PRECEDENT_SECTION_PROPERTY],  # Kept for filtered search
+}
+
+
+def object_vector(obj):
+    """The object's vector, falling back to the legacy `embedding` property."""
+    vector = obj.vector.get("default") if isinstance(obj.vector, dict) else obj.vector
+    if vector is None:
+        vector = obj.properties.get("embedding")
+    return vector
+
+
+def export_collection(collection, properties, out_dir, dtype="float32", keep_float=False):
+    """Streams one collection into the snapshot <out_dir>/<name>/. Returns the row count."""
+    name = collection.name
+    skipped = 0
+    fetch_properties = properties + (["embedding"] if name == IPC_COLLECTION else [])
+    with SnapshotWriter(os.path.join(out_dir, name), model=EMBEDDING_MODEL, normalize=True,
+                        dtype=dtype, keep_float=keep_float) as writer:
+        for obj in collection.iterator(include_vector=True, return_properties=fetch_properties):
+            vector = object_vector(obj)
+            if not vector:
+                skipped += 1
+                continue
+            writer.add(vector, {key: obj.properties.get(key) for key in properties}, uuid=obj.uuid)
+
+    if skipped:
+        print(f"⚠️ {name}: skipped {skipped} objects without a vector.")
+    return writer.rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir", nargs="?", default=VECTOR_DATA_DIR)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "int8", "ubinary"])
+    parser.add_argument("--keep-float", action="store_true", help="keep float32 vectors too, for rescoring")
+    args = parser.parse_args()
+    out_dir = args.out_dir
+    os.makedirs(out_dir, exist_ok=True)
+
+    client = weaviate.WeaviateClient(
+        connection_params=ConnectionParams.from_url(WEAVIATE_HTTP_URL, WEAVIATE_GRPC_PORT)
+    )
+    client.connect()
+    try:
+        for collection_name, properties in EXPORTS.items():
+            if collection_name not in client.collections.list_all():
+                print(f"⚠️ Collection '{collection_name}' not found, skipping.")
+                continue
+            print(f"📤 Exporting '{collection_name}'...")
+            count = export_collection(client.collections.get(collection_name), properties, out_dir,
+                                      dtype=args.dtype, keep_float=args.keep_float)
+            print(f"✅ Exported {count} vectors to {os.path.join(out_dir, collection_name)}")
+    finally:
+        client.close()
+        print("🔒 Connection closed.")
@@ -1,6 +1,6 @@
 import weaviate
-from weaviate.classes.config import Property, DataType, Tokenization # <-- Import Tokenization
 from weaviate.connect import ConnectionParams
+from schema import PRECEDENTS_COLLECTION, create_precedents_collection
 import os
 from dotenv import load_dotenv
 
@@ -20,7 +20,7 @@ except Exception as e:
     print(f"❌ Failed to connect to Weaviate: {e}")
     exit()
 
-precedent_collection_name = "Precedents"
+precedent_collection_name = PRECEDENTS_COLLECTION
 
 try:
     # Check if the collection already exists
@@ -33,19 +33,7 @@ try:
 
     # Create the Precedents collection if it doesn't exist (or was just deleted)
     if precedent_collection_name not in client.collections.list_all(): # Check again
-        client.collections.create(
-            name=precedent_collection_name,
-            description="Stores summaries and judgments from past legal cases",
-            properties=[
-                Property(name="case_summary", data_type=DataType.TEXT),
-                Property(name="case_name", data_type=DataType.TEXT),
-                # Corrected: Use Tokenization.FIELD for keyword-like behavior
-                Property(name="citation", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
-                # Optional: Add ipc_section property if you plan to store it
-                # Property(name="ipc_section", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
-            ],
-            vectorizer_config=None # Using external embeddings (Cohere)
-        )
+        create_precedents_collection(client, precedent_collection_name)
         print(f"✅ Created '{precedent_collection_name}' collection successfully.")
 
     # Verify creation
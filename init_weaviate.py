@@ -1,6 +1,6 @@
 import weaviate
-from weaviate.classes.config import Property, DataType
 from weaviate.connect import ConnectionParams
+from schema import NLP_COLLECTION, create_nlp_collection
 
 # Initialize client
 client = weaviate.WeaviateClient(
@@ -11,22 +11,13 @@ client = weaviate.WeaviateClient(
 client.connect()
 
 try:
-    class_name = "NLP"
+    class_name = NLP_COLLECTION
 
     # ✅ List collections correctly for v4 client
     existing_collections = client.collections.list_all()
 
     if class_name not in existing_collections:
-        client.collections.create(
-            name=class_name,
-            description="Stores text and its embeddings for legal or NLP-based documents",
-            properties=[
-                Property(name="text", data_type=DataType.TEXT),
-                Property(name="embedding", data_type=DataType.NUMBER_ARRAY),
-                Property(name="source", data_type=DataType.TEXT),
-            ],
-            vectorizer_config=None  # Using external embeddings (Cohere)
-        )
+        create_nlp_collection(client, class_name)
         print("✅ 'NLP' collection created successfully.")
     else:
         print("⚠️ 'NLP' collection already exists.")
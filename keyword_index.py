@@ -0,0 +1,122 @@
+"""
+keyword_index.py
+-----------------
+In-memory BM25 index and score fusion for hybrid search without Weaviate.
+
+Mirrors Weaviate's defaults closely enough that the NumPy backend ranks like
+a `hybrid` query:
+  * "word" properties are lowercased and split on anything that isn't a letter
+    or digit ("304B" -> "304b"), minus a small English stopword list;
+  * "field" properties (e.g. `citation`) are one token: the trimmed value;
+  * BM25 with k1=1.2, b=0.75, summed over properties with per-property boosts;
+  * fusion is `relative_score` (min-max normalise each side, then
+    alpha * vector + (1 - alpha) * keyword) or `ranked` (reciprocal rank
+    fusion, weighted by alpha). alpha=1 is pure vector, alpha=0 pure BM25.
+"""
+
+import math
+import re
+
+import numpy as np
+
+FUSION_TYPES = ("relative_score", "ranked")
+RRF_K = 60  # Reciprocal rank constant (same as Weaviate's ranked fusion)
+
+_WORD = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by for if in into is it no not of on or such that the their then there these they
+this to was will with
+""".split())
+
+
+def word_tokens(text):
+    return [token for token in _WORD.findall(str(text or "").lower()) if token not in STOPWORDS]
+
+
+class KeywordIndex:
+    """BM25 over a fixed list of documents (dicts of properties).
+
+    `fields` maps property name -> (tokenization, boost), tokenization being
+    "word" or "field".
+    """
+
+    def __init__(self, documents, fields, k1=1.2, b=0.75):
+        self.fields = fields
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        postings = {}  # (property, token) -> {row: term frequency}
+        lengths = {name: np.zeros(self.size, dtype=np.float32) for name in fields}
+        for row, properties in enumerate(documents):
+            for name, (tokenization, _) in fields.items():
+                for token in self._tokens(properties.get(name), tokenization):
+                    counts = postings.setdefault((name, token), {})
+                    counts[row] = counts.get(row, 0) + 1
+                    lengths[name][row] += 1
+        self.average_lengths = {name: float(length.mean()) or 1.0 for name, length in lengths.items()} if self.size else {}
+        self.lengths = lengths
+        self.postings = {
+            key: (np.fromiter(counts.keys(), dtype=np.int64, count=len(counts)),
+                  np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+            for key, counts in postings.items()
+        }
+
+    @staticmethod
+    def _tokens(value, tokenization):
+        if isinstance(value, (list, tuple)):
+            return [token for item in value for token in KeywordIndex._tokens(item, tokenization)]
+        if tokenization == "field":
+            value = str(value or "").strip()
+            return [value] if value else []
+        return word_tokens(value)
+
+    def scores(self, query):
+        """Dense BM25 scores (one per document) for a query string."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for name, (tokenization, boost) in self.fields.items():
+            for token in set(self._tokens(query, tokenization)):
+                posting = self.postings.get((name, token))
+                if posting is None:
+                    continue
+                rows, tf = posting
+                idf = math.log(1 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[name][rows] / self.average_lengths[name])
+                scores[rows] += boost * idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+def top_rows(scores, rows, count):
+    """The `count` best of `rows` by score (positive scores only), best first."""
+    if not len(rows) or count <= 0:
+        return rows[:0]
+    candidate_scores = scores[rows]
+    k = min(count, len(rows))
+    top = np.argpartition(-candidate_scores, k - 1)[:k]
+    top = top[np.argsort(-candidate_scores[top])]
+    return rows[top]
+
+
+def fuse(vector_rows, vector_scores, keyword_rows, keyword_scores, alpha, fusion="relative_score"):
+    """Combines two ranked candidate lists into {row: fused score}.
+
+    `*_rows` are best-first row arrays, `*_scores` the dense score arrays they
+    were ranked by.
+    """
+    if fusion not in FUSION_TYPES:
+        raise ValueError(f"Unknown fusion '{fusion}' (expected one of {', '.join(FUSION_TYPES)}).")
+    fused = {}
+    for rows, scores, weight in ((vector_rows, vector_scores, alpha), (keyword_rows, keyword_scores, 1 - alpha)):
+        if not len(rows) or weight <= 0:
+            continue
+        if fusion == "ranked":
+            for rank, row in enumerate(rows):
+                fused[row] = fused.get(row, 0.0) + weight / (RRF_K + rank + 1)
+        else:
+            values = scores[rows]
+            low, high = float(values.min()), float(values.max())
+            spread = high - low
+            for row, value in zip(rows, values):
+                # A single candidate (or all equal) counts as the best match
+                normalised = (float(value) - low) / spread if spread else 1.0
+                fused[row] = fused.get(row, 0.0) + weight * normalised
+    return fused
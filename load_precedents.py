@@ -1,19 +1,25 @@
 import os
-import time
+import queue
+import threading
 import pandas as pd
 import cohere
 import weaviate
 import glob # Import the glob module to find files
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from weaviate.connect import ConnectionParams
 from weaviate.classes.data import DataObject # Correct import for v4
+from schema import PRECEDENT_PROPERTIES, bump_data_version, ensure_properties
+from precedent_records import read_case_chunks, fetch_existing, update_sections
+from embed_client import EmbeddingClient
 
 # --- Configuration ---
 # Use glob to find all CSV files starting with 'ipc_' and ending with '_cases.csv'
 CSV_FILE_PATTERN = "ipc_*_cases.csv" #  Pattern to find your scraped files
 PRECEDENT_COLLECTION_NAME = "Precedents"
-BATCH_SIZE = 10 # Process N cases at a time for embedding
-RETRY_DELAY = 60 # Seconds to wait if Cohere API limit is hit
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "500")) # Rows per read_csv chunk
+CSV_READ_WORKERS = int(os.getenv("CSV_READ_WORKERS", "4")) # Files read concurrently
+CSV_QUEUE_CHUNKS = int(os.getenv("CSV_QUEUE_CHUNKS", "8")) # Chunks buffered between readers and embedder
 # --- End Configuration ---
 
 # --- Load Environment Variables & Initialize Clients ---
@@ -28,7 +34,13 @@ if not COHERE_API_KEY:
 
 try:
     co = cohere.Client(COHERE_API_KEY)
+    # Rate limiting, retries and concurrency live in embed_client.py
+    embedder = EmbeddingClient(co, EMBEDDING_MODEL)
+    BATCH_SIZE = embedder.batch_size # Cohere's maximum (96) unless EMBED_BATCH_SIZE says otherwise
     print("✅ Cohere client initialized.")
+    if embedder.embedding_type != "float":
+        print(f"🗜️ Requesting {embedder.embedding_type} embeddings (pair with VECTOR_INDEX_PROFILE="
+              f"{'sq' if embedder.embedding_type == 'int8' else 'bq'} to keep them compact in memory).")
 except Exception as e:
     print(f"❌ Error initializing Cohere client: {e}")
     exit()
@@ -52,6 +64,8 @@ if PRECEDENT_COLLECTION_NAME not in client.collections.list_all():
 else:
     precedent_collection = client.collections.get(PRECEDENT_COLLECTION_NAME)
     print(f"✅ Using Weaviate collection: {PRECEDENT_COLLECTION_NAME}")
+    for added in ensure_properties(precedent_collection, PRECEDENT_PROPERTIES):
+        print(f"➕ Added missing property '{added}' to {PRECEDENT_COLLECTION_NAME}.")
     
 # --- End Initialization ---
 
@@ -67,100 +81,169 @@ for f in csv_files:
     print(f"   - {f}")
 # --- End Find CSV files ---
 
-total_cases_processed = 0
+# --- Pipeline: concurrent chunked readers -> one global embedding queue ---
+# Files are read concurrently in chunks of CSV_CHUNK_ROWS and handed over through a
+# bounded queue, so at most ~CSV_QUEUE_CHUNKS chunks are in memory at once and
+# embedding batches fill up across file boundaries.
+chunk_queue = queue.Queue(maxsize=CSV_QUEUE_CHUNKS)
+stop_reading = threading.Event() # Set if the consumer dies, so readers don't block forever
+
 
-# --- Loop through each CSV file ---
-for csv_filename in csv_files:
-    print(f"\n--- Processing file: {csv_filename} ---")
+def enqueue(item):
+    while not stop_reading.is_set():
+        try:
+            chunk_queue.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
 
-    # 1. Read the current CSV file
+
+def read_file(csv_filename):
+    """Reader thread: pushes validated chunks of one CSV onto the queue."""
     try:
-        df = pd.read_csv(csv_filename)
-        # Handle potential missing summaries (fill with empty string)
-        df['summary_text'] = df['summary_text'].fillna('')
-        # Ensure other key columns exist
-        if 'case_name' not in df.columns: df['case_name'] = 'N/A'
-        if 'citation' not in df.columns: df['citation'] = 'N/A'
-        print(f"📄 Read {len(df)} cases from {csv_filename}.")
+        for frame in read_case_chunks(csv_filename, CSV_CHUNK_ROWS):
+            if not enqueue(("rows", csv_filename, frame)):
+                return
     except Exception as e:
-        print(f"❌ Error reading CSV file {csv_filename}: {e}. Skipping this file.")
-        continue # Skip to the next file
-
-    # Filter out rows with empty summaries as they can't be embedded
-    df = df[df['summary_text'].str.strip() != '']
-    if df.empty:
-        print(f"🤷 No valid case summaries found in {csv_filename} to process.")
-        continue # Skip to the next file
-
-    print(f"⚙️ Processing {len(df)} cases with valid summaries from {csv_filename}...")
-
-    # 2. Generate Embeddings & Store in Weaviate in Batches for this file
-    file_cases_processed = 0
-    # Use a new context manager for each file's batch operations
-    with precedent_collection.batch.dynamic() as batch:
-        for i in range(0, len(df), BATCH_SIZE):
-            batch_df = df.iloc[i:i + BATCH_SIZE]
-            texts_to_embed = batch_df['summary_text'].tolist()
-            batch_num = (i // BATCH_SIZE) + 1
-
-            print(f"   🧩 Processing batch {batch_num}/{ (len(df) + BATCH_SIZE - 1)//BATCH_SIZE } ({len(texts_to_embed)} cases)...")
-
-            # Get Embeddings
-            embeddings = []
-            try:
-                response = co.embed(
-                    texts=texts_to_embed,
-                    model=EMBEDDING_MODEL,
-                    input_type="search_document"
-                )
-                embeddings = response.embeddings # Assuming list of lists/vectors
+        enqueue(("error", csv_filename, e))
+    finally:
+        enqueue(("done", csv_filename, None))
+
+
+# Summary counters across all files
+summary = {"inserted": 0, "updated": 0, "skipped": 0, "duplicates": 0, "failed": 0, "sections_updated": 0}
+rows_per_file = {}
+seen_ids = set() # Cases listed under several sections are loaded once...
+case_sections = {} # ...but keep every section they were listed under (uuid -> set)
+stored_sections = {} # uuid -> ipc_sections as stored in Weaviate after this run's inserts
+queued = {} # uuid -> (is_update, ipc_sections stored before this run) for every object handed to the batch
+
+
+def new_or_changed(frame):
+    """Drops duplicates and unchanged cases from one chunk (one bulk lookup per chunk)."""
+    for object_id, section in zip(frame['uuid'], frame['ipc_section']):
+        if section:
+            case_sections.setdefault(object_id, set()).add(section)
+    duplicate_mask = frame['uuid'].isin(seen_ids) | frame['uuid'].duplicated()
+    summary["duplicates"] += int(duplicate_mask.sum())
+    frame = frame[~duplicate_mask]
+    seen_ids.update(frame['uuid'])
+
+    existing = fetch_existing(precedent_collection, frame['uuid'].tolist())
+    stored_sections.update({object_id: sections for object_id, (_, sections) in existing.items()})
+    unchanged = frame['uuid'].map({object_id: digest for object_id, (digest, _) in existing.items()}) == frame['content_hash']
+    summary["skipped"] += int(unchanged.sum())
+    frame = frame[~unchanged].copy()
+    frame['is_update'] = frame['uuid'].isin(existing.keys())
+    return frame
+
+
+def pending_batches():
+    """Yields full BATCH_SIZE batches of cases to embed, drawn from every file as it streams in."""
+    buffer = []
+    buffered = 0
+    batch_num = 0
+    files_left = len(csv_files)
+    while files_left:
+        kind, csv_filename, payload = chunk_queue.get()
+        if kind == "done":
+            files_left -= 1
+            print(f"📄 Finished reading {csv_filename} ({rows_per_file.get(csv_filename, 0)} cases with summaries).")
+            continue
+        if kind == "error":
+            print(f"❌ Error reading CSV file {csv_filename}: {payload}. Skipping the rest of this file.")
+            continue
+
+        rows_per_file[csv_filename] = rows_per_file.get(csv_filename, 0) + len(payload)
+        try:
+            frame = new_or_changed(payload)
+        except Exception as e:
+            print(f"   ❌ Could not check existing objects for a chunk of {csv_filename} ({e}). Skipping chunk.")
+            continue
+        if not frame.empty:
+            buffer.append(frame)
+            buffered += len(frame)
+
+        while buffered >= BATCH_SIZE:
+            pending = pd.concat(buffer, ignore_index=True)
+            batch_df, rest = pending.iloc[:BATCH_SIZE], pending.iloc[BATCH_SIZE:]
+            buffer, buffered = [rest], len(rest)
+            batch_num += 1
+            print(f"   🧩 Queueing batch {batch_num} ({len(batch_df)} new or changed cases)...")
+            yield (batch_num, batch_df), batch_df['summary_text'].tolist()
+
+    if buffered:
+        batch_df = pd.concat(buffer, ignore_index=True)
+        batch_num += 1
+        print(f"   🧩 Queueing batch {batch_num} ({len(batch_df)} new or changed cases)...")
+        yield (batch_num, batch_df), batch_df['summary_text'].tolist()
+
+
+print(f"⚙️ Reading {len(csv_files)} files with {CSV_READ_WORKERS} readers, {CSV_CHUNK_ROWS} rows per chunk...")
+total_cases_processed = 0
+with ThreadPoolExecutor(max_workers=CSV_READ_WORKERS, thread_name_prefix="csv") as readers:
+    for csv_filename in csv_files:
+        readers.submit(read_file, csv_filename)
+
+    # Embed with several batches in flight and store each one as it completes
+    try:
+        with precedent_collection.batch.dynamic() as batch:
+            for (batch_num, batch_df), texts, embeddings in embedder.embed_batches(pending_batches()):
+                if isinstance(embeddings, Exception):
+                    print(f"   ❌ Batch {batch_num} failed after retries. Skipping batch. Error: {embeddings}")
+                    continue
+                if len(embeddings) != len(batch_df):
+                    print(f"      ❌ Mismatch between texts ({len(batch_df)}) and embeddings ({len(embeddings)}). Skipping Weaviate insertion for this batch.")
+                    continue
                 print(f"   ✅ Batch {batch_num}: Embeddings generated ({len(embeddings)} vectors).")
-                time.sleep(2) # Small delay
-
-            except Exception as e:
-                print(f"   ⚠️ Batch {batch_num} embedding failed: {e}")
-                print(f"   ⏳ Retrying after {RETRY_DELAY} seconds...")
-                time.sleep(RETRY_DELAY)
-                try:
-                    # Retry once
-                    response = co.embed(
-                        texts=texts_to_embed, model=EMBEDDING_MODEL, input_type="search_document"
-                    )
-                    embeddings = response.embeddings
-                    print(f"   ✅ Batch {batch_num} retried successfully.")
-                except Exception as e2:
-                    print(f"   ❌ Batch {batch_num} failed again. Skipping batch. Error: {e2}")
-                    continue # Skip this batch
-
-            # Add data to Weaviate batch
-            if len(embeddings) == len(batch_df):
-                print(f"      Adding {len(batch_df)} items to Weaviate batch...")
-                for idx, (_, row) in enumerate(batch_df.iterrows()):
-                    properties = {
-                        "case_summary": row['summary_text'],
-                        "case_name": row['case_name'],
-                        "citation": row['citation']
-                        # Add other properties if needed
-                    }
-                    # Add IPC Section as a property IF you want (optional)
-                    # ipc_section_from_filename = csv_filename.split('_')[1] # Extract from 'ipc_302_cases.csv'
-                    # properties['ipc_section'] = ipc_section_from_filename
-
-                    batch.add_object(
-                         properties=properties,
-                         vector=embeddings[idx]
-                     )
-                file_cases_processed += len(batch_df)
-                print(f"      Batch {batch_num} added. Processed so far for this file: {file_cases_processed}")
-            else:
-                 print(f"      ❌ Mismatch between texts ({len(batch_df)}) and embeddings ({len(embeddings)}). Skipping Weaviate insertion for this batch.")
-
-    print(f"--- Finished processing file: {csv_filename}. Added {file_cases_processed} cases. ---")
-    total_cases_processed += file_cases_processed
+
+                # Properties built column-wise; a known UUID makes each add an upsert
+                properties = batch_df[['summary_text', 'case_digest', 'case_name', 'citation', 'content_hash']].rename(
+                    columns={'summary_text': 'case_summary'}
+                ).to_dict('records')
+                for props, object_id, section, is_update, vector in zip(
+                    properties, batch_df['uuid'], batch_df['ipc_section'], batch_df['is_update'], embeddings
+                ):
+                    props['ipc_sections'] = [section] if section else []
+                    queued[str(object_id)] = (bool(is_update), stored_sections.get(object_id))
+                    stored_sections[object_id] = props['ipc_sections']
+                    batch.add_object(properties=props, uuid=object_id, vector=vector)
+
+                total_cases_processed += len(batch_df)
+                print(f"      Batch {batch_num} queued for Weaviate. Queued so far: {total_cases_processed}")
+    finally:
+        stop_reading.set()
+
+# Only now is it known which objects Weaviate rejected: count the rest, and
+# forget the sections recorded for the failures so update_sections doesn't trust them
+failed_ids = {str(failure.object_.uuid) for failure in precedent_collection.batch.failed_objects}
+summary["failed"] += len(failed_ids)
+for object_id, (is_update, previous_sections) in queued.items():
+    if object_id not in failed_ids:
+        summary["updated" if is_update else "inserted"] += 1
+    elif previous_sections is None:
+        stored_sections.pop(object_id, None)
+    else:
+        stored_sections[object_id] = previous_sections
+
+# Cases found under several sections (or stored before sections were recorded) get
+# the full list now that every file has been read. Only the property is patched.
+summary["sections_updated"], section_failures = update_sections(precedent_collection, case_sections, stored_sections)
+summary["failed"] += section_failures
+if summary["inserted"] or summary["updated"] or summary["sections_updated"]:
+    bump_data_version(client, PRECEDENT_COLLECTION_NAME)  # Invalidates cached verdicts in the app
 
 print("\n\nFinished processing all CSV files! ")
-print(f"Total cases processed and attempted to store in Weaviate: {total_cases_processed}")
+print(f"Total cases sent to Weaviate: {total_cases_processed}, stored: {total_cases_processed - len(failed_ids)}")
+print(f"📊 Summary: {summary['inserted']} inserted, {summary['updated']} updated, "
+      f"{summary['skipped']} skipped (unchanged), {summary['duplicates']} duplicates across files, "
+      f"{summary['sections_updated']} section lists updated.")
+print(f"📈 Cohere calls: {embedder.stats['calls']} ({embedder.stats['rate_limited']} rate-limited, "
+      f"{embedder.stats['transient_errors']} transient errors).")
+if summary["failed"]:
+    print(f"⚠️ {summary['failed']} objects failed to store in Weaviate.")
 
 # 3. Close Connection
 client.close()
-print("🔒 Weaviate connection closed.")
\ No newline at end of file
+print("🔒 Weaviate connection closed.")
@@ -0,0 +1,326 @@
+"""
+load_test.py
+-------------
+Closed-loop load test for the verdict API: N client threads, each on its own
+keep-alive connection, send unique queries (so the verdict cache never hits)
+for a fixed duration and report throughput and latency percentiles.
+
+Against a running server:
+
+    python load_test.py --url http://127.0.0.1:5001 --concurrency 32 --duration 30
+
+Scaling with worker count, fully offline: spawns `serve.py` once per worker
+count, backed by a fake Cohere API (fixed or randomly drawn latency per call,
+standing in for network time) and a synthetic NumPy corpus instead of Weaviate:
+
+    python load_test.py --spawn-workers 1 2 4 --fake-cohere-latency-ms 150 \\
+        --synthetic 20000 --concurrency 64 --duration 20
+
+Each /query makes one embed and one chat call, so with a fake latency the
+test measures how much I/O wait the server overlaps (workers x threads);
+without it, it measures CPU-bound per-request cost (retrieval, JSON, Flask).
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+# ----------------------- #
+#   FAKE COHERE API       #
+# ----------------------- #
+
+def latency_sampler(spec, seed=0):
+    """Latency distribution (ms) from a spec; returns a thread-safe zero-argument sampler.
+
+    "150" or "fixed:150", "uniform:50:250", "normal:150:30" (mean, stddev),
+    "lognormal:150:0.5" (median, sigma) or "exp:150" (mean). Never negative.
+    """
+    kind, _, params = str(spec).partition(":")
+    if not params:
+        kind, params = "fixed", kind
+    values = [float(value) for value in params.split(":")]
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    draws = {
+        "fixed": lambda: values[0],
+        "uniform": lambda: rng.uniform(values[0], values[1]),
+        "normal": lambda: rng.gauss(values[0], values[1]),
+        "lognormal": lambda: values[0] * rng.lognormvariate(0.0, values[1]),
+        "exp": lambda: rng.expovariate(1.0 / values[0]) if values[0] else 0.0,
+    }
+    if kind not in draws:
+        raise ValueError(f"Unknown latency distribution '{kind}' (expected one of {', '.join(draws)}).")
+
+    def sample():
+        with lock:
+            return max(0.0, draws[kind]())
+    return sample
+
+
+def chat_response():
+    return {"text": "Verdict: (load test) the accused is liable under the cited sections.",
+            "generation_id": str(uuid.uuid4()), "response_id": str(uuid.uuid4()),
+            "finish_reason": "COMPLETE", "chat_history": [], "meta": {}}
+
+
+def fake_cohere_server(latency_ms, dim, port=0, chat_latency_ms=None):
+    """Starts a threaded HTTP server answering /v1/embed and /v1/chat. Returns (server, base_url).
+
+    Latencies are fixed milliseconds or latency_sampler() specs; chat uses the
+    embed latency unless `chat_latency_ms` is given. Embeddings are seeded by
+    the text, so the same query always gets the same vector. A chat request
+    with `"stream": true` gets newline-delimited stream-start /
+    text-generation / stream-end events (chunked), one word at a time, with
+    the chat latency spread over the words.
+    """
+    embed_latency = latency_sampler(latency_ms, seed=1)
+    chat_latency = latency_sampler(latency_ms if chat_latency_ms is None else chat_latency_ms, seed=2)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+        disable_nagle_algorithm = True  # Headers and body go out separately; don't add a delayed-ACK stall
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.endswith("/chat") and body.get("stream"):
+                self.stream_chat()
+                return
+            time.sleep((embed_latency() if self.path.endswith("/embed") else chat_latency()) / 1000)
+            if self.path.endswith("/embed"):
+                embeddings = []
+                for text in body.get("texts", []):
+                    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+                    embeddings.append(np.random.default_rng(seed).standard_normal(dim).round(5).tolist())
+                payload = {"id": str(uuid.uuid4()), "embeddings": embeddings, "texts": body.get("texts", []),
+                           "meta": {}, "response_type": "embeddings_floats"}
+            elif self.path.endswith("/chat"):
+                payload = chat_response()
+            else:
+                self.send_error(404)
+                return
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def stream_chat(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/stream+json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            response = chat_response()
+            words = response["text"].split(" ")
+            delay = chat_latency() / 1000 / len(words)
+            self.write_event({"event_type": "stream-start", "generation_id": response["generation_id"],
+                              "is_finished": False})
+            for i, word in enumerate(words):
+                time.sleep(delay)
+                self.write_event({"event_type": "text-generation", "text": word if i == 0 else " " + word,
+                                  "is_finished": False})
+            self.write_event({"event_type": "stream-end", "finish_reason": "COMPLETE", "response": response,
+                              "is_finished": True})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def write_event(self, event):
+            data = json.dumps(event).encode("utf-8") + b"\n"
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ----------------------- #
+#   LOAD GENERATOR        #
+# ----------------------- #
+
+def run_load(url, endpoint, concurrency, duration, timeout=120):
+    """Closed loop: each thread sends its next request as soon as the last returns."""
+    parsed = urllib.parse.urlparse(url)
+    deadline = time.monotonic() + duration
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client(worker_id):
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+        sent = 0
+        while time.monotonic() < deadline:
+            body = json.dumps({"query": f"Load test {worker_id}-{sent}: accused assaulted the victim with a knife"})
+            sent += 1
+            start = time.perf_counter()
+            try:
+                connection.request("POST", endpoint, body=body, headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except Exception as e:
+                connection.close()
+                connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(status)
+        connection.close()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - started
+    return summarize(latencies, errors, wall)
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))] if sorted_values else float("nan")
+
+
+def summarize(latencies, errors, wall):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_kinds": sorted({str(e) for e in errors}),
+        "rps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": (statistics.fmean(latencies) * 1000) if latencies else float("nan"),
+    }
+
+
+# ----------------------- #
+#   SPAWNED SERVERS       #
+# ----------------------- #
+
+def wait_until_healthy(url, process, timeout=60):
+    parsed = urllib.parse.urlparse(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"serve.py exited with code {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=2)
+            connection.request("GET", "/healthz")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become healthy within {timeout}s")
+
+
+def spawn_server(workers, threads, port, env):
+    env = {**env, "WEB_WORKERS": str(workers), "WEB_THREADS": str(threads), "WEB_BIND": f"127.0.0.1:{port}"}
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_healthy(url, process)
+    except Exception:
+        process.kill()
+        raise
+    return process, url
+
+
+def stop_server(process, timeout=40):
+    process.terminate()  # SIGTERM: gunicorn's graceful shutdown
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def print_row(label, result):
+    print(f"   {label:<10} {result['rps']:8.1f} req/s  p50={result['p50_ms']:7.1f} ms  "
+          f"p95={result['p95_ms']:7.1f} ms  p99={result['p99_ms']:7.1f} ms  "
+          f"ok={result['requests']:<6} errors={result['errors']}"
+          + (f" {result['error_kinds']}" if result["errors"] else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5001")
+    parser.add_argument("--endpoint", default="/query")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per run")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of untimed load before each run")
+    parser.add_argument("--spawn-workers", type=int, nargs="+", help="start serve.py once per worker count")
+    parser.add_argument("--threads", type=int, default=8, help="WEB_THREADS for spawned servers")
+    parser.add_argument("--port", type=int, default=5101, help="port for spawned servers")
+    parser.add_argument("--fake-cohere-latency-ms", help="serve Cohere calls from a local fake: ms per call, "
+                                                         "or a distribution such as lognormal:150:0.4")
+    parser.add_argument("--synthetic", type=int, help="use a random NumPy corpus of this many precedents")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.fake_cohere_latency_ms is not None:
+        _, base_url = fake_cohere_server(args.fake_cohere_latency_ms, args.dim)
+        env.update(COHERE_BASE_URL=base_url, COHERE_API_KEY=env.get("COHERE_API_KEY") or "load-test")
+        print(f"🧪 Fake Cohere at {base_url} ({args.fake_cohere_latency_ms} ms per call)")
+    if args.synthetic:
+        from bench_retrieval import write_synthetic
+        data_dir = tempfile.mkdtemp(prefix="load_test_vectors_")
+        write_synthetic(data_dir, args.synthetic, args.dim)
+        env.update(RETRIEVAL_BACKEND="numpy", VECTOR_DATA_DIR=data_dir)
+        print(f"🧪 Synthetic NumPy corpus: {args.synthetic} precedents x {args.dim} dims in {data_dir}")
+    # Unique queries never hit the caches; keep the disk tier out of the measurement too
+    env.setdefault("EMBED_CACHE_PATH", "")
+
+    results = {}
+    print(f"\n📈 {args.endpoint}, {args.concurrency} concurrent clients, {args.duration:.0f}s per run")
+    if args.spawn_workers:
+        for workers in args.spawn_workers:
+            process, url = spawn_server(workers, args.threads, args.port, env)
+            try:
+                if args.warmup:
+                    run_load(url, args.endpoint, args.concurrency, args.warmup)
+                result = run_load(url, args.endpoint, args.concurrency, args.duration)
+            finally:
+                stop_server(process)
+            results[f"{workers}x{args.threads}"] = result
+            print_row(f"{workers}w x {args.threads}t", result)
+        baseline = next(iter(results.values()))["rps"]
+        if baseline:
+            print("\n   Scaling vs first run: " + ", ".join(
+                f"{label}={result['rps'] / baseline:.2f}x" for label, result in results.items()))
+    else:
+        if args.warmup:
+            run_load(args.url, args.endpoint, args.concurrency, args.warmup)
+        results[args.url] = run_load(args.url, args.endpoint, args.concurrency, args.duration)
+        print_row("server", results[args.url])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
@@ -0,0 +1,50 @@
+"""
+logging_setup.py
+-----------------
+Leveled, non-blocking logging for the web app.
+
+Request threads only put records on an in-memory queue (QueueHandler); one
+background thread per process (QueueListener) formats them onto stdout, so a
+slow terminal or log pipe never stalls a request. LOG_LEVEL picks the level
+(default INFO; DEBUG adds the per-stage chatter of every request).
+
+Threads don't survive a fork, so configure_logging() is called again in each
+server worker (create_app() does it) and starts that process's own listener.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "%(asctime)s %(levelname)-7s [%(process)d] %(name)s: %(message)s")
+# HTTP client libraries log every call at INFO / DEBUG; keep them to warnings
+QUIET_LOGGERS = ("httpx", "httpcore", "urllib3", "grpc")
+
+_state = {"pid": None, "listener": None, "handler": None}
+
+
+def configure_logging(level=LOG_LEVEL):
+    """Routes the root logger through a queue to stdout; once per process, later calls are no-ops."""
+    if _state["pid"] == os.getpid():
+        return
+    root = logging.getLogger()
+    if _state["handler"] is not None:
+        root.removeHandler(_state["handler"])  # Inherited from the parent process, whose listener is gone
+
+    records = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    listener.start()
+    handler = logging.handlers.QueueHandler(records)
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _state.update(pid=os.getpid(), listener=listener, handler=handler)
+    atexit.register(listener.stop)  # Flushes whatever is still queued
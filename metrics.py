@@ -0,0 +1,93 @@
+"""
+metrics.py
+-----------
+Prometheus metrics for the verdict pipeline, served at /metrics.
+
+    verdict_requests_total{endpoint, status}        requests answered
+    verdict_request_seconds{endpoint}               whole-request latency
+    verdict_requests_in_flight{endpoint}            requests being served right now
+    verdict_stage_seconds{stage}                    embed, retrieval, ipc_search,
+                                                    precedent_search, prompt, chat,
+                                                    chat_first_token
+    verdict_stage_errors_total{stage, upstream}     failures per stage and dependency
+                                                    (cohere, weaviate, numpy)
+    verdict_cache_lookups_total{cache, result}      embedding / verdict cache hits and misses
+
+Verdict cache hit ratio (every query gets an exact_hit or exact_miss; exact
+misses that reach retrieval add a semantic_hit or semantic_miss):
+
+    sum(rate(verdict_cache_lookups_total{cache="verdict", result=~".*_hit"}[5m]))
+      / sum(rate(verdict_cache_lookups_total{cache="verdict", result=~"exact_.*"}[5m]))
+
+Under gunicorn every worker is its own process, so serve.py points
+PROMETHEUS_MULTIPROC_DIR at a shared directory before anything imports
+prometheus_client; each worker then writes its samples there and /metrics
+(answered by whichever worker gets the scrape) adds up all of them.
+"""
+
+import glob
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+
+# Seconds; the chat call dominates, so the upper buckets matter as much as the lower ones
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUESTS = Counter("verdict_requests_total", "Requests answered.", ["endpoint", "status"])
+REQUEST_LATENCY = Histogram("verdict_request_seconds", "Whole-request latency.", ["endpoint"],
+                            buckets=LATENCY_BUCKETS)
+IN_FLIGHT = Gauge("verdict_requests_in_flight", "Requests being served.", ["endpoint"],
+                  multiprocess_mode="livesum")
+STAGE_LATENCY = Histogram("verdict_stage_seconds", "Latency of one pipeline stage.", ["stage"],
+                          buckets=LATENCY_BUCKETS)
+STAGE_ERRORS = Counter("verdict_stage_errors_total", "Pipeline stage failures.", ["stage", "upstream"])
+CACHE_LOOKUPS = Counter("verdict_cache_lookups_total", "Cache lookups by result.", ["cache", "result"])
+
+
+def observe_stages(timings):
+    """Records every `<stage>_ms` entry of a response's timings dict."""
+    for key, value in timings.items():
+        if key.endswith("_ms") and value is not None:
+            STAGE_LATENCY.labels(key[:-3]).observe(value / 1000)
+
+
+def record_error(stage, upstream):
+    STAGE_ERRORS.labels(stage, upstream).inc()
+
+
+def record_cache(cache, result):
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def server_timing(timings, total_ms=None):
+    """Server-Timing header value ("embed;dur=81.2, chat;dur=903.4, ...") for a timings dict."""
+    entries = [f"{key[:-3]};dur={value}" for key, value in timings.items() if key.endswith("_ms") and value is not None]
+    if total_ms is not None:
+        entries.append(f"total;dur={total_ms}")
+    return ", ".join(entries)
+
+
+def render():
+    """(body, content type) of the Prometheus text exposition, across workers when multi-process."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def reset_multiprocess_dir(path):
+    """Creates `path` and removes samples left by an earlier server run."""
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+
+
+def mark_worker_dead(pid):
+    """Drops an exited worker's live gauges (in-flight requests) from the totals."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,144 @@
+"""
+migrate_nlp_vectors.py
+-----------------------
+Migrates the 'NLP' collection off the legacy `embedding` NUMBER_ARRAY property.
+
+Older imports stored each 1024-float vector as a property and attached no real
+vector, so every object carried a large unindexed payload and the vector index
+had nothing to search. This script:
+
+  1. Spools every object (UUID, schema properties, vector) to a local snapshot,
+     taking the vector from the `embedding` property (or the object's own
+     vector if it already has one).
+  2. Verifies the spooled count against the collection count.
+  3. Recreates 'NLP' from schema.py (no `embedding` property).
+  4. Re-inserts everything in bulk with the same UUIDs and real vectors.
+  5. Verifies the new count and that objects carry vectors.
+
+The spool is kept on disk, so a failure after step 3 can be recovered with
+`--restore`. Use `--dry-run` to stop after step 2.
+"""
+
+import argparse
+import os
+
+import weaviate
+from dotenv import load_dotenv
+from weaviate.connect import ConnectionParams
+
+from schema import NLP_COLLECTION, NLP_PROPERTIES, bump_data_version, create_nlp_collection
+from snapshot import SnapshotWriter, open_snapshot
+
+load_dotenv()
+
+WEAVIATE_HTTP_URL = os.getenv("WEAVIATE_HTTP_URL", "http://localhost:8081")
+WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "embed-multilingual-v3.0")
+SPOOL_PATH = os.getenv("NLP_MIGRATION_SPOOL", ".cache/nlp_migration_spool")
+INSERT_BATCH_SIZE = 200
+
+
+def count_objects(collection):
+    return collection.aggregate.over_all(total_count=True).total_count
+
+
+def spool_collection(collection, spool_path):
+    """Writes every object to a snapshot. Returns (spooled, without_vector)."""
+    # Every schema property the old collection has (older ones lack page_start / page_end)
+    existing = {prop.name for prop in collection.config.get().properties}
+    names = [prop.name for prop in NLP_PROPERTIES if prop.name in existing]
+    without_vector = 0
+    with SnapshotWriter(spool_path, model=EMBEDDING_MODEL) as writer:
+        for obj in collection.iterator(include_vector=True, return_properties=names + ["embedding"]):
+            vector = obj.properties.get("embedding")
+            if not vector and obj.vector:
+                vector = obj.vector.get("default")
+            if not vector:
+                without_vector += 1
+                continue
+            writer.add(
+                vector,
+                {name: obj.properties[name] for name in names if obj.properties.get(name) is not None},
+                uuid=obj.uuid,
+            )
+    return writer.rows, without_vector
+
+
+def restore_from_spool(collection, spool_path):
+    """Bulk-inserts the spooled objects with real vectors. Returns the failure count."""
+    snapshot = open_snapshot(spool_path)
+    with collection.batch.fixed_size(batch_size=INSERT_BATCH_SIZE) as batch:
+        for vectors, records in snapshot.iter_batches(INSERT_BATCH_SIZE):
+            for vector, record in zip(vectors, records):
+                batch.add_object(
+                    properties=record["properties"],
+                    uuid=record["uuid"],
+                    vector=vector.tolist()
+                )
+    failed = collection.batch.failed_objects
+    for failure in failed[:5]:
+        print(f"   ⚠️ {failure.message}")
+    return len(failed)
+
+
+def recreate_and_restore(client, spool_path, expected):
+    """Drops NLP, recreates it without the property and re-imports the spool."""
+    if NLP_COLLECTION in client.collections.list_all():
+        client.collections.delete(NLP_COLLECTION)
+        print(f"🗑️ Deleted old '{NLP_COLLECTION}' collection.")
+    collection = create_nlp_collection(client)
+    print(f"✅ Recreated '{NLP_COLLECTION}' without the `embedding` property.")
+
+    print(f"📥 Re-importing {expected} objects with real vectors...")
+    failed = restore_from_spool(collection, spool_path)
+    bump_data_version(client, NLP_COLLECTION)
+
+    migrated = count_objects(collection)
+    sample = collection.query.fetch_objects(limit=1, include_vector=True).objects
+    has_vectors = bool(sample and sample[0].vector and sample[0].vector.get("default"))
+    print(f"📊 Expected {expected}, found {migrated}, failed {failed}, vectors attached: {has_vectors}")
+    return migrated == expected and not failed and (has_vectors or not expected)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move NLP vectors from the `embedding` property into real vectors.")
+    parser.add_argument("--dry-run", action="store_true", help="Spool and verify only; don't touch the collection.")
+    parser.add_argument("--restore", action="store_true", help="Skip spooling and re-import an existing spool.")
+    parser.add_argument("--force", action="store_true", help="Migrate even if some objects have no vector.")
+    parser.add_argument("--spool", default=SPOOL_PATH)
+    args = parser.parse_args()
+
+    client = weaviate.WeaviateClient(
+        connection_params=ConnectionParams.from_url(WEAVIATE_HTTP_URL, WEAVIATE_GRPC_PORT)
+    )
+    client.connect()
+    try:
+        if args.restore:
+            expected = len(open_snapshot(args.spool))
+        else:
+            if NLP_COLLECTION not in client.collections.list_all():
+                raise SystemExit(f"❌ Collection '{NLP_COLLECTION}' not found in Weaviate.")
+            collection = client.collections.get(NLP_COLLECTION)
+            original = count_objects(collection)
+
+            print(f"📦 Spooling {original} objects from '{NLP_COLLECTION}' to {args.spool}...")
+            spooled, without_vector = spool_collection(collection, args.spool)
+            print(f"✅ Spooled {spooled} objects ({without_vector} without any vector).")
+
+            if spooled + without_vector != original:
+                raise SystemExit(f"❌ Count mismatch: collection has {original}, read {spooled + without_vector}. "
+                                 "Was it written to during the export? Nothing was changed.")
+            if without_vector and not args.force:
+                raise SystemExit(f"❌ {without_vector} objects have no vector and would be dropped. "
+                                 "Re-run with --force to accept that. Nothing was changed.")
+            if args.dry_run:
+                raise SystemExit("🧪 Dry run complete. Nothing was changed.")
+            expected = spooled
+
+        if recreate_and_restore(client, args.spool, expected):
+            print(f"🎉 Migration verified. Spool kept at {args.spool} (safe to delete).")
+        else:
+            raise SystemExit(f"❌ Verification failed. Re-run with --restore to re-import from {args.spool}.")
+    finally:
+        client.close()
+        print("🔒 Connection closed.")
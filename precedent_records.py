@@ -0,0 +1,184 @@
+"""
+precedent_records.py
+---------------------
+Helpers for turning scraped `ipc_*_cases.csv` rows into `Precedents` objects.
+
+Every case gets a deterministic object ID (from its Indian Kanoon link, or
+its content when there is no link) and a content hash, so re-running the
+loader can tell new, changed and unchanged rows apart without re-embedding.
+
+CSVs are read in fixed-size chunks and validated column-wise, so memory use
+stays flat however many (or however large) the section files get.
+
+The IPC section comes from the file name (`ipc_304B_cases.csv` -> "304B") and
+is stored as the filterable `ipc_sections` list; a case scraped under several
+sections carries all of them.
+
+`case_digest` is the summary with its header boilerplate stripped, computed
+once here so the app never cleans text per request.
+"""
+
+import hashlib
+import os
+import re
+
+import pandas as pd
+
+from weaviate.classes.query import Filter
+from weaviate.util import generate_uuid5
+
+
+def content_hash(case_name, citation, summary_text):
+    """Stable hash of the fields that end up in the object and its embedding."""
+    raw = "\x1f".join(str(value or "") for value in (case_name, citation, summary_text))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def precedent_uuid(link, digest):
+    """Deterministic object ID: the case link when we have one, else the content hash."""
+    link = str(link or "").strip()
+    return generate_uuid5(link if link else f"content:{digest}")
+
+
+_SECTION_FILENAME = re.compile(r"ipc_(\d+[A-Za-z]*)_cases\.csv$")
+
+
+def section_from_filename(csv_path):
+    """'ipc_304B_cases.csv' -> '304B'; None for files that don't follow the pattern."""
+    match = _SECTION_FILENAME.search(os.path.basename(csv_path))
+    return match.group(1).upper() if match else None
+
+
+# Column -> fill value for missing columns / empty cells
+CASE_COLUMN_DEFAULTS = {"case_name": "N/A", "citation": "N/A", "link": ""}
+CASE_COLUMNS = ["case_name", "citation", "link", "summary_text", "case_digest", "content_hash", "uuid", "source_file",
+                "ipc_section"]
+
+
+def prepare_cases(df, source_file):
+    """Validates one chunk of a section CSV without touching rows one by one.
+
+    Fills missing columns/values, drops empty summaries (they can't be
+    embedded) and adds the prompt digest, content hash, object ID, source file
+    name and the IPC section named by the file.
+    """
+    if "summary_text" not in df.columns:
+        raise ValueError(f"{source_file} has no 'summary_text' column")
+    for column, default in CASE_COLUMN_DEFAULTS.items():
+        if column not in df.columns:
+            df[column] = default
+    df = df.fillna({**CASE_COLUMN_DEFAULTS, "summary_text": ""})
+    df = df[df["summary_text"].str.strip() != ""].copy()
+
+    df["case_digest"] = [case_digest(text) for text in df["summary_text"]]
+    df["content_hash"] = [
+        content_hash(name, citation, text)
+        for name, citation, text in zip(df["case_name"], df["citation"], df["summary_text"])
+    ]
+    df["uuid"] = [precedent_uuid(link, digest) for link, digest in zip(df["link"], df["content_hash"])]
+    df["source_file"] = os.path.basename(source_file)
+    df["ipc_section"] = section_from_filename(source_file)
+    return df[CASE_COLUMNS]
+
+
+def read_case_chunks(csv_path, chunk_rows=500):
+    """Yields validated DataFrames of at most `chunk_rows` cases from one CSV."""
+    # dtype=str keeps every value exactly as scraped (no float NaN/number coercion)
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=str):
+        yield prepare_cases(chunk, csv_path)
+
+
+def fetch_existing(collection, object_ids):
+    """Returns {object_id: (content_hash, ipc_sections)} for the IDs that already exist, in one query."""
+    if not object_ids:
+        return {}
+    response = collection.query.fetch_objects(
+        filters=Filter.by_id().contains_any(list(object_ids)),
+        limit=len(object_ids),
+        return_properties=["content_hash", "ipc_sections"],
+    )
+    return {
+        str(obj.uuid): (obj.properties.get("content_hash"), sorted(obj.properties.get("ipc_sections") or []))
+        for obj in response.objects or []
+    }
+
+
+def update_sections(collection, wanted, stored):
+    """Writes `ipc_sections` where the wanted set differs from what is stored.
+
+    `wanted` and `stored` map object IDs to section collections; IDs missing
+    from `stored` (not in the collection) are left alone. Only the property is
+    patched, so nothing is re-embedded. Returns (updated, failed).
+    """
+    updated = failed = 0
+    for object_id, sections in wanted.items():
+        sections = sorted(sections)
+        if object_id not in stored or sorted(stored[object_id]) == sections:
+            continue
+        try:
+            collection.data.update(uuid=object_id, properties={"ipc_sections": sections})
+            updated += 1
+        except Exception as e:
+            print(f"   ⚠️ Could not update sections of {object_id}: {e}")
+            failed += 1
+    return updated, failed
+
+
+# --- Case digests -----------------------------------------------------------
+# Scraped summaries are mostly judgment headers: court, parties with addresses,
+# counsel, bench, report citations, page stamps. The digest keeps the lines
+# that say something about the case (court, case number, date, act/headnote
+# and any judgment text) and is what goes into the chat prompt.
+
+DIGEST_MAX_CHARS = int(os.getenv("DIGEST_MAX_CHARS", "1000"))
+
+# Supreme Court reporter format: "BENCH:", "CITATION:" ... blocks, dropped up to the next "HEADER:" line
+_DIGEST_BLOCK = re.compile(r"^([A-Z][A-Z ]+):")
+_DIGEST_SKIP_BLOCKS = {"BENCH", "CITATION", "CITATOR INFO", "PETITIONER", "RESPONDENT", "CORAM", "PRESENT",
+                       "APPEARANCE", "BETWEEN", "AND", "COUNSEL"}
+_DIGEST_DROP = re.compile(r"""
+    ^[\W_\d]*$                                            # rules, bullets, page numbers, bare dates
+  | ^(?:reportable|non[-\s]?reportable|j\s*u\s*d\s*g\s*m\s*e\s*n\s*t|judgment|order|with|and|between|
+       present|before|coram|versus|vs\.?|-vs-|v\.?|division\s+bench|single\s+bench|in\s+person)\W*$
+  | ^page\s+\d+|^\d+\s*(?:of|/)\s*\d+\b                   # "Page 3 of 12", "1/31 STATE V ..."
+  | downloaded\s+on|uploaded\s+on|signature\s+not\s+verified|digitally\s+signed|signing\s+date|\$~
+  | ^whether\b|\?\s*$|fair\s+copy                        # reporter questions
+  | advocate|\badv\.|counsel|amicus|appearance|\bp\.?p\.?\b|\ba\.?g\.?a\b|\bapp\b\s+for|^for\s+the\b|^through\b
+  | ^(?:mr|ms|mrs|sh|shri|smt)\.?\s
+  | \b[sdwrc]/o\b|\bresident\s+of\b|\bage[d]?\s*[-:]?\s*\d|\boccupation\b|\bp\.\s*s\.|\bpolice\s+station\b|\bdistrict\b
+  | \.{2,}\s*(?:appellant|respondent|petitioner|accused|complainant|applicant|opposite\s+part)
+  | ^(?:appellant|respondent|petitioner|accused|complainant|applicant)s?(?:\(s\))?\W*(?:no\.?\s*\d+)?\W*$
+  | \(s\)\s+no\.?\s*\d|^(?:judge\W*)+$
+  | ^\d{4}\s+(?:air|scr|scc|scale|sc|cri\s*lj|supp)\b     # report citations
+  | ^(?:e|r|rf|f|d|c|e&d|e&r)\s+\d{4}\s                   # citator info rows
+""", re.I | re.X)
+
+
+def case_digest(summary_text, max_chars=DIGEST_MAX_CHARS):
+    """Compact form of a scraped summary for the chat prompt.
+
+    Drops header boilerplate line by line (counsel, party addresses, bench and
+    citation blocks, reporter questions, page stamps, rules), drops repeated
+    lines, collapses whitespace and cuts at a word boundary past `max_chars`.
+    """
+    kept, seen, skipping = [], set(), False
+    for line in str(summary_text or "").splitlines():
+        line = " ".join(line.split()).strip(" *+#^!|")
+        if not line:
+            continue
+        block = _DIGEST_BLOCK.match(line)
+        if block:
+            skipping = block.group(1).strip() in _DIGEST_SKIP_BLOCKS
+            line = line[block.end():].strip()
+            if skipping or not line:
+                continue
+        elif skipping or _DIGEST_DROP.search(line):
+            continue
+        key = line.lower()
+        if key not in seen:
+            seen.add(key)
+            kept.append(line)
+    digest = " ".join(kept)
+    if len(digest) > max_chars:
+        digest = digest[:max_chars].rsplit(" ", 1)[0] + " …"
+    return digest
@@ -0,0 +1,136 @@
+"""
+quantize.py
+------------
+Compact embedding types, shared by ingestion, snapshots and the NumPy backend.
+
+    float    4 bytes per dimension (Cohere's default)
+    int8     1 byte per dimension, 4x smaller
+    ubinary  1 bit per dimension, 8 dimensions packed per byte, 32x smaller
+
+Ingestion can ask Cohere for `int8` / `ubinary` embeddings directly
+(EMBEDDING_TYPE). Weaviate only takes float vectors, so those are stored as
+their integer values (int8) or as +1/-1 per bit (ubinary); pair them with the
+`sq` / `bq` index profile (schema.py) so the in-memory index copy really is
+1 byte / 1 bit per dimension.
+
+Snapshots quantize float vectors locally instead (export_vectors.py --dtype):
+int8 scales each row so its largest component is ±127 (cosine similarity
+ignores the per-row scale), ubinary keeps the sign bit. Search runs on the
+compact matrix and, when the snapshot also keeps float vectors, rescores the
+best candidates exactly (see retrieval.NumpyBackend).
+"""
+
+import os
+
+import numpy as np
+
+EMBEDDING_TYPES = ("float", "int8", "ubinary")
+EMBEDDING_TYPE = os.getenv("EMBEDDING_TYPE", "float").lower()
+
+# int8 rows are widened to float32 a block at a time while scoring. Keep the
+# widened block inside L2: 4 MB blocks (1024 rows x 1024 dims) made the scan
+# 2.5x slower than plain float32, 1 MB blocks about 1.6x. NumPy's integer
+# matmul has no BLAS kernel, so scoring an int8 query with integer
+# accumulation measured slower still.
+SCORE_BLOCK_BYTES = 2 ** 20
+SCORE_BLOCK_ROWS = 1024  # ubinary rows are scanned SCORE_BLOCK_ROWS * 4 at a time
+
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def check_type(embedding_type):
+    if embedding_type not in EMBEDDING_TYPES:
+        raise ValueError(f"Unknown embedding type '{embedding_type}' (expected one of {', '.join(EMBEDDING_TYPES)}).")
+    return embedding_type
+
+
+def typed_embeddings(embeddings, embedding_type):
+    """The list of vectors of one type from a Cohere embed response's `embeddings`."""
+    if isinstance(embeddings, list):
+        return embeddings  # Untyped request: plain float lists
+    return getattr(embeddings, "float_" if embedding_type == "float" else embedding_type)
+
+
+def to_weaviate_vector(values, embedding_type):
+    """A Cohere embedding of any type as the float list Weaviate stores."""
+    if embedding_type == "ubinary":
+        bits = np.unpackbits(np.asarray(values, dtype=np.uint8))
+        return (bits.astype(np.float32) * 2 - 1).tolist()
+    return [float(value) for value in values]
+
+
+def row_bytes(dtype, dim):
+    return (dim + 7) // 8 if dtype == "ubinary" else dim * np.dtype(dtype).itemsize
+
+
+def storage_dtype(dtype):
+    """NumPy dtype of one stored element (packed bytes for ubinary)."""
+    return np.uint8 if dtype == "ubinary" else np.dtype(dtype)
+
+
+def quantize(vectors, dtype):
+    """Float rows -> rows of `dtype` ("float32", "int8" or "ubinary")."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    if dtype == "float32":
+        return vectors
+    if dtype == "int8":
+        scale = np.abs(vectors).max(axis=1, keepdims=True)
+        scale[scale == 0] = 1.0
+        return np.rint(vectors * (127.0 / scale)).astype(np.int8)
+    if dtype == "ubinary":
+        return np.packbits(vectors > 0, axis=1)
+    raise ValueError(f"Unknown snapshot dtype '{dtype}'.")
+
+
+def popcount(values):
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(values)
+    return _POPCOUNT[values]
+
+
+def block_rows(dim):
+    """int8 rows per scoring block, so the widened float32 copy is SCORE_BLOCK_BYTES."""
+    return max(1, SCORE_BLOCK_BYTES // (dim * 4))
+
+
+def unpack_signs(packed, dim):
+    """Packed ubinary rows -> float32 rows of +1/-1."""
+    bits = np.unpackbits(np.atleast_2d(packed), axis=1, count=dim)
+    return bits.astype(np.float32) * 2 - 1
+
+
+def approx_scores(matrix, dtype, query, dim, inverse_norms=None):
+    """Approximate cosine similarity of a unit-length float `query` to every compact row.
+
+    int8 rows are widened to float32 in cache-sized blocks (never the whole
+    matrix at once) and scaled by their inverse norms; ubinary rows compare sign bits, and
+    1 - 2 * hamming / dim is the cosine between the two +1/-1 vectors.
+    """
+    if dtype == "ubinary":
+        query_bits = np.packbits(np.asarray(query) > 0)
+        hamming = np.zeros(matrix.shape[0], dtype=np.int64)
+        for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS * 4):
+            block = np.bitwise_xor(matrix[start:start + SCORE_BLOCK_ROWS * 4], query_bits)
+            hamming[start:start + len(block)] = popcount(block).sum(axis=1, dtype=np.int64)
+        return (1.0 - 2.0 * hamming / dim).astype(np.float32)
+
+    rows = block_rows(dim)
+    scores = np.empty(matrix.shape[0], dtype=np.float32)
+    for start in range(0, matrix.shape[0], rows):
+        block = matrix[start:start + rows]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query
+    if inverse_norms is not None:
+        scores *= inverse_norms
+    return scores
+
+
+def row_norms(matrix, dtype, dim):
+    """Euclidean norm of every stored row (ubinary rows all have norm sqrt(dim))."""
+    if dtype == "ubinary":
+        return np.full(matrix.shape[0], np.sqrt(dim), dtype=np.float32)
+    rows = block_rows(dim)
+    norms = np.empty(matrix.shape[0], dtype=np.float32)
+    for start in range(0, matrix.shape[0], rows):
+        block = matrix[start:start + rows].astype(np.float32)
+        norms[start:start + len(block)] = np.linalg.norm(block, axis=1)
+    return norms
@@ -0,0 +1,208 @@
+"""
+replay_audit.py
+----------------
+Re-runs queries from the audit log (audit_log.py) against a deployment and
+diffs latency and retrieval results against what was logged.
+
+    python replay_audit.py 'logs/query_audit*' --url http://127.0.0.1:5001     # every worker, rotated files too
+    python replay_audit.py logs/query_audit.jsonl --url http://staging:5001 \\
+        --limit 500 --concurrency 8 --json replay.json --min-overlap 0.9
+
+Every logged query is sent to /query once, in log order, at a fixed
+concurrency (or --rate). The report compares:
+  * latency: server-side total (the Server-Timing header) and each stage in
+    `timings`, p50/p95 logged vs replayed. Cached answers on either side are
+    left out, so run the target with VERDICT_CACHE_CAPACITY=0 for a clean
+    comparison of the whole pipeline;
+  * retrieval: per query, the overlap of the IPC and precedent IDs (shared /
+    larger set), whether the top hit and the full ranking are unchanged, and
+    how far the scores of shared hits moved;
+  * status: queries whose HTTP status changed.
+
+With --min-overlap the exit code is 1 when the mean overlap of either
+collection falls below it, so a replay can gate a deployment.
+"""
+
+import argparse
+import glob
+import json
+import statistics
+import sys
+
+from bench_e2e import Client, distribution, run_closed_loop, run_open_loop
+
+STAGES = ("total_ms", "embed_ms", "retrieval_ms", "ipc_search_ms", "precedent_search_ms", "prompt_ms", "chat_ms")
+COLLECTIONS = ("ipc", "precedents")
+
+
+def load_records(patterns, only_ok=True, limit=None):
+    """Audit records from files / globs, oldest first."""
+    paths = sorted({path for pattern in patterns for path in (glob.glob(pattern) or [pattern])})
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash or rotation
+                if record.get("query") and (record.get("status") == 200 or not only_ok):
+                    records.append(record)
+    records.sort(key=lambda record: record.get("ts", ""))
+    return records[:limit] if limit else records
+
+
+def compare_hits(before, after):
+    """Overlap, top-1 and ranking agreement, and mean |score change| of two hit lists."""
+    before_ids = [hit["id"] for hit in before]
+    after_ids = [hit["id"] for hit in after]
+    shared = set(before_ids) & set(after_ids)
+    largest = max(len(set(before_ids)), len(set(after_ids)))
+    after_scores = {hit["id"]: hit.get("score") for hit in after}
+    deltas = [abs(hit["score"] - after_scores[hit["id"]]) for hit in before
+              if hit["id"] in shared and hit.get("score") is not None and after_scores[hit["id"]] is not None]
+    return {
+        "overlap": len(shared) / largest if largest else 1.0,
+        "same_top": before_ids[:1] == after_ids[:1],
+        "same_ranking": before_ids == after_ids,
+        "score_delta": statistics.fmean(deltas) if deltas else None,
+    }
+
+
+def latency_report(records, samples):
+    """{stage: {"logged": stats, "replayed": stats, "p50_change": fraction}} over uncached pairs."""
+    pairs = [(record, sample) for record, sample in zip(records, samples)
+             if record.get("status") == 200 and sample["status"] == 200
+             and not record.get("cached") and not sample["cached"]]
+    report = {}
+    for stage in STAGES:
+        logged, replayed = [], []
+        for record, sample in pairs:
+            after = sample["server_ms"] if stage == "total_ms" else sample["timings"].get(stage)
+            before = record.get("timings", {}).get(stage)
+            if before is not None and after is not None:
+                logged.append(before)
+                replayed.append(after)
+        if logged:
+            before, after = distribution(logged), distribution(replayed)
+            report[stage] = {"logged": before, "replayed": after,
+                             "p50_change": round(after["p50"] / before["p50"] - 1, 3) if before["p50"] else None}
+    return report
+
+
+def retrieval_report(records, samples, worst=10):
+    """Mean agreement per collection plus the queries whose retrieval moved the most."""
+    compared, rows = {name: [] for name in COLLECTIONS}, []
+    for record, sample in zip(records, samples):
+        if record.get("status") != 200 or sample["status"] != 200 or sample["retrieved"] is None:
+            continue
+        row = {"query": record["query"]}
+        for name in COLLECTIONS:
+            row[name] = compare_hits(record.get(name) or [], sample["retrieved"].get(name) or [])
+            compared[name].append(row[name])
+        rows.append(row)
+
+    report = {"compared": len(rows)}
+    for name, results in compared.items():
+        if not results:
+            continue
+        deltas = [result["score_delta"] for result in results if result["score_delta"] is not None]
+        report[name] = {
+            "mean_overlap": round(statistics.fmean(result["overlap"] for result in results), 4),
+            "same_top": round(statistics.fmean(result["same_top"] for result in results), 4),
+            "same_ranking": round(statistics.fmean(result["same_ranking"] for result in results), 4),
+            "mean_score_delta": round(statistics.fmean(deltas), 4) if deltas else None,
+        }
+    rows.sort(key=lambda row: sum(row[name]["overlap"] for name in COLLECTIONS))
+    changed = {}  # One line per distinct query, however often it was logged
+    for row in rows:
+        if any(row[name]["overlap"] < 1 for name in COLLECTIONS) and len(changed) < worst:
+            changed.setdefault(row["query"], {"query": row["query"][:120],
+                                              **{name: round(row[name]["overlap"], 2) for name in COLLECTIONS}})
+    report["most_changed"] = list(changed.values())
+    return report
+
+
+def status_changes(records, samples):
+    changes = {}
+    for record, sample in zip(records, samples):
+        if record.get("status") != sample["status"]:
+            key = f"{record.get('status')} -> {sample['status']}"
+            changes[key] = changes.get(key, 0) + 1
+    return changes
+
+
+def print_report(report):
+    print(f"\n⏱️ Latency, logged vs replayed ({report['latency_pairs']} uncached pairs)")
+    print(f"   {'stage':<22}{'logged p50':>12}{'replay p50':>12}{'change':>9}{'logged p95':>12}{'replay p95':>12}")
+    for stage, stats in report["latency"].items():
+        change = f"{stats['p50_change']:+.0%}" if stats["p50_change"] is not None else "n/a"
+        print(f"   {stage:<22}{stats['logged']['p50']:>10.1f}ms{stats['replayed']['p50']:>10.1f}ms{change:>9}"
+              f"{stats['logged']['p95']:>10.1f}ms{stats['replayed']['p95']:>10.1f}ms")
+
+    retrieval = report["retrieval"]
+    print(f"\n🔍 Retrieval ({retrieval['compared']} queries)")
+    for name in COLLECTIONS:
+        if name in retrieval:
+            stats = retrieval[name]
+            delta = f"{stats['mean_score_delta']:.4f}" if stats["mean_score_delta"] is not None else "n/a"
+            print(f"   {name:<11} overlap={stats['mean_overlap']:.3f}  same top={stats['same_top']:.1%}  "
+                  f"same ranking={stats['same_ranking']:.1%}  mean |Δscore|={delta}")
+    for row in retrieval["most_changed"]:
+        print(f"   ↳ ipc={row['ipc']:.2f} precedents={row['precedents']:.2f}  {row['query']}")
+
+    if report["status_changes"]:
+        print("\n⚠️ Status changes: " + ", ".join(f"{key}: {count}" for key, count in report["status_changes"].items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+", help="audit log files or globs (rotated files included)")
+    parser.add_argument("--url", default="http://127.0.0.1:5001", help="deployment to replay against")
+    parser.add_argument("--endpoint", default="/query")
+    parser.add_argument("--limit", type=int, help="replay only the first N records")
+    parser.add_argument("--all-statuses", action="store_true", help="also replay queries that failed when logged")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, help="send at this many requests per second instead (open loop)")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--min-overlap", type=float, help="exit 1 if mean IPC or precedent overlap is below this")
+    args = parser.parse_args()
+
+    records = load_records(args.logs, only_ok=not args.all_statuses, limit=args.limit)
+    if not records:
+        sys.exit("No audit records to replay.")
+    print(f"📜 Replaying {len(records)} logged queries against {args.url}{args.endpoint}")
+
+    client = Client(args.url, args.endpoint, [record["query"] for record in records], unique=False)
+    if args.rate:
+        samples, wall = run_open_loop(client, args.rate, len(records), None, args.max_in_flight)
+    else:
+        samples, wall = run_closed_loop(client, args.concurrency, len(records), None)
+    samples.sort(key=lambda sample: sample["index"])
+
+    latency = latency_report(records, samples)
+    report = {
+        "target": args.url,
+        "records": len(records),
+        "wall_s": round(wall, 2),
+        "errors": sum(sample["status"] != 200 for sample in samples),
+        "latency_pairs": latency.get("total_ms", {}).get("logged", {}).get("count", 0),
+        "latency": latency,
+        "retrieval": retrieval_report(records, samples),
+        "status_changes": status_changes(records, samples),
+    }
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Report written to {args.json}")
+
+    if args.min_overlap is not None:
+        low = [name for name in COLLECTIONS
+               if name in report["retrieval"] and report["retrieval"][name]["mean_overlap"] < args.min_overlap]
+        if low:
+            print(f"\n❌ Mean overlap below {args.min_overlap} for: {', '.join(low)}")
+            sys.exit(1)
+        print(f"\n✅ Retrieval overlap at or above {args.min_overlap}.")
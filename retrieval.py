@@ -0,0 +1,514 @@
+"""
+retrieval.py
+-------------
+Vector (and hybrid vector + BM25) retrieval for the verdict pipeline.
+
+Searches go through a backend:
+  * WeaviateBackend — `near_vector` / `hybrid` queries against the Weaviate collections.
+  * NumpyBackend    — brute-force top-k over float32 snapshots memory-mapped
+                      from disk (see snapshot.py / export_vectors.py), with an
+                      in-memory BM25 index (keyword_index.py) for hybrid mode. No
+                      network hop, which suits single-node deployments and tests.
+
+Both return objects exposing `.uuid`, `.properties` and `.metadata.distance`
+(cosine distance), so the rest of the pipeline doesn't care which one is used.
+Both can also `fetch` objects by ID (distance None), for exact section lookups
+(see section_index.py), and restrict a search to objects whose list property
+shares a value with a given list (`where=(property, values)`), which narrows
+precedent search to the cases filed under the relevant IPC sections.
+
+Passing a HybridQuery to the search helpers switches them to hybrid mode:
+exact legal terms ("dowry death", "304B", a citation) are matched by BM25 and
+fused with the vector ranking, weighted by `alpha` (1 = vector only).
+
+The IPC (`NLP`) and `Precedents` searches are independent, so they run side by
+side on a small bounded thread pool instead of back to back. Every leg has its
+own timeout; a leg that fails or times out is reported but does not take the
+other one down with it.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid as uuid_lib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from types import SimpleNamespace
+
+import numpy as np
+
+from keyword_index import KeywordIndex, fuse, top_rows
+from quantize import approx_scores, row_norms, unpack_signs
+from snapshot import open_snapshot
+
+log = logging.getLogger(__name__)
+
+IPC_COLLECTION = "NLP"
+PRECEDENT_COLLECTION = "Precedents"
+DATA_VERSIONS_COLLECTION = "DataVersions"  # schema.bump_data_version
+IPC_PROPERTIES = ["text", "source", "page_start", "page_end"]
+PRECEDENT_PROPERTIES = ["case_summary", "case_digest", "case_name", "citation"]
+PRECEDENT_SECTION_PROPERTY = "ipc_sections"  # Filter only; not needed in the prompt
+
+# BM25 properties per collection: name -> (tokenization, boost). `citation` is
+# FIELD-tokenized in the schema, so it only matches a whole citation string.
+KEYWORD_FIELDS = {
+    IPC_COLLECTION: {"text": ("word", 1.0)},
+    PRECEDENT_COLLECTION: {"case_summary": ("word", 1.0), "case_name": ("word", 1.0), "citation": ("field", 2.0)},
+}
+HYBRID_CANDIDATES = 100  # Per-side candidates the NumPy backend fuses
+# Compact (int8 / ubinary) snapshots: candidates per requested hit that get rescored
+RESCORE_MULTIPLIER = int(os.getenv("RESCORE_MULTIPLIER", "8"))
+
+# Hybrid search request: query text, vector weight (0..1) and fusion type
+HybridQuery = namedtuple("HybridQuery", ["text", "alpha", "fusion"])
+
+
+def query_properties(collection_name):
+    """Weaviate `query_properties` with boosts, e.g. ['case_summary', 'citation^2']."""
+    return [name if boost == 1.0 else f"{name}^{boost:g}"
+            for name, (_, boost) in KEYWORD_FIELDS[collection_name].items()]
+
+
+def _where_filter(where):
+    from weaviate.classes.query import Filter
+    return Filter.by_property(where[0]).contains_any(list(where[1]))
+
+
+# ----------------------- #
+#   BACKENDS              #
+# ----------------------- #
+
+class WeaviateBackend:
+    """Searches the live Weaviate collections."""
+
+    name = "weaviate"
+
+    def __init__(self, client):
+        self.client = client
+        self.collections = {}
+
+    def collection(self, collection_name):
+        if collection_name not in self.collections:
+            self.collections[collection_name] = self.client.collections.get(collection_name)
+        return self.collections[collection_name]
+
+    def search(self, collection_name, vector, limit, return_properties, where=None):
+        response = self.collection(collection_name).query.near_vector(
+            near_vector=vector,
+            limit=limit,
+            filters=_where_filter(where) if where is not None else None,
+            return_properties=return_properties,
+            return_metadata=["distance"],
+        )
+        return response.objects or []
+
+    def hybrid(self, collection_name, query_text, vector, limit, return_properties,
+               alpha=0.5, fusion="relative_score", where=None):
+        from weaviate.classes.query import HybridFusion
+        response = self.collection(collection_name).query.hybrid(
+            query=query_text,
+            vector=vector,
+            alpha=alpha,
+            fusion_type=HybridFusion.RANKED if fusion == "ranked" else HybridFusion.RELATIVE_SCORE,
+            query_properties=query_properties(collection_name),
+            limit=limit,
+            filters=_where_filter(where) if where is not None else None,
+            return_properties=return_properties,
+            return_metadata=["score"],
+        )
+        return response.objects or []
+
+    def fetch(self, collection_name, ids, return_properties):
+        """Objects by UUID, in the order of `ids`; unknown IDs are skipped."""
+        if not ids:
+            return []
+        response = self.collection(collection_name).query.fetch_objects_by_ids(
+            ids, return_properties=return_properties
+        )
+        by_id = {str(obj.uuid): obj for obj in response.objects or []}
+        return [by_id[str(object_id)] for object_id in ids if str(object_id) in by_id]
+
+    def counts(self):
+        """{collection: object count}."""
+        return {
+            name: self.collection(name).aggregate.over_all(total_count=True).total_count
+            for name in (IPC_COLLECTION, PRECEDENT_COLLECTION)
+        }
+
+    def fingerprint(self):
+        """Object counts plus the data versions the writers bump; a change means cached verdicts are stale.
+
+        Counts alone miss in-place updates (upserts, backfilled properties), so
+        every ingestion / backfill script records a new version per collection
+        (schema.bump_data_version).
+        """
+        versions = ()
+        if self.client.collections.exists(DATA_VERSIONS_COLLECTION):
+            response = self.collection(DATA_VERSIONS_COLLECTION).query.fetch_objects(
+                limit=100, return_properties=["collection", "version"]
+            )
+            versions = tuple(sorted(
+                (obj.properties.get("collection"), obj.properties.get("version")) for obj in response.objects or []
+            ))
+        return tuple(self.counts().values()), versions
+
+
+class NumpyBackend:
+    """In-process exact search over memory-mapped float32 vectors.
+
+    Expects one snapshot per collection at `<data_dir>/<Collection>/`, as
+    written by export_vectors.py. Compact snapshots (int8 / ubinary, see
+    quantize.py) are searched approximately; the best `limit *
+    rescore_multiplier` candidates are then rescored against the snapshot's
+    float vectors when it kept them (only those rows are read), or against the
+    +1/-1 bit vectors for ubinary snapshots without them.
+    """
+
+    name = "numpy"
+
+    def __init__(self, data_dir, collection_names=(IPC_COLLECTION, PRECEDENT_COLLECTION),
+                 rescore_multiplier=RESCORE_MULTIPLIER):
+        self.data_dir = data_dir
+        self.rescore_multiplier = max(1, rescore_multiplier)
+        self.matrices = {}
+        self.float_matrices = {}  # collection -> float32 rows for rescoring (compact snapshots only)
+        self.layouts = {}  # collection -> (dtype, dim)
+        self.records = {}
+        self.inverse_norms = {}
+        self.rows_by_id = {}  # collection -> {uuid: row}, built on first fetch
+        self.rows_by_value = {}  # (collection, property) -> {value: row array}, built on first filter
+        self.keyword_indexes = {}  # collection -> KeywordIndex, built on first hybrid search
+        self._keyword_lock = threading.Lock()
+        for collection_name in collection_names:
+            snapshot = open_snapshot(os.path.join(data_dir, collection_name))
+            self.matrices[collection_name] = snapshot.vectors
+            self.layouts[collection_name] = (snapshot.dtype, snapshot.dim)
+            self.records[collection_name] = snapshot.records()
+            if snapshot.dtype != "float32":
+                if snapshot.float_vectors is not None:
+                    self.float_matrices[collection_name] = snapshot.float_vectors
+                if snapshot.dtype == "int8":
+                    # Quantized rows aren't unit length even in a normalized snapshot
+                    norms = row_norms(snapshot.vectors, snapshot.dtype, snapshot.dim)
+                    norms[norms == 0] = 1.0
+                    self.inverse_norms[collection_name] = (1.0 / norms).astype(np.float32)
+            elif not snapshot.normalized:
+                # Scale scores instead of rewriting the read-only memmap.
+                norms = np.linalg.norm(snapshot.vectors, axis=1)
+                norms[norms == 0] = 1.0
+                self.inverse_norms[collection_name] = (1.0 / norms).astype(np.float32)
+
+    def filter_rows(self, collection_name, property_name, values):
+        """Sorted rows whose list property contains any of `values`."""
+        key = (collection_name, property_name)
+        if key not in self.rows_by_value:
+            index = {}
+            for row, record in enumerate(self.records[collection_name]):
+                for value in record["properties"].get(property_name) or []:
+                    index.setdefault(value, []).append(row)
+            self.rows_by_value[key] = {value: np.asarray(rows, dtype=np.int64) for value, rows in index.items()}
+        parts = [self.rows_by_value[key][value] for value in values if value in self.rows_by_value[key]]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    @staticmethod
+    def _unit(vector):
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm else query
+
+    def vector_scores(self, collection_name, vector, rows=None):
+        """Cosine similarity of `vector` to every row (or just `rows`, in that order).
+
+        Approximate for compact snapshots; see rescore().
+        """
+        matrix = self.matrices[collection_name]
+        if rows is not None:
+            # Only the selected rows are scored
+            matrix = matrix[rows]
+        query = self._unit(vector)
+        inverse_norms = self.inverse_norms.get(collection_name)
+        if inverse_norms is not None and rows is not None:
+            inverse_norms = inverse_norms[rows]
+        dtype, dim = self.layouts[collection_name]
+        if dtype != "float32":
+            return approx_scores(matrix, dtype, query, dim, inverse_norms)
+        scores = matrix @ query
+        if inverse_norms is not None:
+            scores *= inverse_norms
+        return scores
+
+    def rescore(self, collection_name, vector, rows):
+        """Exact (or closer) similarities for `rows` of a compact snapshot, in that order.
+
+        None for float32 snapshots (already exact) and int8 snapshots without
+        float vectors (nothing better to compare against).
+        """
+        dtype, dim = self.layouts[collection_name]
+        if dtype == "float32" or not len(rows):
+            return None
+        query = self._unit(vector)
+        if collection_name in self.float_matrices:
+            candidates = np.asarray(self.float_matrices[collection_name][rows])
+            norms = np.linalg.norm(candidates, axis=1)
+            norms[norms == 0] = 1.0
+            return (candidates @ query) / norms
+        if dtype == "ubinary":
+            # Float query against the +1/-1 vectors: finer than bit-vs-bit Hamming
+            return (unpack_signs(self.matrices[collection_name][rows], dim) @ query) / np.sqrt(dim)
+        return None
+
+    def hit(self, collection_name, row, return_properties, distance):
+        record = self.records[collection_name][row]
+        properties = {key: record["properties"].get(key) for key in return_properties}
+        return SearchHit(record["uuid"], properties, distance)
+
+    def search(self, collection_name, vector, limit, return_properties, where=None):
+        rows = self.filter_rows(collection_name, *where) if where is not None else None
+        count = self.matrices[collection_name].shape[0] if rows is None else len(rows)
+        if not count or limit <= 0:
+            return []
+
+        scores = self.vector_scores(collection_name, vector, rows)
+        compact = self.layouts[collection_name][0] != "float32"
+        k = min(limit * self.rescore_multiplier if compact else limit, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        if compact:
+            exact = self.rescore(collection_name, vector, top if rows is None else rows[top])
+            if exact is not None:
+                scores[top] = exact
+        top = top[np.argsort(-scores[top])][:limit]
+
+        return [
+            self.hit(collection_name, position if rows is None else rows[position], return_properties,
+                     1.0 - float(scores[position]))
+            for position in top
+        ]
+
+    def keyword_index(self, collection_name):
+        if collection_name not in self.keyword_indexes:
+            with self._keyword_lock:
+                if collection_name not in self.keyword_indexes:
+                    documents = [record["properties"] for record in self.records[collection_name]]
+                    self.keyword_indexes[collection_name] = KeywordIndex(documents, KEYWORD_FIELDS[collection_name])
+        return self.keyword_indexes[collection_name]
+
+    def hybrid(self, collection_name, query_text, vector, limit, return_properties,
+               alpha=0.5, fusion="relative_score", where=None, candidates=HYBRID_CANDIDATES):
+        size = self.matrices[collection_name].shape[0]
+        rows = self.filter_rows(collection_name, *where) if where is not None else np.arange(size)
+        if not len(rows) or limit <= 0:
+            return []
+
+        vector_scores = np.full(size, -np.inf, dtype=np.float32)
+        vector_scores[rows] = self.vector_scores(collection_name, vector, None if where is None else rows)
+        keyword_scores = self.keyword_index(collection_name).scores(query_text)
+        keyword_rows = rows[keyword_scores[rows] > 0]
+
+        vector_rows = top_rows(vector_scores, rows, candidates if alpha > 0 else 0)
+        exact = self.rescore(collection_name, vector, vector_rows)
+        if exact is not None:
+            vector_scores[vector_rows] = exact
+            vector_rows = vector_rows[np.argsort(-exact)]
+        fused = fuse(
+            vector_rows, vector_scores,
+            top_rows(keyword_scores, keyword_rows, candidates if alpha < 1 else 0), keyword_scores,
+            alpha, fusion,
+        )
+        best = sorted(fused, key=lambda row: -fused[row])[:limit]
+        return [self.hit(collection_name, row, return_properties, 1.0 - float(vector_scores[row])) for row in best]
+
+    def fetch(self, collection_name, ids, return_properties):
+        records = self.records[collection_name]
+        if collection_name not in self.rows_by_id:
+            self.rows_by_id[collection_name] = {str(record["uuid"]): row for row, record in enumerate(records)}
+        rows = self.rows_by_id[collection_name]
+        hits = []
+        for object_id in ids:
+            row = rows.get(str(object_id))
+            if row is not None:
+                properties = {key: records[row]["properties"].get(key) for key in return_properties}
+                hits.append(SearchHit(records[row]["uuid"], properties, None))
+        return hits
+
+    def counts(self):
+        return {name: matrix.shape[0] for name, matrix in self.matrices.items()}
+
+    def fingerprint(self):
+        # Snapshots are loaded once per process; a new export takes effect on
+        # restart, which starts with an empty verdict cache anyway.
+        return tuple(self.counts().values())
+
+
+class SearchHit:
+    """Mirrors the parts of a Weaviate result object the pipeline reads."""
+
+    __slots__ = ("uuid", "properties", "metadata")
+
+    def __init__(self, object_id, properties, distance):
+        self.uuid = uuid_lib.UUID(str(object_id))
+        self.properties = properties
+        self.metadata = SimpleNamespace(distance=distance)
+
+
+def create_backend(kind, client=None, data_dir=None):
+    """Builds the retrieval backend named by RETRIEVAL_BACKEND."""
+    if kind == "weaviate":
+        return WeaviateBackend(client)
+    if kind == "numpy":
+        return NumpyBackend(data_dir)
+    raise ValueError(f"❌ Unknown retrieval backend '{kind}' (expected 'weaviate' or 'numpy').")
+
+
+def search(backend, collection_name, vector, limit, return_properties, where=None, hybrid=None):
+    """Vector search, or hybrid search when a HybridQuery is given."""
+    if hybrid is None:
+        return backend.search(collection_name, vector, limit, return_properties, where=where)
+    return backend.hybrid(collection_name, hybrid.text, vector, limit, return_properties,
+                          alpha=hybrid.alpha, fusion=hybrid.fusion, where=where)
+
+
+def search_ipc(backend, vector, limit=3, hybrid=None):
+    """Top IPC chunks for a query vector."""
+    return search(backend, IPC_COLLECTION, vector, limit, IPC_PROPERTIES, hybrid=hybrid)
+
+
+def search_ipc_with_sections(backend, section_ids, vector, limit=3, hybrid=None):
+    """IPC chunks for explicitly cited sections first, then vector hits for the remaining slots.
+
+    The vector search is skipped entirely when the cited sections fill `limit`.
+    """
+    exact = backend.fetch(IPC_COLLECTION, section_ids[:limit], IPC_PROPERTIES) if section_ids else []
+    if len(exact) >= limit:
+        return exact
+    seen = {str(obj.uuid) for obj in exact}
+    hits = search_ipc(backend, vector, limit=limit + len(exact), hybrid=hybrid)
+    return exact + [obj for obj in hits if str(obj.uuid) not in seen][:limit - len(exact)]
+
+
+def search_precedents(backend, vector, limit=2, sections=None, hybrid=None):
+    """Top precedent cases for a query vector.
+
+    With `sections`, only cases filed under one of those IPC sections are
+    searched. If that finds fewer than `limit` (or the filter fails, e.g. on a
+    collection that was never backfilled), an unfiltered search fills the rest.
+    """
+    if not sections:
+        return search(backend, PRECEDENT_COLLECTION, vector, limit, PRECEDENT_PROPERTIES, hybrid=hybrid)
+    try:
+        hits = search(backend, PRECEDENT_COLLECTION, vector, limit, PRECEDENT_PROPERTIES,
+                      where=(PRECEDENT_SECTION_PROPERTY, sections), hybrid=hybrid)
+    except Exception as e:
+        log.warning("⚠️ Section-filtered precedent search failed, searching all precedents: %s", e)
+        hits = []
+    if len(hits) >= limit:
+        return hits
+    seen = {str(obj.uuid) for obj in hits}
+    rest = search(backend, PRECEDENT_COLLECTION, vector, limit + len(hits), PRECEDENT_PROPERTIES, hybrid=hybrid)
+    return hits + [obj for obj in rest if str(obj.uuid) not in seen][:limit - len(hits)]
+
+
+def precedent_candidates(backend, vector, limit, hybrid=None):
+    """Unfiltered top-`limit` precedents that also carry their IPC sections, for prefer_sections."""
+    try:
+        return search(backend, PRECEDENT_COLLECTION, vector, limit,
+                      PRECEDENT_PROPERTIES + [PRECEDENT_SECTION_PROPERTY], hybrid=hybrid)
+    except Exception as e:
+        # e.g. a collection that was never backfilled has no such property
+        log.warning("⚠️ Could not fetch precedent sections, ranking by similarity only: %s", e)
+        return search(backend, PRECEDENT_COLLECTION, vector, limit, PRECEDENT_PROPERTIES, hybrid=hybrid)
+
+
+def prefer_sections(hits, sections, limit):
+    """The best `limit` hits, cases filed under one of `sections` first; both groups keep their ranking."""
+    wanted = set(sections)
+    matching = [obj for obj in hits if wanted & set(obj.properties.get(PRECEDENT_SECTION_PROPERTY) or [])]
+    matched = {str(obj.uuid) for obj in matching}
+    return (matching + [obj for obj in hits if str(obj.uuid) not in matched])[:limit]
+
+
+# ----------------------- #
+#   PARALLEL LEGS         #
+# ----------------------- #
+
+
+class LegResult:
+    """Outcome of one retrieval leg: objects on success, error otherwise."""
+
+    def __init__(self, name, objects=None, error=None, elapsed_ms=None):
+        self.name = name
+        self.objects = objects or []
+        self.error = error
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    objects = fn()
+    return objects, (time.perf_counter() - start) * 1000
+
+
+class ParallelRetriever:
+    """Runs named retrieval legs concurrently on a bounded thread pool.
+
+    A leg that times out is abandoned, but its call keeps its worker thread
+    until the client gives up (keep the client's query timeout at or below the
+    leg timeouts). While abandoned calls leave too few workers for a request's
+    legs, new legs fail at once instead of queueing behind them.
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval")
+        self.abandoned = 0  # Timed-out legs still holding a worker
+        self._lock = threading.Lock()
+
+    def _release(self, future):
+        with self._lock:
+            self.abandoned -= 1
+
+    def run(self, legs, timeouts):
+        """Runs `legs` ({name: zero-arg callable}) concurrently.
+
+        `timeouts` maps leg name to seconds, measured from submission. Returns
+        {name: LegResult}; never raises for a failing leg.
+        """
+        with self._lock:
+            abandoned = self.abandoned
+        if self.max_workers - abandoned < len(legs):
+            error = f"retrieval pool exhausted: {abandoned} of {self.max_workers} workers stuck on timed-out searches"
+            return {name: LegResult(name, error=error, elapsed_ms=0.0) for name in legs}
+
+        submitted_at = time.perf_counter()
+        futures = {name: self.executor.submit(_timed, fn) for name, fn in legs.items()}
+
+        results = {}
+        for name, future in futures.items():
+            deadline = submitted_at + timeouts.get(name, 10.0)
+            try:
+                objects, elapsed_ms = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+                results[name] = LegResult(name, objects=objects, elapsed_ms=elapsed_ms)
+            except FutureTimeout:
+                # The call keeps running in its worker; we just stop waiting for it.
+                if not future.cancel():
+                    with self._lock:
+                        self.abandoned += 1
+                    future.add_done_callback(self._release)
+                results[name] = LegResult(
+                    name,
+                    error=f"timed out after {timeouts.get(name, 10.0):.1f}s",
+                    elapsed_ms=(time.perf_counter() - submitted_at) * 1000,
+                )
+            except Exception as e:
+                results[name] = LegResult(
+                    name, error=str(e), elapsed_ms=(time.perf_counter() - submitted_at) * 1000
+                )
+        return results
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
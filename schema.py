@@ -0,0 +1,178 @@
+"""
+schema.py
+----------
+Collection definitions shared by the init, reset and migration scripts, so the
+`NLP` and `Precedents` schemas are declared in exactly one place.
+
+Vectors come from Cohere and are attached as each object's own vector
+(`vector=` on insert); they are never stored as a property.
+
+New collections get the HNSW / compression settings of the index profile
+named by VECTOR_INDEX_PROFILE (see INDEX_PROFILES; "default" keeps Weaviate's
+own). `bench_index_profiles.py` compares the profiles on a synthetic corpus.
+
+Every script that writes to a collection calls bump_data_version() when it is
+done, so the app's verdict cache (retrieval.py fingerprint()) notices in-place
+updates that leave the object counts unchanged.
+"""
+
+import os
+import uuid
+
+from weaviate.classes.config import Configure, Property, DataType, Reconfigure, Tokenization
+from weaviate.util import generate_uuid5
+
+NLP_COLLECTION = "NLP"
+PRECEDENTS_COLLECTION = "Precedents"
+# One object per data collection holding a random token that changes on every write
+DATA_VERSIONS_COLLECTION = "DataVersions"
+
+NLP_PROPERTIES = [
+    Property(name="text", data_type=DataType.TEXT),
+    Property(name="source", data_type=DataType.TEXT),
+    # 1-based PDF pages the chunk was cut from (unset for pre-chunked imports)
+    Property(name="page_start", data_type=DataType.INT),
+    Property(name="page_end", data_type=DataType.INT),
+]
+
+PRECEDENT_PROPERTIES = [
+    Property(name="case_summary", data_type=DataType.TEXT),
+    # case_summary minus header boilerplate (precedent_records.case_digest); what the chat prompt sees
+    Property(name="case_digest", data_type=DataType.TEXT),
+    Property(name="case_name", data_type=DataType.TEXT),
+    # Tokenization.FIELD for keyword-like behavior
+    Property(name="citation", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+    # sha256 of name/citation/summary; lets the loader skip unchanged cases
+    Property(name="content_hash", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+    # IPC sections the case was scraped under (from ipc_<section>_cases.csv); filters precedent search
+    Property(name="ipc_sections", data_type=DataType.TEXT_ARRAY, tokenization=Tokenization.FIELD),
+]
+
+
+# Vector index profiles: HNSW parameters plus optional compression, as
+# (quantizer, options). ef is the query-time candidate list (higher = better
+# recall, slower), ef_construction / max_connections shape the graph at import
+# (fixed once the collection exists). Compressed profiles keep a quantized copy
+# of each vector in memory and rescore the best `rescore_limit` candidates
+# against the full vectors on disk:
+#   pq  product quantization, 1 byte per segment (Weaviate picks the segments)
+#   sq  8-bit scalar quantization, 4x smaller
+#   bq  1 bit per dimension, 32x smaller; needs rescoring to keep recall
+# pq and sq learn from the first `training_limit` vectors; see enable_compression.
+INDEX_PROFILES = {
+    "default": {},
+    "fast": {"ef": 64, "ef_construction": 128, "max_connections": 16},
+    "balanced": {"ef": 128, "ef_construction": 256, "max_connections": 32},
+    "accurate": {"ef": 384, "ef_construction": 512, "max_connections": 64},
+    "pq": {"ef": 128, "ef_construction": 256, "max_connections": 32,
+           "quantizer": ("pq", {"training_limit": 10000})},
+    "sq": {"ef": 128, "ef_construction": 256, "max_connections": 32,
+           "quantizer": ("sq", {"training_limit": 10000, "rescore_limit": 200})},
+    "bq": {"ef": 128, "ef_construction": 256, "max_connections": 32,
+           "quantizer": ("bq", {"rescore_limit": 200})},
+}
+VECTOR_INDEX_PROFILE = os.getenv("VECTOR_INDEX_PROFILE", "default")
+
+
+def index_profile(name):
+    if name not in INDEX_PROFILES:
+        raise ValueError(f"Unknown index profile '{name}' (expected one of {', '.join(INDEX_PROFILES)}).")
+    return INDEX_PROFILES[name]
+
+
+def vector_index_config(name=None, **quantizer_options):
+    """HNSW config for a profile (None for "default"). `quantizer_options` override the profile's."""
+    profile = index_profile(name or VECTOR_INDEX_PROFILE)
+    if not profile:
+        return None
+    quantizer = None
+    if profile.get("quantizer"):
+        kind, options = profile["quantizer"]
+        quantizer = getattr(Configure.VectorIndex.Quantizer, kind)(**{**options, **quantizer_options})
+    return Configure.VectorIndex.hnsw(
+        ef=profile.get("ef"),
+        ef_construction=profile.get("ef_construction"),
+        max_connections=profile.get("max_connections"),
+        quantizer=quantizer,
+    )
+
+
+def enable_compression(collection, name=None, **quantizer_options):
+    """Turns on the profile's quantizer for an existing collection. Returns False if it has none.
+
+    bq applies from creation, but pq and sq only start compressing on their
+    own when Weaviate runs with ASYNC_INDEXING=true; otherwise call this once
+    the collection holds at least `training_limit` objects.
+    """
+    profile = index_profile(name or VECTOR_INDEX_PROFILE)
+    if not profile.get("quantizer"):
+        return False
+    kind, options = profile["quantizer"]
+    quantizer = getattr(Reconfigure.VectorIndex.Quantizer, kind)(**{**options, **quantizer_options})
+    collection.config.update(vector_index_config=Reconfigure.VectorIndex.hnsw(quantizer=quantizer))
+    return True
+
+
+def create_nlp_collection(client, name=NLP_COLLECTION, profile=None):
+    """Creates the IPC chunk collection."""
+    collection = client.collections.create(
+        name=name,
+        description="Stores text and its embeddings for legal or NLP-based documents",
+        properties=NLP_PROPERTIES,
+        vectorizer_config=None,  # Using external embeddings (Cohere)
+        vector_index_config=vector_index_config(profile),
+    )
+    bump_data_version(client, name)
+    return collection
+
+
+def create_precedents_collection(client, name=PRECEDENTS_COLLECTION, profile=None):
+    """Creates the precedent case collection."""
+    collection = client.collections.create(
+        name=name,
+        description="Stores summaries and judgments from past legal cases",
+        properties=PRECEDENT_PROPERTIES,
+        vectorizer_config=None,  # Using external embeddings (Cohere)
+        vector_index_config=vector_index_config(profile),
+    )
+    bump_data_version(client, name)
+    return collection
+
+
+def ensure_properties(collection, properties):
+    """Adds any of `properties` missing from an existing collection.
+
+    Returns the names that were added.
+    """
+    existing = {prop.name for prop in collection.config.get().properties}
+    added = []
+    for prop in properties:
+        if prop.name not in existing:
+            collection.config.add_property(prop)
+            added.append(prop.name)
+    return added
+
+
+def bump_data_version(client, collection_name):
+    """Records that `collection_name` was written to, creating DataVersions if needed.
+
+    Returns the new version token.
+    """
+    if not client.collections.exists(DATA_VERSIONS_COLLECTION):
+        client.collections.create(
+            name=DATA_VERSIONS_COLLECTION,
+            description="Changes whenever a data collection is written to; invalidates cached verdicts",
+            properties=[
+                Property(name="collection", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+                Property(name="version", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+            ],
+            vectorizer_config=None,
+        )
+    versions = client.collections.get(DATA_VERSIONS_COLLECTION)
+    object_id = generate_uuid5(f"data-version/{collection_name}")
+    properties = {"collection": collection_name, "version": uuid.uuid4().hex}
+    if versions.data.exists(object_id):
+        versions.data.replace(uuid=object_id, properties=properties)
+    else:
+        versions.data.insert(properties=properties, uuid=object_id)
+    return properties["version"]
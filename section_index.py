@@ -0,0 +1,199 @@
+"""
+section_index.py
+-----------------
+Exact IPC section lookup: maps section numbers ("302", "304B") to the IDs of
+the `NLP` chunks that hold them, so a query that names a section outright can
+fetch that chunk directly instead of hoping vector search returns it.
+
+The index is a small JSON file (SECTION_INDEX_PATH) built at ingest by
+vector_embedding.py, one entry per source document:
+
+    {"version": 1, "sources": {"nlp_pdf.pdf": {"302": ["<uuid>", ...], ...}}}
+
+A chunk is indexed under a section when it contains that section's heading:
+"302. Punishment for murder.—" in the bare act, or a table row that starts
+with the section number ("304B Dowry death") in the punishments summary.
+Table-of-contents lines ("302. Punishment for murder.") and passing mentions
+("punishable under section 302") are not headings, so they don't count. Per
+section and source, chunks with a bare act heading come first, then by how
+close to their start the heading sits, so the first ID is the chunk with the
+most of the section.
+
+To (re)build the index from an existing collection instead of re-ingesting:
+
+    python section_index.py                          # from Weaviate
+    RETRIEVAL_BACKEND=numpy python section_index.py  # from vector_data/ snapshots
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+
+SECTION_INDEX_PATH = os.getenv("SECTION_INDEX_PATH", "section_index.json")
+
+_SECTION = r"\d{1,3}[A-Z]{0,2}"
+
+# Chunk text has sentences re-joined with spaces, so neither pattern relies on line breaks.
+# Bare act heading: optional amendment marker "3[", number, title, then ".—" (no other "NNN. " in between)
+_HEADING = re.compile(rf"(?:^|(?<=[\s\]]))(?:\d+\[)?({_SECTION})\.\s+[A-Z](?:(?!\s{_SECTION}\.\s)[^—]){{0,300}}?\.\s*—")
+# Summary table row: section number(s) ("339/341") followed straight by the offence name
+_TABLE_ROW = re.compile(rf"(?:^|(?<=\s))(?<!ection )(?<!ections )({_SECTION}(?:/{_SECTION})*)\s+[A-Z][a-z]")
+
+# Explicit references in a query: "Section 304B", "sections 302 and 34", "u/s 420", "IPC 420", "302 IPC"
+_SECTION_LIST = rf"{_SECTION}(?:\s*(?:,|/|&|\band\b|\bor\b)\s*{_SECTION})*"
+_QUERY_PREFIXED = re.compile(rf"(?:\bsections?|\bsecs?\.?|\bu/s\.?|\bipc)\s*({_SECTION_LIST})\b", re.I)
+_QUERY_SUFFIXED = re.compile(rf"\b({_SECTION_LIST})\s*(?:of\s+(?:the\s+)?)?(?:ipc\b|indian\s+penal\s+code)", re.I)
+_QUERY_NUMBER = re.compile(_SECTION, re.I)
+
+
+def normalize_section(section):
+    """'304b' -> '304B'."""
+    return section.strip().upper()
+
+
+def find_references(query):
+    """Section numbers a query names explicitly, in order of first mention."""
+    found = []
+    for pattern in (_QUERY_PREFIXED, _QUERY_SUFFIXED):
+        for match in pattern.finditer(query):
+            for number in _QUERY_NUMBER.findall(match.group(1)):
+                found.append((match.start(1), normalize_section(number)))
+    seen = set()
+    return [section for _, section in sorted(found) if not (section in seen or seen.add(section))]
+
+
+def extract_sections(text):
+    """{section: (kind, offset)} for every section heading in a chunk.
+
+    kind 0 is a bare act heading, 1 a table row; lower sorts first, so a real
+    heading always outranks a number that merely looks like a table row.
+    """
+    sections = {}
+    for match in _HEADING.finditer(text):
+        sections.setdefault(normalize_section(match.group(1)), (0, match.start()))
+    for match in _TABLE_ROW.finditer(text):
+        for number in match.group(1).split("/"):
+            sections.setdefault(normalize_section(number), (1, match.start()))
+    return sections
+
+
+class SectionIndexBuilder:
+    """Collects (chunk id, text) pairs for one source and produces its index entry."""
+
+    def __init__(self):
+        self._hits = {}  # section -> [(kind, heading offset, order, chunk id)]
+        self._order = 0
+
+    def add(self, chunk_id, text):
+        for section, (kind, offset) in extract_sections(text).items():
+            self._hits.setdefault(section, []).append((kind, offset, self._order, str(chunk_id)))
+        self._order += 1
+
+    def entries(self):
+        return {section: [chunk_id for *_, chunk_id in sorted(hits)] for section, hits in self._hits.items()}
+
+
+class SectionIndex:
+    """The on-disk section -> chunk IDs map, reloaded when the file changes.
+
+    gthread workers refresh it from several request threads at once, so reloads
+    and writes hold a lock and always swap in a new `sources` dict; `lookup`
+    never sees one half-built.
+    """
+
+    def __init__(self, path=SECTION_INDEX_PATH):
+        self.path = path
+        self.sources = {}
+        self._mtime = None
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        """Reloads the file if it changed (or appeared) since the last load. Cheap to call per request."""
+        if self._stat() == self._mtime:
+            return self
+        with self._lock:
+            mtime = self._stat()  # another thread may have reloaded while we waited
+            if mtime is None:
+                self.sources, self._mtime = {}, None
+            elif mtime != self._mtime:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.sources = json.load(f).get("sources", {})
+                self._mtime = mtime
+        return self
+
+    def lookup(self, sections, limit):
+        """Up to `limit` chunk IDs for `sections`: the best chunk per source, section by section."""
+        sources = self.sources
+        ids = []
+        for section in sections:
+            for entries in sources.values():
+                for chunk_id in entries.get(section, [])[:1]:
+                    if chunk_id not in ids:
+                        ids.append(chunk_id)
+        return ids[:limit]
+
+    def replace_source(self, source, entries):
+        """Replaces one source's entries and writes the file atomically."""
+        with self._lock:
+            self.refresh()
+            sources = {**self.sources, source: entries}
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # A unique temp file in the same directory, so concurrent writers never share one
+            fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + ".", suffix=".tmp",
+                                            dir=directory or ".")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"version": 1, "sources": sources}, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            self.sources, self._mtime = sources, self._stat()
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+def iter_collection_chunks():
+    """(uuid, text, source) for every IPC chunk in the configured retrieval backend."""
+    from dotenv import load_dotenv
+    from retrieval import IPC_COLLECTION
+    load_dotenv()
+
+    if os.getenv("RETRIEVAL_BACKEND", "weaviate").lower() == "numpy":
+        from snapshot import open_snapshot
+        snapshot = open_snapshot(os.path.join(os.getenv("VECTOR_DATA_DIR", "vector_data"), IPC_COLLECTION))
+        for record in snapshot.iter_records():
+            yield record["uuid"], record["properties"].get("text") or "", record["properties"].get("source") or ""
+        return
+
+    import weaviate
+    from weaviate.connect import ConnectionParams
+    client = weaviate.WeaviateClient(connection_params=ConnectionParams.from_url(
+        os.getenv("WEAVIATE_HTTP_URL", "http://localhost:8081"), int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))))
+    client.connect()
+    try:
+        for obj in client.collections.get(IPC_COLLECTION).iterator(return_properties=["text", "source"]):
+            yield obj.uuid, obj.properties.get("text") or "", obj.properties.get("source") or ""
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    builders = {}
+    for chunk_id, text, source in iter_collection_chunks():
+        builders.setdefault(source, SectionIndexBuilder()).add(chunk_id, text)
+
+    index = SectionIndex()
+    for source, builder in builders.items():
+        entries = builder.entries()
+        index.replace_source(source, entries)
+        print(f"📑 {source or '(no source)'}: {len(entries)} sections indexed.")
+    print(f"💾 Section index written to {index.path}")
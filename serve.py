@@ -0,0 +1,112 @@
+"""
+serve.py
+---------
+Production entry point: runs the Flask app under gunicorn with several
+worker processes, each serving requests on a pool of threads.
+
+    python serve.py                                  # WEB_WORKERS=cpu count, WEB_THREADS=8
+    WEB_WORKERS=4 WEB_THREADS=16 python serve.py
+    gunicorn -w 4 --threads 16 -k gthread app:app     # equivalent, minus the hooks below
+
+Every worker builds its own app after the fork (SQLite handles, gRPC
+channels and HTTP pools must not cross a fork), so each one owns:
+  * one keep-alive HTTP pool for Cohere and one Weaviate client (gRPC + REST
+    session pool), both sized to WEB_THREADS via HTTP_POOL_SIZE;
+  * its own embedding/verdict caches (the disk embedding tier is shared).
+On SIGTERM gunicorn stops accepting, lets in-flight requests finish for up to
+WEB_GRACEFUL_TIMEOUT seconds, then each worker closes its clients.
+
+Workers write their Prometheus samples to PROMETHEUS_MULTIPROC_DIR (a fresh
+temporary directory unless set), so /metrics covers every worker.
+Each worker also writes its own query audit log (logs/query_audit.<pid>.jsonl
+unless AUDIT_LOG_PATH is set; see audit_log.py).
+"""
+
+import os
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+# Must be set before prometheus_client is imported (by metrics.py, via app.py)
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="verdict_metrics_"))
+# One audit log per worker: rotation isn't safe with several processes on one file
+os.environ.setdefault("AUDIT_LOG_PATH", "logs/query_audit.{pid}.jsonl")
+
+from metrics import mark_worker_dead, reset_multiprocess_dir
+from app import FLASK_HOST, FLASK_PORT, create_app
+
+WEB_BIND = os.getenv("WEB_BIND", f"{FLASK_HOST}:{FLASK_PORT}")
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1)))
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))
+WEB_TIMEOUT = int(os.getenv("WEB_TIMEOUT", "120"))  # A verdict is a few LLM calls; don't kill slow ones
+WEB_GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+WEB_KEEPALIVE = int(os.getenv("WEB_KEEPALIVE", "5"))
+# Connect to Cohere/Weaviate as each worker boots instead of on its first request
+WEB_WARMUP = os.getenv("WEB_WARMUP", "1") == "1"
+
+
+def post_fork(server, worker):
+    server.log.info(f"👷 Worker {worker.pid} started")
+
+
+def post_worker_init(worker):
+    if not WEB_WARMUP:
+        return
+    svc = worker.wsgi.extensions["services"]
+    try:
+        svc.co
+        svc.backend()
+        worker.log.info(f"🔥 Worker {worker.pid} warmed up")
+    except Exception as e:
+        # Not fatal: clients are lazy and retry on the first request
+        worker.log.warning(f"⚠️ Worker {worker.pid} warm-up failed: {e}")
+
+
+def child_exit(server, worker):
+    mark_worker_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    app = getattr(worker, "wsgi", None)
+    if app is not None:
+        app.extensions["services"].close()
+        server.log.info(f"🔌 Worker {worker.pid} closed its clients")
+
+
+class VerdictServer(BaseApplication):
+    """Gunicorn application that builds one Flask app per worker."""
+
+    def __init__(self, options=None):
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return create_app(settings={"HTTP_POOL_SIZE": self.options["threads"]})
+
+
+def server_options(bind=WEB_BIND, workers=WEB_WORKERS, threads=WEB_THREADS):
+    return {
+        "bind": bind,
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        "timeout": WEB_TIMEOUT,
+        "graceful_timeout": WEB_GRACEFUL_TIMEOUT,
+        "keepalive": WEB_KEEPALIVE,
+        "preload_app": False,  # Build the app after the fork, in each worker
+        "post_fork": post_fork,
+        "post_worker_init": post_worker_init,
+        "worker_exit": worker_exit,
+        "child_exit": child_exit,
+    }
+
+
+if __name__ == "__main__":
+    reset_multiprocess_dir(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+    options = server_options()
+    print(f"🚀 Serving on http://{options['bind']} with {options['workers']} worker(s) x {options['threads']} thread(s)")
+    VerdictServer(options).run()
@@ -0,0 +1,229 @@
+"""
+services.py
+------------
+Lazily created, self-healing clients and shared state for the Flask app.
+
+Nothing here touches the network at construction time. Cohere and the
+retrieval backend (Weaviate or NumPy snapshots) are created on first use, and
+a Weaviate connection that fails is rebuilt on a later request (at most once
+per WEAVIATE_RECONNECT_SECONDS), so one hiccup doesn't take the process down.
+`check_*` methods back the /readyz endpoint.
+
+Each process (server worker) gets its own Services: one keep-alive HTTP pool
+for Cohere and one Weaviate client (a gRPC channel plus a REST session pool),
+both sized by HTTP_POOL_SIZE and shared by the worker's threads.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from audit_log import AuditLog
+from embedding_cache import EmbeddingCache
+from verdict_cache import VerdictCache
+from retrieval import IPC_COLLECTION, PRECEDENT_COLLECTION, ParallelRetriever, create_backend
+from section_index import SectionIndex
+
+log = logging.getLogger(__name__)
+
+
+class DependencyUnavailable(Exception):
+    """A client could not be created or reached; the request should get a 503."""
+
+
+class Services:
+    """Everything the request handlers share, built from a settings dict (see app.py)."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._co = None
+        self._http = None
+        self._weaviate = None
+        self._backend = None
+        self._weaviate_suspect = False  # Set after failed searches; forces a liveness check
+        self._last_connect_attempt = 0.0
+        self.errors = {}  # dependency -> last error message
+        self.last_fingerprint_check = 0.0
+
+        # Local state: cheap to build, no network
+        self.embedding_cache = EmbeddingCache(
+            path=settings["EMBED_CACHE_PATH"] or None,
+            memory_size=settings["EMBED_CACHE_MEMORY_SIZE"],
+            disk_max_entries=settings["EMBED_CACHE_DISK_MAX_ENTRIES"],
+        )
+        self.verdict_cache = VerdictCache(
+            threshold=settings["VERDICT_CACHE_THRESHOLD"],
+            ttl_seconds=settings["VERDICT_CACHE_TTL_SECONDS"],
+            capacity=settings["VERDICT_CACHE_CAPACITY"],
+        )
+        self.section_index = SectionIndex(settings["SECTION_INDEX_PATH"])
+        self.audit_log = AuditLog(
+            settings["AUDIT_LOG_PATH"] or None,
+            max_bytes=settings["AUDIT_LOG_MAX_BYTES"],
+            backups=settings["AUDIT_LOG_BACKUPS"],
+            queue_size=settings["AUDIT_LOG_QUEUE_SIZE"],
+        )
+        self.retriever = ParallelRetriever(max_workers=settings["RETRIEVAL_WORKERS"])
+        self.batch_retrieval_pool = ThreadPoolExecutor(
+            max_workers=settings["BATCH_RETRIEVAL_WORKERS"], thread_name_prefix="batch-retrieval")
+        self.batch_chat_pool = ThreadPoolExecutor(
+            max_workers=settings["BATCH_CHAT_WORKERS"], thread_name_prefix="batch-chat")
+
+    # ----------------------- #
+    #   COHERE                #
+    # ----------------------- #
+
+    @property
+    def co(self):
+        """The Cohere client, created on first use."""
+        if self._co is None:
+            with self._lock:
+                if self._co is None:
+                    if not self.settings["COHERE_API_KEY"]:
+                        self.errors["cohere"] = "COHERE_API_KEY is not set"
+                        raise DependencyUnavailable("❌ Missing COHERE_API_KEY in .env file.")
+                    import cohere  # Deferred: the SDK is slow to import and only needed once a request arrives
+                    import httpx
+                    pool_size = self.settings["HTTP_POOL_SIZE"]
+                    self._http = httpx.Client(
+                        timeout=self.settings["COHERE_TIMEOUT"],
+                        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                    )
+                    self._co = cohere.Client(
+                        self.settings["COHERE_API_KEY"],
+                        base_url=self.settings["COHERE_BASE_URL"] or None,
+                        httpx_client=self._http,
+                    )
+                    log.info("✅ Cohere client initialized.")
+        return self._co
+
+    # ----------------------- #
+    #   RETRIEVAL BACKEND     #
+    # ----------------------- #
+
+    def _connect_weaviate(self):
+        """(Re)connects to Weaviate. Caller holds the lock."""
+        now = time.monotonic()
+        if now - self._last_connect_attempt < self.settings["WEAVIATE_RECONNECT_SECONDS"]:
+            raise DependencyUnavailable(f"Weaviate unavailable: {self.errors.get('weaviate', 'reconnecting')}")
+        self._last_connect_attempt = now
+        self._close_weaviate()
+        try:
+            import weaviate  # Deferred like cohere; ~1 s of import time on its own
+            from weaviate.config import AdditionalConfig, ConnectionConfig, Timeout
+            from weaviate.connect import ConnectionParams
+            pool_size = self.settings["HTTP_POOL_SIZE"]
+            client = weaviate.WeaviateClient(
+                connection_params=ConnectionParams.from_url(
+                    self.settings["WEAVIATE_HTTP_URL"], self.settings["WEAVIATE_GRPC_PORT"]
+                ),
+                additional_config=AdditionalConfig(
+                    connection=ConnectionConfig(session_pool_connections=pool_size, session_pool_maxsize=pool_size),
+                    timeout=Timeout(query=self.settings["WEAVIATE_QUERY_TIMEOUT"]),
+                ),
+            )
+            client.connect()
+        except Exception as e:
+            self.errors["weaviate"] = str(e)
+            raise DependencyUnavailable(f"Weaviate unavailable: {e}") from e
+        self._weaviate = client
+        self._weaviate_suspect = False
+        self.errors.pop("weaviate", None)
+        log.info("✅ Connected to Weaviate.")
+        return client
+
+    def _close_weaviate(self):
+        if self._weaviate is not None:
+            try:
+                self._weaviate.close()
+            except Exception:
+                pass
+        self._weaviate = None
+        self._backend = None
+
+    def backend(self):
+        """The retrieval backend, created (or reconnected) on demand."""
+        backend = self._backend
+        if backend is not None and not self._weaviate_suspect:
+            return backend
+        with self._lock:
+            kind = self.settings["RETRIEVAL_BACKEND"]
+            client = None
+            if kind == "weaviate":
+                client = self._weaviate
+                healthy = client is not None and client.is_connected()
+                if healthy and self._weaviate_suspect:
+                    try:
+                        healthy = client.is_live()
+                    except Exception:
+                        healthy = False
+                if not healthy:
+                    client = self._connect_weaviate()
+                self._weaviate_suspect = False
+            if self._backend is None:
+                try:
+                    self._backend = create_backend(kind, client=client, data_dir=self.settings["VECTOR_DATA_DIR"])
+                except Exception as e:
+                    self.errors["backend"] = str(e)
+                    raise DependencyUnavailable(f"Retrieval backend unavailable: {e}") from e
+                self.errors.pop("backend", None)
+                log.info("✅ Retrieval backend: %s", self._backend.name)
+            return self._backend
+
+    def report_backend_failure(self, error):
+        """Called when searches fail; the next backend() call re-checks the connection."""
+        self.errors["backend"] = str(error)
+        if self.settings["RETRIEVAL_BACKEND"] == "weaviate":
+            self._weaviate_suspect = True
+
+    # ----------------------- #
+    #   READINESS             #
+    # ----------------------- #
+
+    def check_cohere(self):
+        # No free ping endpoint, so a configured client is "ready". A recent failure is
+        # only reported: failing readiness on it would stop the traffic that clears it.
+        self.co
+        last_error = self.errors.get("cohere")
+        return f"client ready (last call failed: {last_error})" if last_error else "client ready"
+
+    def check_backend(self):
+        backend = self.backend()
+        if self.settings["RETRIEVAL_BACKEND"] == "weaviate":
+            client = backend.client
+            if not client.is_live():
+                self._weaviate_suspect = True
+                raise DependencyUnavailable("Weaviate is not live")
+            missing = [name for name in (IPC_COLLECTION, PRECEDENT_COLLECTION)
+                       if not client.collections.exists(name)]
+            if missing:
+                raise DependencyUnavailable(f"missing collections: {', '.join(missing)}")
+        return f"{backend.name}: " + ", ".join(f"{name}={count}" for name, count in backend.counts().items())
+
+    def readiness(self):
+        """{dependency: {"ok", "detail"/"error", "latency_ms"}} for /readyz."""
+        report = {}
+        for name, check in (("cohere", self.check_cohere), ("retrieval", self.check_backend)):
+            start = time.perf_counter()
+            try:
+                report[name] = {"ok": True, "detail": check()}
+            except Exception as e:
+                report[name] = {"ok": False, "error": str(e)}
+            report[name]["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return report
+
+    def close(self):
+        """Releases every client and pool; called on worker shutdown."""
+        with self._lock:
+            self._close_weaviate()
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+                self._co = None
+        self.retriever.shutdown()
+        self.batch_retrieval_pool.shutdown(wait=False)
+        self.batch_chat_pool.shutdown(wait=False)
+        self.embedding_cache.close()
+        self.audit_log.close()
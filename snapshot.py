@@ -0,0 +1,249 @@
+"""
+snapshot.py
+------------
+Binary, memory-mappable embedding snapshots.
+
+A snapshot is a directory:
+
+    header.json     format version, embedding model, dimension, dtype, row count
+    vectors.f32     raw row-major float32 matrix (rows x dim), memory-mapped on read
+    records.jsonl   one JSON record per row: {"uuid": optional, "properties": {...}}
+
+Compact snapshots (dtype "int8" or "ubinary", see quantize.py) keep their
+vectors in vectors.i8 (1 byte per dimension) or vectors.u1 (1 bit per
+dimension, packed) instead, plus vectors.f32 only when written with
+keep_float=True, for rescoring.
+
+Vectors and records are appended row by row while writing, so neither side
+ever holds the whole corpus in memory. The header is written last; a directory
+without one is an unfinished snapshot and is refused by the reader.
+
+    python snapshot.py convert chunk_embeddings.json chunk_snapshot
+    python snapshot.py info chunk_snapshot
+"""
+
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from quantize import quantize, row_bytes, storage_dtype, unpack_signs
+
+FORMAT_NAME = "legal-vector-snapshot"
+FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+VECTORS_FILE = "vectors.f32"
+VECTORS_FILES = {"float32": VECTORS_FILE, "int8": "vectors.i8", "ubinary": "vectors.u1"}
+RECORDS_FILE = "records.jsonl"
+
+
+class SnapshotWriter:
+    """Streams vectors + records into a new snapshot directory.
+
+    Writes go to `<path>.tmp` and are moved into place on close(), so an
+    interrupted export never replaces a good snapshot.
+    """
+
+    def __init__(self, path, model, dim=None, normalize=False, dtype="float32", keep_float=False):
+        if dtype not in VECTORS_FILES:
+            raise ValueError(f"❌ Unknown snapshot dtype '{dtype}' (expected one of {', '.join(VECTORS_FILES)}).")
+        self.path = path
+        self.tmp_path = path.rstrip("/\\") + ".tmp"
+        self.model = model
+        self.dim = dim
+        self.normalize = normalize
+        self.dtype = dtype
+        self.keep_float = keep_float and dtype != "float32"
+        self.rows = 0
+
+        if os.path.exists(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+        os.makedirs(self.tmp_path)
+        self._vectors = open(os.path.join(self.tmp_path, VECTORS_FILES[dtype]), "wb")
+        self._float_vectors = open(os.path.join(self.tmp_path, VECTORS_FILE), "wb") if self.keep_float else None
+        self._records = open(os.path.join(self.tmp_path, RECORDS_FILE), "w", encoding="utf-8")
+
+    def add(self, vector, properties, uuid=None):
+        """Appends one row (always given as floats; compact dtypes are quantized here)."""
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vector.shape[0]
+        elif vector.shape != (self.dim,):
+            raise ValueError(f"❌ Expected a {self.dim}-dim vector, got shape {vector.shape}.")
+        if self.normalize:
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector = vector / norm
+
+        record = {"properties": properties}
+        if uuid is not None:
+            record["uuid"] = str(uuid)
+        if self._float_vectors is not None:
+            self._float_vectors.write(vector.tobytes())
+        self._vectors.write(quantize(vector, self.dtype).tobytes())
+        self._records.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.rows += 1
+
+    def _close_files(self):
+        self._vectors.close()
+        if self._float_vectors is not None:
+            self._float_vectors.close()
+        self._records.close()
+
+    def close(self):
+        """Writes the header and moves the snapshot into place."""
+        self._close_files()
+        header = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "model": self.model,
+            "dim": self.dim or 0,
+            "dtype": self.dtype,
+            "rows": self.rows,
+            "normalized": self.normalize,
+            "float_vectors": self.keep_float,
+        }
+        with open(os.path.join(self.tmp_path, HEADER_FILE), "w", encoding="utf-8") as f:
+            json.dump(header, f, indent=2)
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Discards a partially written snapshot."""
+        self._close_files()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class Snapshot:
+    """Read side of a snapshot; vectors are a read-only memmap.
+
+    `vectors` holds rows in the snapshot's dtype (packed bytes for ubinary);
+    `float_vectors` is the float32 matrix when there is one (always for
+    float32 snapshots), else None.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header_path = os.path.join(path, HEADER_FILE)
+        if not os.path.exists(header_path):
+            raise FileNotFoundError(f"❌ No snapshot header at {header_path} (missing or unfinished snapshot).")
+        with open(header_path, "r", encoding="utf-8") as f:
+            self.header = json.load(f)
+        if self.header.get("format") != FORMAT_NAME or self.header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"❌ Unsupported snapshot format in {path}: {self.header.get('format')} "
+                             f"v{self.header.get('version')}.")
+
+        self.model = self.header["model"]
+        self.dim = self.header["dim"]
+        self.rows = self.header["rows"]
+        self.normalized = self.header.get("normalized", False)
+        self.dtype = self.header.get("dtype", "float32")
+        if self.dtype not in VECTORS_FILES:
+            raise ValueError(f"❌ Unsupported snapshot dtype '{self.dtype}' in {path}.")
+        self.vectors = self._map(VECTORS_FILES[self.dtype], self.dtype)
+        if self.dtype == "float32":
+            self.float_vectors = self.vectors
+        elif self.header.get("float_vectors"):
+            self.float_vectors = self._map(VECTORS_FILE, "float32")
+        else:
+            self.float_vectors = None
+
+    def _map(self, file_name, dtype):
+        vectors_path = os.path.join(self.path, file_name)
+        width = row_bytes(dtype, self.dim) // np.dtype(storage_dtype(dtype)).itemsize
+        expected_bytes = self.rows * row_bytes(dtype, self.dim)
+        if os.path.getsize(vectors_path) != expected_bytes:
+            raise ValueError(f"❌ {vectors_path} is {os.path.getsize(vectors_path)} bytes, "
+                             f"header says {expected_bytes}.")
+        if not self.rows:
+            return np.zeros((0, width), dtype=storage_dtype(dtype))
+        return np.memmap(vectors_path, dtype=storage_dtype(dtype), mode="r", shape=(self.rows, width))
+
+    def float_rows(self, start, stop):
+        """Rows [start, stop) as float32: the float copy if present, else the compact rows widened."""
+        if self.float_vectors is not None:
+            return np.asarray(self.float_vectors[start:stop])
+        if self.dtype == "ubinary":
+            return unpack_signs(self.vectors[start:stop], self.dim)
+        return np.asarray(self.vectors[start:stop], dtype=np.float32)
+
+    def iter_records(self):
+        """Yields records in row order, one line at a time."""
+        with open(os.path.join(self.path, RECORDS_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def records(self):
+        return list(self.iter_records())
+
+    def iter_batches(self, batch_size):
+        """Yields (vectors, records) slices of at most `batch_size` rows."""
+        batch = []
+        start = 0
+        for record in self.iter_records():
+            batch.append(record)
+            if len(batch) == batch_size:
+                yield self.float_rows(start, start + len(batch)), batch
+                start += len(batch)
+                batch = []
+        if batch:
+            yield self.float_rows(start, start + len(batch)), batch
+
+    def __len__(self):
+        return self.rows
+
+
+def open_snapshot(path):
+    return Snapshot(path)
+
+
+def convert_json(json_path, out_path, model, source="sample_legal_doc.pdf"):
+    """Converts the legacy {"chunks": [...], "embeddings": [...]} JSON file.
+
+    The legacy file has to be parsed whole once; the snapshot never does.
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    chunks, embeddings = data["chunks"], data["embeddings"]
+    if len(chunks) != len(embeddings):
+        raise ValueError(f"❌ {json_path} has {len(chunks)} chunks but {len(embeddings)} embeddings.")
+
+    with SnapshotWriter(out_path, model=model) as writer:
+        for chunk, embedding in zip(chunks, embeddings):
+            writer.add(embedding, {"text": chunk, "source": source})
+    return writer.rows
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    usage = "Usage: python snapshot.py convert <input.json> <snapshot_dir> | info <snapshot_dir>"
+
+    if len(sys.argv) >= 4 and sys.argv[1] == "convert":
+        model = os.getenv("EMBEDDING_MODEL", "embed-multilingual-v3.0")
+        rows = convert_json(sys.argv[2], sys.argv[3], model=model)
+        json_size = os.path.getsize(sys.argv[2])
+        vector_size = os.path.getsize(os.path.join(sys.argv[3], VECTORS_FILE))  # convert always writes float32
+        print(f"✅ Converted {rows} rows to {sys.argv[3]} "
+              f"({json_size / 1024:.1f} KB JSON → {vector_size / 1024:.1f} KB vectors).")
+    elif len(sys.argv) == 3 and sys.argv[1] == "info":
+        snapshot = open_snapshot(sys.argv[2])
+        print(json.dumps(snapshot.header, indent=2))
+    else:
+        print(usage)
+        sys.exit(1)
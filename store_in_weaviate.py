@@ -2,19 +2,38 @@
 store_in_weaviate.py
 ---------------------
 Loads saved chunks & embeddings, and inserts them into the Weaviate 'NLP' collection.
+
+Reads the binary snapshot (see snapshot.py) batch by batch instead of parsing the
+whole JSON file. If only the legacy chunk_embeddings.json exists, it is converted
+to a snapshot first.
 """
 
 import os
-import json
 import weaviate
 from dotenv import load_dotenv
 from weaviate.connect import ConnectionParams
+from snapshot import convert_json, open_snapshot
+from schema import NLP_COLLECTION, NLP_PROPERTIES, bump_data_version
 
 # Load .env
 load_dotenv()
 
 WEAVIATE_HTTP_URL = os.getenv("WEAVIATE_HTTP_URL", "http://localhost:8081")
 WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "embed-multilingual-v3.0")
+SNAPSHOT_PATH = os.getenv("CHUNK_SNAPSHOT_PATH", "chunk_snapshot")
+LEGACY_JSON_PATH = "chunk_embeddings.json"
+DEFAULT_SOURCE = "sample_legal_doc.pdf"
+INSERT_BATCH_SIZE = 100
+
+# Convert the legacy JSON file once, if that's all we have
+if not os.path.exists(SNAPSHOT_PATH) and os.path.exists(LEGACY_JSON_PATH):
+    print(f"🔄 Converting {LEGACY_JSON_PATH} to snapshot '{SNAPSHOT_PATH}'...")
+    convert_json(LEGACY_JSON_PATH, SNAPSHOT_PATH, model=EMBEDDING_MODEL)
+
+snapshot = open_snapshot(SNAPSHOT_PATH)
+if snapshot.model != EMBEDDING_MODEL:
+    print(f"⚠️ Snapshot was embedded with '{snapshot.model}', queries use '{EMBEDDING_MODEL}'.")
 
 # Connect to Weaviate
 client = weaviate.WeaviateClient(
@@ -22,28 +41,35 @@ client = weaviate.WeaviateClient(
 )
 client.connect()
 
-# Load data from local file
-with open("chunk_embeddings.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
+print(f"📥 Preparing to insert {len(snapshot)} chunks ({snapshot.dim}-dim) into Weaviate...")
 
-chunks = data["chunks"]
-embeddings = data["embeddings"]
-
-print(f"📥 Preparing to insert {len(chunks)} chunks into Weaviate...")
-
-collection_name = "NLP"
+collection_name = NLP_COLLECTION
 collection = client.collections.get(collection_name)
 
-for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-    collection.data.insert(
-        properties={
-            "text": chunk,
-            "embedding": embedding,
-            "source": "sample_legal_doc.pdf"
-        }
-    )
+inserted = 0
+with collection.batch.fixed_size(batch_size=INSERT_BATCH_SIZE) as batch:
+    for vectors, records in snapshot.iter_batches(INSERT_BATCH_SIZE):
+        for embedding, record in zip(vectors, records):
+            # Every schema property the snapshot has; the embedding is the object's vector, not a property
+            properties = {
+                prop.name: record["properties"][prop.name]
+                for prop in NLP_PROPERTIES
+                if record["properties"].get(prop.name) is not None
+            }
+            properties.setdefault("source", DEFAULT_SOURCE)
+            batch.add_object(
+                properties=properties,
+                vector=embedding.tolist()
+            )
+        inserted += len(records)
+
+failed = len(collection.batch.failed_objects)
+if inserted > failed:
+    bump_data_version(client, collection_name)  # Invalidates cached verdicts in the app
+if failed:
+    print(f"⚠️ {failed} chunks failed to insert.")
 
-print(f"✅ Successfully inserted {len(chunks)} chunks into '{collection_name}' collection.")
+print(f"✅ Successfully inserted {inserted - failed} of {inserted} chunks into '{collection_name}' collection.")
 
 client.close()
 print("🔒 Connection closed.")
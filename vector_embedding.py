@@ -1,17 +1,34 @@
 """
 vector_embedding.py
 --------------------
-Extracts text chunks from PDF, generates Cohere embeddings in batches,
-and stores them into the Weaviate 'NLP' collection safely with rate-limit handling.
+Streams page-tagged text chunks from a PDF, generates Cohere embeddings in batches,
+and stores them into the Weaviate 'NLP' collection safely with rate-limit handling
+(see embed_client.py).
+
+Every completed batch is appended to an on-disk journal (embedding_journal.py)
+and inserted from there, so a crash or failed batch never loses finished work
+or misaligns chunks and vectors; rerunning resumes from the journal.
+
+Pages are read and chunked on the fly (chunking.chunk_pdf), so only the
+batches currently in flight are held in memory. Each chunk is stored with the
+pages it came from (`page_start`/`page_end`).
+
+Section headings found in the chunks are recorded in the section index
+(section_index.py), so queries citing a section can fetch its chunk by ID.
 """
 
 import os
-import time
+from itertools import islice
 import cohere
 import weaviate
 from dotenv import load_dotenv
 from weaviate.connect import ConnectionParams
-from chunking import extract_text_from_pdf, chunk_text_with_spacy
+from weaviate.util import generate_uuid5
+from chunking import chunk_pdf
+from embedding_journal import EmbeddingJournal
+from embed_client import EmbeddingClient
+from schema import NLP_PROPERTIES, bump_data_version, ensure_properties
+from section_index import SectionIndex, SectionIndexBuilder
 
 # ---------------------------
 # Step 0: Load Configuration
@@ -37,87 +54,146 @@ collection_name = "NLP"
 if collection_name not in client.collections.list_all():
     raise ValueError(f"❌ Collection '{collection_name}' not found in Weaviate.")
 collection = client.collections.get(collection_name)
+for added in ensure_properties(collection, NLP_PROPERTIES):
+    print(f"➕ Added missing property '{added}' to {collection_name}.")
 
 # -------------------------
-# Step 1: Extract and Chunk
+# Step 1: Extract and Chunk (streamed, page by page)
 # -------------------------
-pdf_path = "/Users/keerthana/Downloads/NLP_PRJ/punishments.pdf"
+pdf_path = os.getenv("PDF_PATH", "/Users/keerthana/Downloads/NLP_PRJ/punishments.pdf")
 if not os.path.exists(pdf_path):
     raise FileNotFoundError(f"⚠️ PDF not found at {pdf_path}")
 
-print(f"📄 Extracting text from: {pdf_path}")
-text = extract_text_from_pdf(pdf_path)
-chunks = chunk_text_with_spacy(text)
-print(f"✅ Extracted {len(chunks)} text chunks.")
+print(f"📄 Streaming text chunks from: {pdf_path}")
+chunk_stream = chunk_pdf(pdf_path)
 
 # -------------------------
-# Step 2: Generate Embeddings in Batches
+# Step 2: Embed + Store, one journaled batch at a time
 # -------------------------
-BATCH_SIZE = 10        # Adjust as needed
-RETRY_DELAY = 60          # Wait time (seconds) on rate-limit error
-EMBEDDINGS = []
+# Rate limiting, retries and concurrency live in embed_client.py
+embedder = EmbeddingClient(co, EMBEDDING_MODEL)
+BATCH_SIZE = embedder.batch_size  # Cohere's maximum (96) unless EMBED_BATCH_SIZE says otherwise
+JOURNAL_PATH = os.getenv(
+    "EMBED_JOURNAL_PATH",
+    os.path.join(".cache", f"embed_journal_{os.path.basename(pdf_path)}.jsonl")
+)
+source_name = os.path.basename(pdf_path)
 
-print("⚙️ Generating embeddings via Cohere (batch-safe mode)...")
+# Completed batches are journaled on disk, so a rerun resumes where the last one stopped.
+# Compact embedding types get their own journal key, so float and int8 vectors never mix.
+journal_model = EMBEDDING_MODEL if embedder.embedding_type == "float" else f"{EMBEDDING_MODEL}:{embedder.embedding_type}"
+journal = EmbeddingJournal(JOURNAL_PATH, model=journal_model, source=source_name)
+if embedder.embedding_type != "float":
+    print(f"🗜️ Requesting {embedder.embedding_type} embeddings (pair with VECTOR_INDEX_PROFILE="
+          f"{'sq' if embedder.embedding_type == 'int8' else 'bq'} to keep them compact in memory).")
 
-for i in range(0, len(chunks), BATCH_SIZE):
-    batch = chunks[i:i + BATCH_SIZE]
-    batch_num = (i // BATCH_SIZE) + 1
-    print(f"\n🧩 Processing batch {batch_num} ({len(batch)} chunks)...")
 
-    try:
-        response = co.embed(
-            texts=batch,
-            model=EMBEDDING_MODEL,
-            input_type="search_document"
-        )
-        batch_embeddings = response.embeddings
-        EMBEDDINGS.extend(batch_embeddings)
-        print(f"✅ Batch {batch_num} completed successfully ({len(batch_embeddings)} embeddings).")
-        time.sleep(5)  # Gentle pause between batches to avoid hitting limits
+def chunk_uuid(chunk_index, chunk):
+    """Deterministic ID so re-inserting a batch after a crash overwrites instead of duplicating."""
+    return generate_uuid5(f"{source_name}:{chunk_index}:{chunk}")
 
-    except Exception as e:
-        print(f"⚠️ Batch {batch_num} failed: {e}")
-        print(f"⏳ Retrying after {RETRY_DELAY} seconds...")
-        time.sleep(RETRY_DELAY)
-        try:
-            # Retry once
-            response = co.embed(
-                texts=batch,
-                model=EMBEDDING_MODEL,
-                input_type="search_document"
-            )
-            batch_embeddings = response.embeddings.float
-            EMBEDDINGS.extend(batch_embeddings)
-            print(f"✅ Batch {batch_num} retried successfully.")
-        except Exception as e2:
-            print(f"❌ Batch {batch_num} failed again. Skipping. Error: {e2}")
-            continue
-
-print(f"\n✅ All batches processed. Total embeddings: {len(EMBEDDINGS)}")
 
-# -------------------------
-# Step 3: Store in Weaviate
-# -------------------------
-print("\n📥 Inserting data into Weaviate...")
+def page_ranges(batch):
+    return [[chunk.page_start, chunk.page_end] for chunk in batch]
 
-for i, (chunk, embedding) in enumerate(zip(chunks, EMBEDDINGS)):
+
+def insert_batch(start, batch, batch_embeddings):
+    """Inserts one batch straight from its journaled (text, vector) pairs."""
+    batch_num = (start // BATCH_SIZE) + 1
+    texts = [chunk.text for chunk in batch]
     try:
-        collection.data.insert(
-            properties={
-                "text": chunk,
-                "source": os.path.basename(pdf_path)
-            },
-            vector=embedding
-        )
-        if (i + 1) % 10 == 0:
-            print(f"   → Inserted {i + 1}/{len(chunks)} chunks...")
+        with collection.batch.fixed_size(batch_size=len(batch)) as weaviate_batch:
+            for offset, (chunk, embedding) in enumerate(zip(batch, batch_embeddings)):
+                properties = {
+                    "text": chunk.text,
+                    "source": source_name
+                }
+                if chunk.page_start is not None:
+                    properties["page_start"] = chunk.page_start
+                    properties["page_end"] = chunk.page_end
+                weaviate_batch.add_object(
+                    properties=properties,
+                    uuid=chunk_uuid(start + offset, chunk.text),
+                    vector=embedding
+                )
+        failed = collection.batch.failed_objects
+        if failed:
+            raise RuntimeError(f"{len(failed)} objects failed: {failed[0].message}")
+        journal.mark_inserted(start, texts, page_ranges(batch))
+        stats["inserted"] += len(batch)
+        print(f"   → Inserted batch {batch_num} ({len(batch)} chunks).")
     except Exception as e:
-        print(f"⚠️ Failed to insert chunk {i + 1}: {e}")
-
-print(f"✅ Successfully stored {len(EMBEDDINGS)} chunks into '{collection_name}' collection.")
+        print(f"⚠️ Failed to insert batch {batch_num}: {e}")
+        stats["failed_batches"].append(batch_num)
+
+
+def batches_to_embed():
+    """Yields (start, texts) for batches with no journaled embeddings; replays the rest."""
+    i = 0
+    while True:
+        batch = list(islice(chunk_stream, BATCH_SIZE))
+        if not batch:
+            return
+        texts = [chunk.text for chunk in batch]
+        batch_num = (i // BATCH_SIZE) + 1
+        stats["chunks"] += len(batch)
+        for offset, text in enumerate(texts):
+            sections.add(chunk_uuid(i + offset, text), text)
+        if journal.is_inserted(i, texts, page_ranges(batch)):
+            stats["resumed"] += 1
+        else:
+            batch_embeddings = journal.completed_embeddings(i, texts)
+            if batch_embeddings is None:
+                print(f"\n🧩 Queueing batch {batch_num} ({len(batch)} chunks, pages {batch[0].page_start}-{batch[-1].page_end})...")
+                in_flight[i] = batch
+                yield i, texts
+            else:
+                print(f"\n♻️ Batch {batch_num} found in journal, skipping embedding.")
+                insert_batch(i, batch, batch_embeddings)
+        i += len(batch)
+
+
+print("⚙️ Generating embeddings via Cohere (rate-limited, concurrent, resumable mode)...")
+print(f"📓 Journal: {JOURNAL_PATH}")
+print(f"🚦 Up to {embedder.max_in_flight} batches of {BATCH_SIZE} in flight.")
+
+stats = {"chunks": 0, "resumed": 0, "embedded": 0, "inserted": 0, "failed_batches": []}
+in_flight = {}  # start -> Chunks of batches handed to the embedder
+sections = SectionIndexBuilder()  # Fed every streamed chunk, including ones resumed from the journal
+
+# Batches complete out of order; each is journaled and inserted as soon as it arrives
+for i, texts, result in embedder.embed_batches(batches_to_embed()):
+    batch = in_flight.pop(i)
+    batch_num = (i // BATCH_SIZE) + 1
+    if isinstance(result, Exception) or len(result) != len(batch):
+        print(f"❌ Batch {batch_num} failed. Rerun to resume from here. Error: {result if isinstance(result, Exception) else 'embedding count mismatch'}")
+        stats["failed_batches"].append(batch_num)
+        continue
+    journal.record_batch(i, texts, result)
+    stats["embedded"] += 1
+    print(f"✅ Batch {batch_num} embedded and journaled ({len(result)} embeddings).")
+    insert_batch(i, batch, result)
+
+journal.close()
+if stats["inserted"]:
+    bump_data_version(client, collection_name)  # Invalidates cached verdicts in the app
+
+# Every chunk has been streamed by now, so the index covers the whole document
+section_index = SectionIndex(os.getenv("SECTION_INDEX_PATH", "section_index.json"))
+section_entries = sections.entries()
+section_index.replace_source(source_name, section_entries)
+print(f"📑 Indexed {len(section_entries)} IPC sections in {section_index.path}.")
+
+print(f"\n📈 Cohere calls: {embedder.stats['calls']} ({embedder.stats['rate_limited']} rate-limited, "
+      f"{embedder.stats['transient_errors']} transient errors).")
+print(f"✅ Streamed {stats['chunks']} chunks from {source_name}.")
+print(f"✅ Embedded {stats['embedded']} new batches, inserted {stats['inserted']} chunks "
+      f"into '{collection_name}' collection ({stats['resumed']} batches already done in a previous run).")
+if stats["failed_batches"]:
+    print(f"⚠️ Batches {stats['failed_batches']} did not complete. Run the script again to resume them.")
 
 # -------------------------
-# Step 4: Close Connection
+# Step 3: Close Connection
 # -------------------------
 client.close()
 print("🔒 Connection closed. All done!")
@@ -0,0 +1,155 @@
+"""
+verdict_cache.py
+-----------------
+Semantic cache for generated verdicts.
+
+Each entry keeps the final answer and references together with the query
+vector and the IDs of the IPC chunks / precedents that were retrieved for it.
+A new query reuses a cached ruling when its embedding is within the cosine
+threshold of a cached one *and* retrieval returned the same IPC/precedent IDs,
+so the prompt we would send to `co.chat` is built from identical evidence.
+
+Entries expire after a TTL, the least recently used entry is evicted once the
+cache is full, and everything is dropped when the underlying collections change.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class VerdictCache:
+    """Thread-safe, TTL + capacity bounded semantic verdict cache."""
+
+    def __init__(self, threshold=0.97, ttl_seconds=3600, capacity=256):
+        self.threshold = float(threshold)
+        self.ttl_seconds = float(ttl_seconds)
+        self.capacity = max(0, int(capacity))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self.stats_counters = {
+            "exact_hits": 0,
+            "exact_misses": 0,
+            "semantic_hits": 0,
+            "semantic_misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    # ----------------------- #
+    #   LOOKUPS               #
+    # ----------------------- #
+
+    def get_exact(self, query_key):
+        """Returns the payload cached for exactly this query key, if still valid.
+
+        For an identical (normalized) query against unchanged collections the
+        retrieval results are deterministic, so callers can skip retrieval too.
+        """
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(query_key)
+            if entry is None:
+                self.stats_counters["exact_misses"] += 1
+                return None
+            self._entries.move_to_end(query_key)
+            self.stats_counters["exact_hits"] += 1
+            return entry["payload"]
+
+    def lookup(self, vector, ipc_ids, precedent_ids):
+        """Returns the payload of the closest cached query with matching retrieval IDs."""
+        ipc_ids, precedent_ids = frozenset(ipc_ids), frozenset(precedent_ids)
+        query = _unit(vector)
+        with self._lock:
+            self._expire()
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry["ipc_ids"] == ipc_ids and entry["precedent_ids"] == precedent_ids
+            ]
+            if not candidates:
+                self.stats_counters["semantic_misses"] += 1
+                return None
+
+            matrix = np.stack([entry["vector"] for _, entry in candidates])
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.stats_counters["semantic_misses"] += 1
+                return None
+
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            self.stats_counters["semantic_hits"] += 1
+            return entry["payload"]
+
+    def put(self, query_key, vector, ipc_ids, precedent_ids, payload):
+        """Caches a generated verdict."""
+        if not self.capacity:
+            return
+        with self._lock:
+            self._entries[query_key] = {
+                "vector": _unit(vector),
+                "ipc_ids": frozenset(ipc_ids),
+                "precedent_ids": frozenset(precedent_ids),
+                "payload": payload,
+                "created_at": time.monotonic(),
+            }
+            self._entries.move_to_end(query_key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.stats_counters["evictions"] += 1
+
+    # ----------------------- #
+    #   INVALIDATION          #
+    # ----------------------- #
+
+    def invalidate(self):
+        """Drops every cached verdict."""
+        with self._lock:
+            self._entries.clear()
+            self.stats_counters["invalidations"] += 1
+
+    def check_fingerprint(self, fingerprint):
+        """Invalidates the cache when the collections' fingerprint has changed.
+
+        Returns True if the cache was invalidated.
+        """
+        with self._lock:
+            previous, self._fingerprint = self._fingerprint, fingerprint
+            if previous is None or previous == fingerprint:
+                return False
+            self._entries.clear()
+            self.stats_counters["invalidations"] += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats["entries"] = len(self._entries)
+        # Every query starts with get_exact, so exact hits + misses is the number of lookups;
+        # lookup() only runs for exact misses that made it through retrieval
+        lookups = stats["exact_hits"] + stats["exact_misses"]
+        stats["hit_ratio"] = (
+            (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        )
+        return stats
+
+    def _expire(self):
+        """Removes entries older than the TTL (lock held)."""
+        if self.ttl_seconds <= 0:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry["created_at"] < cutoff]
+        for key in expired:
+            del self._entries[key]
+        self.stats_counters["expirations"] += len(expired)
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -12,11 +12,14 @@ collection = client.collections.get("NLP")
 count = collection.aggregate.over_all(total_count=True).total_count
 print(f"📊 Total objects in NLP collection: {count}")
 
-# Fetch sample objects to inspect
-response = collection.query.fetch_objects(limit=3)
+# Fetch sample objects to inspect (embeddings live in the object's vector)
+response = collection.query.fetch_objects(limit=3, include_vector=True)
 for i, obj in enumerate(response.objects or [], 1):
+    vector = obj.vector.get("default") if obj.vector else None
     print(f"\n--- Object {i} ---")
     print(f"Text (first 150 chars): {obj.properties['text'][:150]}")
-    print(f"Embedding length: {len(obj.properties['embedding']) if 'embedding' in obj.properties else '❌ None'}")
+    print(f"Vector length: {len(vector) if vector else '❌ None'}")
+    if "embedding" in obj.properties:
+        print("⚠️ Legacy 'embedding' property present — run migrate_nlp_vectors.py")
 
 client.close()